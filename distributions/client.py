@@ -204,10 +204,13 @@ class XMDirectory:
         # Bind the client to a default directory and library
         self.directory_id = directory_id
         self.library_id = library_id
+        # Number of API calls made so far, used to measure the cost of distribution pipelines
+        self.request_count = 0
 
     def http_request(self, method, path, query_data=None, json_data=None):
         """Send an HTTP request to Qualtrics and return the parsed response body"""
         url = _urljoin(self.base_url, path)
+        self.request_count += 1
         resp = self.session.request(
             method,
             url,
@@ -734,6 +737,11 @@ def default_client(session=None):
     return _client
 
 
+def request_count() -> int:
+    """Number of API calls made by the default client in this process"""
+    return default_client().request_count
+
+
 # Bound managers
 # --------------
 def directory_contacts():
@@ -191,7 +191,7 @@ class MessageDistributionSendForm(forms.ModelForm):
 
     class Meta:
         model = MessageDistribution
-        fields = ('send_date',)
+        fields = ('send_date', 'wave_count', 'wave_interval')
 
     def clean(self):
         """
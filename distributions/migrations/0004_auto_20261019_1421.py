@@ -0,0 +1,45 @@
+# Generated by Django 3.2.12 on 2026-10-19 14:21
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distributions', '0003_auto_20210927_1025'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messagedistribution',
+            name='wave_count',
+            field=models.PositiveSmallIntegerField(default=1, help_text='Split recipients into this many groups, each sent at its own time', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(24)], verbose_name='Number of waves'),
+        ),
+        migrations.AddField(
+            model_name='messagedistribution',
+            name='wave_interval',
+            field=models.PositiveIntegerField(default=60, validators=[django.core.validators.MinValueValidator(1)], verbose_name='Minutes between waves'),
+        ),
+        migrations.CreateModel(
+            name='MessageDistributionWave',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField()),
+                ('offset', models.PositiveIntegerField()),
+                ('size', models.PositiveIntegerField()),
+                ('send_date', models.DateTimeField()),
+                ('status', models.PositiveSmallIntegerField(choices=[(0, 'Pending'), (1, 'Importing contacts'), (2, 'Sent'), (3, 'Failed')], default=0)),
+                ('qx_batch_id', models.CharField(max_length=20, null=True, unique=True)),
+                ('qx_import_id', models.CharField(max_length=20, null=True, unique=True)),
+                ('qx_id', models.CharField(max_length=20, null=True, unique=True)),
+                ('qx_created_date', models.DateTimeField(null=True)),
+                ('message_distribution', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waves', related_query_name='wave', to='distributions.messagedistribution')),
+            ],
+            options={
+                'ordering': ['message_distribution', 'index'],
+                'unique_together': {('message_distribution', 'index')},
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.12 on 2026-10-19 14:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distributions', '0004_auto_20261019_1421'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PipelineRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_date', models.DateTimeField(auto_now_add=True)),
+                ('ended_date', models.DateTimeField(null=True)),
+                ('link_distribution', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pipeline_runs', related_query_name='pipeline_run', to='distributions.linkdistribution')),
+                ('message_distribution', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pipeline_runs', related_query_name='pipeline_run', to='distributions.messagedistribution')),
+            ],
+            options={
+                'ordering': ['-started_date', '-pk'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PipelineStage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('started_date', models.DateTimeField(auto_now_add=True)),
+                ('ended_date', models.DateTimeField(null=True)),
+                ('item_count', models.PositiveIntegerField(null=True)),
+                ('qx_calls', models.PositiveIntegerField(default=0)),
+                ('retries', models.PositiveIntegerField(default=0)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stages', related_query_name='stage', to='distributions.pipelinerun')),
+            ],
+            options={
+                'ordering': ['started_date', 'pk'],
+                'unique_together': {('run', 'name')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.12 on 2026-10-19 14:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distributions', '0005_pipelinerun_pipelinestage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledSend',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('eta', models.DateTimeField(db_index=True)),
+                ('status', models.PositiveSmallIntegerField(choices=[(0, 'Pending'), (1, 'Dispatched')], default=0)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('dispatched_date', models.DateTimeField(null=True)),
+                ('message_distribution', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='scheduled_send', to='distributions.messagedistribution')),
+            ],
+            options={
+                'ordering': ['eta'],
+            },
+        ),
+    ]
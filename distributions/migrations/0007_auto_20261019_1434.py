@@ -0,0 +1,42 @@
+# Generated by Django 3.2.12 on 2026-10-19 14:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distributions', '0006_scheduledsend'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='linkdistribution',
+            name='is_deleting',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='messagedistribution',
+            name='is_deleting',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='DeletionJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('link', 'Set of individual links'), ('message', 'Message delivery')], max_length=10)),
+                ('description', models.CharField(max_length=250)),
+                ('status', models.PositiveSmallIntegerField(choices=[(0, 'Pending'), (1, 'Running'), (2, 'Done'), (3, 'Failed')], default=0)),
+                ('total_rows', models.PositiveIntegerField(default=0)),
+                ('deleted_rows', models.PositiveIntegerField(default=0)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('ended_date', models.DateTimeField(null=True)),
+                ('link_distribution', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='deletion_jobs', to='distributions.linkdistribution')),
+                ('message_distribution', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='deletion_jobs', to='distributions.messagedistribution')),
+            ],
+            options={
+                'ordering': ['-created_date'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.12 on 2026-10-19 16:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distributions', '0007_auto_20261019_1434'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pipelinerun',
+            name='failed',
+            field=models.BooleanField(default=False),
+        ),
+    ]
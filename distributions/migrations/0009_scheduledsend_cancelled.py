@@ -0,0 +1,18 @@
+# Generated by Django 3.2.12 on 2026-10-19 16:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distributions', '0008_pipelinerun_failed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='scheduledsend',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Pending'), (1, 'Dispatched'), (2, 'Cancelled')], default=0),
+        ),
+    ]
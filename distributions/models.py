@@ -1,9 +1,11 @@
 # -- STDLIB
 import logging
 import uuid
-from typing import Iterable, List, Set, Tuple
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 # -- DJANGO
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from django.urls import reverse
 from django.utils import timezone
@@ -31,6 +33,7 @@ class Distribution(models.Model):
     qx_id = models.CharField(max_length=20, unique=True, null=True)
     qx_import_id = models.CharField(max_length=20, unique=True, null=True)
     qx_created_date = models.DateTimeField(null=True)
+    is_deleting = models.BooleanField(default=False)
 
     class Meta:
         abstract = True
@@ -55,9 +58,14 @@ class Distribution(models.Model):
     def save_links(self):
         raise NotImplementedError
 
-    def get_import_kwargs(self):
-        """Keyword arguments as expected by `client.import_contacts()`"""
-        return {'list_id': self.qx_list_id, 'contacts': self.contacts_for_import()}
+    def get_import_kwargs(self, contacts=None):
+        """Keyword arguments as expected by `client.import_contacts()`
+
+        Contacts already serialized by the caller may be passed in `contacts`.
+        """
+        if contacts is None:
+            contacts = self.contacts_for_import()
+        return {'list_id': self.qx_list_id, 'contacts': contacts}
 
 
 def _update_links(links: Iterable['Link'], qx_links: List[dict]) -> Tuple[List['Link'], List['Link']]:
@@ -191,6 +199,8 @@ class MessageDistribution(Distribution):
         (TARGET_FINISHED, _("Finished"))
     )
 
+    MAX_WAVES = 24
+
     link_distribution = models.ForeignKey('LinkDistribution', on_delete=models.CASCADE,
                                           related_name="%(class)ss", related_query_name="%(class)s",
                                           # TODO Really necessary restriction ?
@@ -206,6 +216,15 @@ class MessageDistribution(Distribution):
     subject = models.ForeignKey('Message', related_name="email_subject_of_set",
                                 related_query_name='email_subject_of', on_delete=models.SET_NULL, null=True)
     fallback_of = models.OneToOneField('self', related_name='fallback', null=True, on_delete=models.CASCADE)
+    wave_count = models.PositiveSmallIntegerField(
+        default=1, validators=[MinValueValidator(1), MaxValueValidator(MAX_WAVES)],
+        verbose_name=_("Number of waves"),
+        help_text=_("Split recipients into this many groups, each sent at its own time"),
+    )
+    wave_interval = models.PositiveIntegerField(
+        default=60, validators=[MinValueValidator(1)],
+        verbose_name=_("Minutes between waves"),
+    )
 
     @property
     def qx_list_id(self):
@@ -254,16 +273,26 @@ class MessageDistribution(Distribution):
         """
         return self.qx_id and self.is_email
 
+    @property
+    def has_waves(self):
+        return self.wave_count > 1
+
     def get_send_date(self):
         if self.fallback_of is not None:
             return self.fallback_of.send_date
         return self.send_date
 
+    def get_qx_ids(self) -> List[str]:
+        """Qualtrics distributions this message was sent through, one per wave"""
+        if self.has_waves:
+            return [wave.qx_id for wave in self.waves.all() if wave.qx_id]
+        return [self.qx_id] if self.qx_id else []
+
     def get_absolute_url(self):
         return reverse('dist:msgd:detail', args=[self.pk])
 
     def contacts_for_import(self):
-        return [_contact_from_link(link) for link in self.links.select_related('profile__panel')]
+        return contacts_by_distribution([self.pk]).get(self.pk, [])
 
     def candidates(self, history: Iterable[dict] = (), select_related: Iterable[str] = ()) -> List[Link]:
         """Using our link distribution's response history, select eligible candidates for this message.
@@ -304,8 +333,8 @@ class MessageDistribution(Distribution):
         """Freeze the set of candidates, recording them as the recipients of the distribution."""
         self.links.set(self.candidates(history=history))
 
-    def get_import_kwargs(self):
-        kwargs = super().get_import_kwargs()
+    def get_import_kwargs(self, contacts=None):
+        kwargs = super().get_import_kwargs(contacts=contacts)
         kwargs['batch_id'] = self.qx_batch_id
         return kwargs
 
@@ -322,6 +351,92 @@ class MessageDistribution(Distribution):
         fallback.fallback_of = self
         fallback.save()
 
+    @property
+    def pending_send(self) -> Optional['ScheduledSend']:
+        """Queued dispatch of this distribution (or of the one it is a fallback of), if not started yet"""
+        dist = self.fallback_of or self
+        try:
+            scheduled = dist.scheduled_send
+        except ScheduledSend.DoesNotExist:
+            return None
+        return scheduled if scheduled.is_pending else None
+
+    def create_waves(self) -> List['MessageDistributionWave']:
+        """Split the recipients into consecutive waves of (nearly) equal size
+
+        Intended to be called *after* `save_links()`. Recipients are assigned to waves in `Link` primary key
+        order, and each wave is sent `wave_interval` minutes after the previous one. There are never more
+        waves than recipients.
+        """
+        self.waves.all().delete()
+        total = self.links.count()
+        count = min(self.wave_count, total)
+        start = self.get_send_date() or timezone.now()
+        interval = timedelta(minutes=self.wave_interval)
+        waves = []
+        offset = 0
+        for index in range(count):
+            size = total // count + (1 if index < total % count else 0)
+            waves.append(MessageDistributionWave(message_distribution=self, index=index, offset=offset, size=size,
+                                                 send_date=start + index * interval))
+            offset += size
+        MessageDistributionWave.objects.bulk_create(waves)
+        return list(self.waves.all())
+
+
+class MessageDistributionWave(models.Model):
+    """A slice of a message distribution's recipients, sent through its own Qualtrics transaction batch"""
+
+    STATUS_PENDING = 0
+    STATUS_IMPORTING = 1
+    STATUS_SENT = 2
+    STATUS_FAILED = 3
+    STATUS_CHOICES = (
+        (STATUS_PENDING, _("Pending")),
+        (STATUS_IMPORTING, _("Importing contacts")),
+        (STATUS_SENT, _("Sent")),
+        (STATUS_FAILED, _("Failed")),
+    )
+
+    message_distribution = models.ForeignKey('MessageDistribution', on_delete=models.CASCADE,
+                                             related_name='waves', related_query_name='wave')
+    index = models.PositiveSmallIntegerField()
+    offset = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    send_date = models.DateTimeField()
+    status = models.PositiveSmallIntegerField(choices=STATUS_CHOICES, default=STATUS_PENDING)
+    qx_batch_id = models.CharField(max_length=20, unique=True, null=True)
+    qx_import_id = models.CharField(max_length=20, unique=True, null=True)
+    qx_id = models.CharField(max_length=20, unique=True, null=True)
+    qx_created_date = models.DateTimeField(null=True)
+
+    class Meta:
+        ordering = ['message_distribution', 'index']
+        unique_together = ('message_distribution', 'index')
+
+    def __str__(self):
+        return f"{self.message_distribution} wave {self.index + 1}"
+
+    @property
+    def short_uid(self):
+        return f"{self.message_distribution.short_uid}-{self.index + 1}"
+
+    @property
+    def qx_list_id(self):
+        return self.message_distribution.qx_list_id
+
+    def get_links(self):
+        links = self.message_distribution.links.select_related('profile__panel').order_by('pk')
+        links = links.prefetch_related('profile__blankslotvalue_set__blankslot')
+        return links[self.offset:self.offset + self.size]
+
+    def contacts_for_import(self):
+        return [_contact_from_link(link) for link in self.get_links()]
+
+    def get_import_kwargs(self):
+        """Keyword arguments as expected by `client.import_contacts()`"""
+        return {'list_id': self.qx_list_id, 'contacts': self.contacts_for_import(), 'batch_id': self.qx_batch_id}
+
 
 def links_for_contact_mode(links: Iterable[Link],
                            *, contact_mode: int, only: bool = False) -> List[Link]:
@@ -364,6 +479,24 @@ def _contact_from_link(link: Link) -> dict:
     return contact
 
 
+def contacts_by_distribution(dist_ids: Iterable[int]) -> Dict[int, List[dict]]:
+    """Serialize the recipients of several message distributions for import
+
+    Each link is serialized once, however many of the distributions it belongs to, using a
+    fixed number of queries.
+    """
+    through = MessageDistribution.links.through
+    recipients = (through.objects.filter(messagedistribution_id__in=dist_ids)
+                  .order_by('link_id').values_list('messagedistribution_id', 'link_id'))
+    links = (Link.objects.filter(message_distribution__in=dist_ids).distinct()
+             .select_related('profile__panel').prefetch_related('profile__blankslotvalue_set__blankslot'))
+    contacts = {link.pk: _contact_from_link(link) for link in links}
+    by_distribution = {dist_id: [] for dist_id in dist_ids}
+    for dist_id, link_id in recipients:
+        by_distribution[dist_id].append(contacts[link_id])
+    return by_distribution
+
+
 HISTORY_STATUS_PENDING = {"Pending"}
 HISTORY_STATUS_STARTED = {"SurveyStarted"}
 HISTORY_STATUS_OPENED = {"Opened"}
@@ -474,3 +607,152 @@ class Message(models.Model):
     qx_id = models.CharField(max_length=20, primary_key=True)
     category = models.CharField(max_length=20, choices=CATEGORIES)
     description = models.CharField(max_length=256)
+
+
+class ScheduledSend(models.Model):
+    """Message distribution queued until close enough to its send date to import its contacts
+
+    The queue is kept in the database so that pending sends survive broker restarts.
+    """
+
+    STATUS_PENDING = 0
+    STATUS_DISPATCHED = 1
+    STATUS_CANCELLED = 2
+    STATUS_CHOICES = (
+        (STATUS_PENDING, _("Pending")),
+        (STATUS_DISPATCHED, _("Dispatched")),
+        (STATUS_CANCELLED, _("Cancelled")),
+    )
+
+    message_distribution = models.OneToOneField('MessageDistribution', on_delete=models.CASCADE,
+                                                related_name='scheduled_send')
+    eta = models.DateTimeField(db_index=True)
+    status = models.PositiveSmallIntegerField(choices=STATUS_CHOICES, default=STATUS_PENDING)
+    created_date = models.DateTimeField(auto_now_add=True)
+    dispatched_date = models.DateTimeField(null=True)
+
+    class Meta:
+        ordering = ['eta']
+
+    def __str__(self):
+        return f"{self.message_distribution} at {self.eta}"
+
+    @property
+    def is_pending(self):
+        return self.status == ScheduledSend.STATUS_PENDING
+
+
+class DeletionJob(models.Model):
+    """Background deletion of a link set or message distribution, and of its dependent rows"""
+
+    KIND_LINK = 'link'
+    KIND_MESSAGE = 'message'
+    KIND_CHOICES = (
+        (KIND_LINK, _("Set of individual links")),
+        (KIND_MESSAGE, _("Message delivery")),
+    )
+
+    STATUS_PENDING = 0
+    STATUS_RUNNING = 1
+    STATUS_DONE = 2
+    STATUS_FAILED = 3
+    STATUS_CHOICES = (
+        (STATUS_PENDING, _("Pending")),
+        (STATUS_RUNNING, _("Running")),
+        (STATUS_DONE, _("Done")),
+        (STATUS_FAILED, _("Failed")),
+    )
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    description = models.CharField(max_length=250)
+    link_distribution = models.ForeignKey('LinkDistribution', null=True, on_delete=models.SET_NULL,
+                                          related_name='deletion_jobs')
+    message_distribution = models.ForeignKey('MessageDistribution', null=True, on_delete=models.SET_NULL,
+                                             related_name='deletion_jobs')
+    status = models.PositiveSmallIntegerField(choices=STATUS_CHOICES, default=STATUS_PENDING)
+    total_rows = models.PositiveIntegerField(default=0)
+    deleted_rows = models.PositiveIntegerField(default=0)
+    created_date = models.DateTimeField(auto_now_add=True)
+    ended_date = models.DateTimeField(null=True)
+
+    class Meta:
+        ordering = ['-created_date']
+
+    def __str__(self):
+        return self.description
+
+    @property
+    def progress(self) -> int:
+        """Percentage of dependent rows deleted so far"""
+        if self.status == DeletionJob.STATUS_DONE:
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(100, 100 * self.deleted_rows // self.total_rows)
+
+
+# Pipeline telemetry
+# ------------------
+
+class PipelineRun(models.Model):
+    """One execution of the celery pipeline generating links or sending messages for a distribution"""
+
+    link_distribution = models.ForeignKey('LinkDistribution', null=True, on_delete=models.CASCADE,
+                                          related_name='pipeline_runs', related_query_name='pipeline_run')
+    message_distribution = models.ForeignKey('MessageDistribution', null=True, on_delete=models.CASCADE,
+                                             related_name='pipeline_runs', related_query_name='pipeline_run')
+    started_date = models.DateTimeField(auto_now_add=True)
+    ended_date = models.DateTimeField(null=True)
+    failed = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['-started_date', '-pk']
+
+    @property
+    def duration(self) -> Optional[timedelta]:
+        if self.ended_date is None:
+            return None
+        return self.ended_date - self.started_date
+
+
+class PipelineStage(models.Model):
+    """Timing and Qualtrics usage of a step of a pipeline run
+
+    A stage can span several tasks: contact imports are started by one task and awaited by another.
+    """
+
+    MAILING_LIST = "Mailing list creation"
+    SERIALIZATION = "Contact serialization"
+    TRANSACTION_BATCH = "Transaction batch creation"
+    CONTACT_IMPORT = "Contact import"
+    LINK_GENERATION = "Link generation"
+    LINK_UPDATE = "Link update"
+    SEND = "Distribution creation"
+
+    run = models.ForeignKey('PipelineRun', on_delete=models.CASCADE, related_name='stages', related_query_name='stage')
+    name = models.CharField(max_length=100)
+    started_date = models.DateTimeField(auto_now_add=True)
+    ended_date = models.DateTimeField(null=True)
+    item_count = models.PositiveIntegerField(null=True)
+    qx_calls = models.PositiveIntegerField(default=0)
+    retries = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['started_date', 'pk']
+        unique_together = ('run', 'name')
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def duration(self) -> Optional[timedelta]:
+        if self.ended_date is None:
+            return None
+        return self.ended_date - self.started_date
+
+    @property
+    def throughput(self) -> Optional[float]:
+        """Items processed per second"""
+        if self.item_count is None or self.duration is None:
+            return None
+        return self.item_count / max(self.duration.total_seconds(), 0.001)
@@ -2,7 +2,7 @@
 import functools
 import logging
 from collections import Counter, defaultdict
-from datetime import datetime
+from datetime import datetime, timedelta
 from functools import wraps
 from typing import Iterable
 
@@ -12,8 +12,9 @@ from django.core.cache import cache
 
 # -- QXSMS
 from distributions.models import (
-    Link, get_link_status, get_msgdist_status, has_failed, has_finished,
-    has_partially_finished, has_started,
+    Link, PipelineStage, contacts_by_distribution, get_link_status,
+    get_msgdist_status, has_failed, has_finished, has_partially_finished,
+    has_started,
 )
 from panelist.models import Profile
 
@@ -101,6 +102,27 @@ def get_distribution_contacts(dist_id):
     return _serialize_profiles(profiles)
 
 
+CONTACTS_SNAPSHOT_KEY = 'contacts-{dist_id}'
+CONTACTS_SNAPSHOT_TIMEOUT = 24 * 3600
+
+
+def snapshot_contacts(dist_ids: Iterable[int]) -> dict[int, list[dict]]:
+    """Serialize the recipients of message distributions sent together, and cache them until imported"""
+    snapshot = contacts_by_distribution(dist_ids)
+    cache.set_many({CONTACTS_SNAPSHOT_KEY.format(dist_id=dist_id): contacts
+                    for dist_id, contacts in snapshot.items()}, CONTACTS_SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def get_contacts_snapshot(dist_id: int):
+    """Recipients serialized by `snapshot_contacts()`, or None"""
+    return cache.get(CONTACTS_SNAPSHOT_KEY.format(dist_id=dist_id))
+
+
+def clear_contacts_snapshot(dist_id: int) -> None:
+    cache.delete(CONTACTS_SNAPSHOT_KEY.format(dist_id=dist_id))
+
+
 @cached(key_spec='links-{qx_id}', timeout=300)
 def list_distribution_links(*, qx_id, survey_id):
     return xmc.list_distribution_links(qx_id, survey_id)
@@ -112,6 +134,43 @@ def get_distribution_stats(*, qx_id: str, survey_id: str, is_sms: bool = False):
     return dm.stats(qx_id=qx_id, survey_id=survey_id)
 
 
+def get_message_distribution_stats(dist, *, skip_cache=False) -> dict:
+    """Global stats of a message distribution, summed over its waves"""
+    totals = Counter()
+    for qx_id in dist.get_qx_ids():
+        stats = get_distribution_stats(qx_id=qx_id, survey_id=settings.QXSMS_SEND_SURVEY,
+                                       is_sms=dist.is_sms, skip_cache=skip_cache)
+        totals.update(stats or {})
+    return dict(totals)
+
+
+# Scheduled sending
+# -----------------
+
+MIN_IMPORT_LEAD_TIME = timedelta(minutes=30)
+IMPORT_LEAD_TIME_MARGIN = 2
+IMPORT_LEAD_TIME_SAMPLE = 20
+
+
+def estimate_import_lead_time(contact_count: int) -> timedelta:
+    """Time to set aside for importing `contact_count` contacts before a send date
+
+    The import rate is measured on the most recent contact import stages of pipeline runs, and
+    applied with a safety margin. There is always at least `MIN_IMPORT_LEAD_TIME`.
+    """
+    stages = (PipelineStage.objects
+              .filter(name__startswith=PipelineStage.CONTACT_IMPORT, ended_date__isnull=False, item_count__gt=0)
+              .order_by('-ended_date')[:IMPORT_LEAD_TIME_SAMPLE])
+    seconds = items = 0
+    for stage in stages:
+        seconds += stage.duration.total_seconds()
+        items += stage.item_count
+    if not items:
+        return MIN_IMPORT_LEAD_TIME
+    lead_time = timedelta(seconds=IMPORT_LEAD_TIME_MARGIN * contact_count * seconds / items)
+    return max(lead_time, MIN_IMPORT_LEAD_TIME)
+
+
 # Distribution history
 # --------------------
 
@@ -122,6 +181,14 @@ def get_distribution_history(*, qx_id):
     return dm.history(qx_id)
 
 
+def get_message_distribution_history(dist, *, skip_cache=False) -> list[dict]:
+    """Response history of a message distribution, merged over its waves"""
+    history = []
+    for qx_id in dist.get_qx_ids():
+        history.extend(get_distribution_history(qx_id=qx_id, skip_cache=skip_cache))
+    return history
+
+
 def get_contact_history(*, qx_id):
     """
     get contact history
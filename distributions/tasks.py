@@ -1,12 +1,22 @@
+# -- STDLIB
+from contextlib import ExitStack, contextmanager
+from datetime import timedelta
+from typing import Optional
+
 # -- DJANGO
 from django.conf import settings
 from django.core.mail import mail_admins
+from django.db import transaction
+from django.db.models import F, Q
 from django.utils import timezone
 
 # -- THIRDPARTY
-from celery import Task, shared_task
+from celery import Task, chord, shared_task
 from celery.utils.log import get_task_logger
 
+# -- QXSMS
+from hq.models import SMSStats
+
 # -- QXSMS (LOCAL)
 from . import client, models, services
 from .client import QxClientError
@@ -32,6 +42,50 @@ class BaseTask(Task):
             mail_admins("Task error", traceback)
 
 
+def _get_distribution(dist_id, message_distribution=False):
+    if message_distribution:
+        return models.MessageDistribution.objects.get(pk=dist_id)
+    return models.LinkDistribution.objects.get(pk=dist_id)
+
+
+def _get_pipeline_run(dist):
+    if isinstance(dist, models.MessageDistributionWave):
+        dist = dist.message_distribution
+    return dist.pipeline_runs.first()
+
+
+@contextmanager
+def pipeline_stage(task, dist, name, *, last=True, final=False):
+    """Record a pipeline stage on the latest pipeline run of `dist`
+
+    Timestamps, Qualtrics API calls and retries of the task are recorded on the stage, which
+    is created by the first task of the stage to run. The stage only ends with a task passing
+    `last=True` that completes successfully, and the run itself with the `final` one.
+    Item counts are set by the caller on the stage yielded.
+    """
+    run = _get_pipeline_run(dist)
+    if run is None:
+        yield models.PipelineStage(name=name)
+        return
+    if isinstance(dist, models.MessageDistributionWave):
+        name = f"{name} (wave {dist.index + 1})"
+    stage, _ = run.stages.get_or_create(name=name)
+    calls = client.request_count()
+    completed = False
+    try:
+        yield stage
+        completed = True
+    finally:
+        stage.qx_calls += client.request_count() - calls
+        stage.retries = max(stage.retries, task.request.retries or 0)
+        if completed and last:
+            stage.ended_date = timezone.now()
+        stage.save()
+    if final:
+        run.ended_date = stage.ended_date
+        run.save()
+
+
 def _check_import_status(*, list_id, import_id):
     if not (list_id and import_id):
         raise RuntimeError(f"list and import QX_IDs needed to track import progress. "
@@ -44,76 +98,85 @@ def _check_import_status(*, list_id, import_id):
     return pct
 
 
-@shared_task(base=BaseTask)
-def create_distribution_list(dist_id):
+@shared_task(base=BaseTask, bind=True)
+def create_distribution_list(self, dist_id):
     """Create a mailing list for the purpose of generating links
 
     The name of the mailing list is set to the the distribution's short UID.
     """
     dist = models.LinkDistribution.objects.get(pk=dist_id)
-    if dist.qx_list_id:
-        logger.info('LinkDistribution %s: using existing list %s', dist.short_uid, dist.qx_list_id)
-    else:
-        logger.info("LinkDistribution %s: creating mailing list)", dist.short_uid)
-        dist.qx_list_id = client.create_mailing_list(dist.short_uid)
-        dist.save()
+    with pipeline_stage(self, dist, models.PipelineStage.MAILING_LIST):
+        if dist.qx_list_id:
+            logger.info('LinkDistribution %s: using existing list %s', dist.short_uid, dist.qx_list_id)
+        else:
+            logger.info("LinkDistribution %s: creating mailing list)", dist.short_uid)
+            dist.qx_list_id = client.create_mailing_list(dist.short_uid)
+            dist.save()
     return dist_id
 
 
-@shared_task(base=BaseTask)
-def start_contact_import(dist_id: str, message_distribution=False) -> tuple[str, str, str]:
+@shared_task(base=BaseTask, bind=True)
+def start_contact_import(self, dist_id: str, message_distribution=False) -> tuple[str, str, str]:
     """Import contacts in the distribution's mailing list"""
-    if message_distribution:
-        manager = models.MessageDistribution.objects
-    else:
-        manager = models.LinkDistribution.objects
-    dist = manager.get(pk=dist_id)
-    if dist.qx_import_id:
-        logger.info('%s %s: using existing import %s', dist.__class__, dist.short_uid, dist.qx_import_id)
-    else:
-        logger.info("%s %s: starting import", dist.__class__, dist.short_uid)
-        dist.qx_import_id = client.import_contacts(**dist.get_import_kwargs())
-        dist.save()
+    dist = _get_distribution(dist_id, message_distribution)
+    with pipeline_stage(self, dist, models.PipelineStage.CONTACT_IMPORT, last=False) as stage:
+        if dist.qx_import_id:
+            logger.info('%s %s: using existing import %s', dist.__class__, dist.short_uid, dist.qx_import_id)
+        else:
+            logger.info("%s %s: starting import", dist.__class__, dist.short_uid)
+            contacts = services.get_contacts_snapshot(dist_id) if message_distribution else None
+            kwargs = dist.get_import_kwargs(contacts=contacts)
+            stage.item_count = len(kwargs['contacts'])
+            dist.qx_import_id = client.import_contacts(**kwargs)
+            dist.save()
+            if message_distribution:
+                services.clear_contacts_snapshot(dist_id)
     return dist_id, dist.qx_list_id, dist.qx_import_id
 
 
-@shared_task(base=BaseTask, autoretry_for=(ImportInProgress, client.QxServerError))
-def wait_until_import_completes(import_spec: tuple[str, str, str]) -> str:
+@shared_task(base=BaseTask, bind=True, autoretry_for=(ImportInProgress, client.QxServerError))
+def wait_until_import_completes(self, import_spec: tuple[str, str, str], message_distribution=False) -> str:
     dist_id, list_id, import_id = import_spec
-    _check_import_status(list_id=list_id, import_id=import_id)
+    dist = _get_distribution(dist_id, message_distribution)
+    with pipeline_stage(self, dist, models.PipelineStage.CONTACT_IMPORT):
+        _check_import_status(list_id=list_id, import_id=import_id)
     return dist_id
 
 
-@shared_task(base=BaseTask)
-def generate_links(dist_id):
+@shared_task(base=BaseTask, bind=True)
+def generate_links(self, dist_id):
     """Generate survey links for a distribution bound to a mailing list
 
     This task assumes that a mailing list has been created and populated for
     the given distribution.
     """
     dist = models.LinkDistribution.objects.get(pk=dist_id)
-    if dist.qx_id:
-        logger.info('LinkDistribution %s: using existing links %s', dist.short_uid, dist.qx_id)
-    else:
-        logger.info("LinkDistribution %s: generating links...", dist.short_uid)
-        dist.qx_id = client.generate_links(
-            survey_id=dist.survey.qx_id,
-            expiration_date=dist.expiration_date,
-            list_id=dist.qx_list_id,
-            description=dist.description
-        )
-        dist.qx_created_date = timezone.now()
-        dist.save()
+    with pipeline_stage(self, dist, models.PipelineStage.LINK_GENERATION) as stage:
+        if dist.qx_id:
+            logger.info('LinkDistribution %s: using existing links %s', dist.short_uid, dist.qx_id)
+        else:
+            logger.info("LinkDistribution %s: generating links...", dist.short_uid)
+            stage.item_count = dist.links.count()
+            dist.qx_id = client.generate_links(
+                survey_id=dist.survey.qx_id,
+                expiration_date=dist.expiration_date,
+                list_id=dist.qx_list_id,
+                description=dist.description
+            )
+            dist.qx_created_date = timezone.now()
+            dist.save()
     return dist_id
 
 
-@shared_task(base=BaseTask)
-def update_links(dist_id):
+@shared_task(base=BaseTask, bind=True)
+def update_links(self, dist_id):
     """Retrieve distribution links and save Link instances"""
     dist = models.LinkDistribution.objects.get(pk=dist_id)
-    qx_links = services.list_distribution_links(qx_id=dist.qx_id, survey_id=dist.survey_id, skip_cache=True)
-    updated, skipped = dist.update_links(qx_links)
-    n_updated, n_skipped = len(updated), len(skipped)
+    with pipeline_stage(self, dist, models.PipelineStage.LINK_UPDATE, final=True) as stage:
+        qx_links = services.list_distribution_links(qx_id=dist.qx_id, survey_id=dist.survey_id, skip_cache=True)
+        updated, skipped = dist.update_links(qx_links)
+        n_updated, n_skipped = len(updated), len(skipped)
+        stage.item_count = n_updated
     logger.info("LinkDistribution %s: updated %d skipped %d",
                 dist.short_uid, n_updated, n_skipped)
     return n_updated, n_skipped
@@ -129,46 +192,356 @@ create_link_distribution = (
 )
 
 
+def dispatch_link_distribution(dist: models.LinkDistribution):
+    """Start generating links for a distribution whose links have been saved"""
+    models.PipelineRun.objects.create(link_distribution=dist)
+    return create_link_distribution.delay(dist_id=dist.pk)
+
+
 # Message distributions
 # ---------------------
-@shared_task(base=BaseTask)
-def create_transaction_batch(dist_id: str) -> str:
+@shared_task(base=BaseTask, bind=True)
+def serialize_contacts(self, dist_ids: list[int]) -> list[int]:
+    """Serialize the recipients of message distributions sent together, once for all of them"""
+    dists = models.MessageDistribution.objects.filter(pk__in=dist_ids)
+    with ExitStack() as stack:
+        stages = {dist.pk: stack.enter_context(pipeline_stage(self, dist, models.PipelineStage.SERIALIZATION))
+                  for dist in dists}
+        snapshot = services.snapshot_contacts(dist_ids)
+        for dist_id, stage in stages.items():
+            stage.item_count = len(snapshot[dist_id])
+    logger.info("MessageDistributions %s: serialized %d contacts", dist_ids, sum(map(len, snapshot.values())))
+    return dist_ids
+
+
+@shared_task(base=BaseTask, bind=True)
+def create_transaction_batch(self, dist_id: str) -> str:
     dist = models.MessageDistribution.objects.get(pk=dist_id)
-    if dist.qx_batch_id:
-        logger.warning("MessageDistribution %s: using existing batch %s", dist.short_uid, dist.qx_batch_id)
-    else:
-        logger.warning("MessageDistribution %s: creating transaction batch", dist.short_uid)
-        dist.qx_batch_id = client.create_transaction_batch()
-        dist.save()
+    with pipeline_stage(self, dist, models.PipelineStage.TRANSACTION_BATCH):
+        if dist.qx_batch_id:
+            logger.warning("MessageDistribution %s: using existing batch %s", dist.short_uid, dist.qx_batch_id)
+        else:
+            logger.warning("MessageDistribution %s: creating transaction batch", dist.short_uid)
+            dist.qx_batch_id = client.create_transaction_batch()
+            dist.save()
     return dist_id
 
 
-@shared_task(base=BaseTask)
-def send_message_distribution(dist_id: str) -> str:
-    dist = models.MessageDistribution.objects.get(pk=dist_id)
+def _send(dist: models.MessageDistribution, *, batch_id: str, send_date, name: str) -> str:
+    """Create the Qualtrics distribution of `dist` for a transaction batch, and return its ID"""
     kwargs = {
-        'batch_id': dist.qx_batch_id,
+        'batch_id': batch_id,
         'survey_id': settings.QXSMS_SEND_SURVEY,
         'message_id': dist.message_id,
-        'send_date': dist.get_send_date(),
+        'send_date': send_date,
     }
     if dist.contact_mode == models.MessageDistribution.MODE_EMAIL:
         dm = client.distributions()
         kwargs['subject_id'] = dist.subject_id
     else:
         dm = client.sms_distributions()
-        kwargs['name'] = f"{dist.short_uid}"
-    dist.qx_id = dm.send(**kwargs)
-    dist.qx_created_date = timezone.now()
-    dist.save()
+        kwargs['name'] = name
+    return dm.send(**kwargs)
+
+
+@shared_task(base=BaseTask, bind=True)
+def send_message_distribution(self, dist_id: str) -> str:
+    dist = models.MessageDistribution.objects.get(pk=dist_id)
+    if dist.qx_id:
+        # Distributions sent together are sent again when the task is retried
+        logger.info("MessageDistribution %s: already sent as %s", dist.short_uid, dist.qx_id)
+        return dist.qx_id
+    with pipeline_stage(self, dist, models.PipelineStage.SEND, final=True) as stage:
+        stage.item_count = dist.links.count()
+        dist.qx_id = _send(dist, batch_id=dist.qx_batch_id, send_date=dist.get_send_date(),
+                           name=f"{dist.short_uid}")
+        dist.qx_created_date = timezone.now()
+        dist.save()
     logger.info("MessageDistribution %s: %s distribution %s sent!",
                 dist.short_uid, dist.get_contact_mode_display(), dist.qx_id)
     return dist.qx_id
 
 
-create_message_distribution = (
-    create_transaction_batch.s() |
-    start_contact_import.s(message_distribution=True) |
-    wait_until_import_completes.signature(countdown=5) |
-    send_message_distribution.s()
-)
+@shared_task(base=BaseTask)
+def send_message_distributions(dist_ids: list[int]) -> list[str]:
+    """Send message distributions whose contacts have all been imported"""
+    return [send_message_distribution(dist_id) for dist_id in dist_ids]
+
+
+def create_message_distributions(dist_ids: list[int]):
+    """Task canvas used to send message distributions together, such as a message and its fallback
+
+    Recipients are serialized once for all distributions, then each distribution gets its transaction
+    batch and contact import in parallel. Distributions are sent when all imports are complete.
+    """
+    imports = [
+        create_transaction_batch.si(dist_id) |
+        start_contact_import.s(message_distribution=True) |
+        wait_until_import_completes.signature(countdown=5, kwargs={'message_distribution': True})
+        for dist_id in dist_ids
+    ]
+    return serialize_contacts.si(dist_ids) | chord(imports, send_message_distributions.s())
+
+
+# Message distributions sent in waves
+# -----------------------------------
+class WaveTask(BaseTask):
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        """Flag the wave the task was working on as failed"""
+        super().on_failure(exc, task_id, args, kwargs, einfo)
+        wave_id = args[0] if args else None
+        if isinstance(wave_id, (list, tuple)):
+            wave_id = wave_id[0]
+        models.MessageDistributionWave.objects.filter(pk=wave_id).update(
+            status=models.MessageDistributionWave.STATUS_FAILED
+        )
+
+
+@shared_task(base=WaveTask, bind=True)
+def create_wave_transaction_batch(self, wave_id: int) -> int:
+    wave = models.MessageDistributionWave.objects.select_related('message_distribution').get(pk=wave_id)
+    with pipeline_stage(self, wave, models.PipelineStage.TRANSACTION_BATCH):
+        if wave.qx_batch_id:
+            logger.warning("MessageDistribution %s: using existing batch %s", wave.short_uid, wave.qx_batch_id)
+        else:
+            logger.warning("MessageDistribution %s: creating transaction batch", wave.short_uid)
+            wave.qx_batch_id = client.create_transaction_batch()
+            wave.save()
+    return wave_id
+
+
+@shared_task(base=WaveTask, bind=True)
+def start_wave_contact_import(self, wave_id: int) -> tuple[int, str, str]:
+    """Import the wave's contacts in the link distribution's mailing list"""
+    wave = models.MessageDistributionWave.objects.select_related('message_distribution').get(pk=wave_id)
+    with pipeline_stage(self, wave, models.PipelineStage.CONTACT_IMPORT, last=False) as stage:
+        if wave.qx_import_id:
+            logger.info("MessageDistribution %s: using existing import %s", wave.short_uid, wave.qx_import_id)
+        else:
+            logger.info("MessageDistribution %s: starting import of %d contacts", wave.short_uid, wave.size)
+            stage.item_count = wave.size
+            wave.qx_import_id = client.import_contacts(**wave.get_import_kwargs())
+            wave.status = models.MessageDistributionWave.STATUS_IMPORTING
+            wave.save()
+    return wave_id, wave.qx_list_id, wave.qx_import_id
+
+
+@shared_task(base=WaveTask, bind=True, autoretry_for=(ImportInProgress, client.QxServerError))
+def wait_until_wave_import_completes(self, import_spec: tuple[int, str, str]) -> int:
+    wave_id, list_id, import_id = import_spec
+    wave = models.MessageDistributionWave.objects.select_related('message_distribution').get(pk=wave_id)
+    with pipeline_stage(self, wave, models.PipelineStage.CONTACT_IMPORT):
+        _check_import_status(list_id=list_id, import_id=import_id)
+    return wave_id
+
+
+@shared_task(base=WaveTask, bind=True)
+def send_wave(self, wave_id: int) -> str:
+    wave = models.MessageDistributionWave.objects.select_related('message_distribution').get(pk=wave_id)
+    if wave.qx_id:
+        logger.info("MessageDistribution %s: already sent as %s", wave.short_uid, wave.qx_id)
+        return wave.qx_id
+    with pipeline_stage(self, wave, models.PipelineStage.SEND) as stage:
+        stage.item_count = wave.size
+        wave.qx_id = _send(wave.message_distribution, batch_id=wave.qx_batch_id, send_date=wave.send_date,
+                           name=wave.short_uid)
+        wave.qx_created_date = timezone.now()
+        wave.status = models.MessageDistributionWave.STATUS_SENT
+        wave.save()
+    logger.info("MessageDistribution %s: wave distribution %s scheduled for %s",
+                wave.short_uid, wave.qx_id, wave.send_date)
+    return wave.qx_id
+
+
+@shared_task(base=BaseTask)
+def finalize_wave_distribution(qx_ids: list[str], dist_id: str) -> Optional[str]:
+    """Mark the distribution as sent once every wave has been handed to Qualtrics
+
+    The distribution's own `qx_id` is that of its first wave, the full set being available
+    through `MessageDistribution.get_qx_ids()`. When no wave was sent, for instance when the
+    distribution has no recipient, the pipeline run is flagged as failed and the distribution left unsent.
+    """
+    dist = models.MessageDistribution.objects.get(pk=dist_id)
+    qx_ids = [qx_id for qx_id in qx_ids if qx_id]
+    if not qx_ids:
+        logger.error("MessageDistribution %s: no wave was sent", dist.short_uid)
+        dist.pipeline_runs.filter(ended_date=None).update(ended_date=timezone.now(), failed=True)
+        return None
+    dist.qx_id = qx_ids[0]
+    dist.qx_created_date = timezone.now()
+    dist.save()
+    dist.pipeline_runs.filter(ended_date=None).update(ended_date=dist.qx_created_date)
+    logger.info("MessageDistribution %s: %d waves sent", dist.short_uid, len(qx_ids))
+    return dist.qx_id
+
+
+def create_wave(wave_id: int):
+    """Task chain used to send a single wave"""
+    return (
+        create_wave_transaction_batch.si(wave_id) |
+        start_wave_contact_import.s() |
+        wait_until_wave_import_completes.signature(countdown=5) |
+        send_wave.s()
+    )
+
+
+def dispatch_message_distribution(dist: models.MessageDistribution):
+    """Start sending a message distribution and its fallback, once their recipients have been saved
+
+    Distributions with several waves have all their waves imported and sent in parallel, each
+    with its own send date. The tasks are queued once the transaction commits, so that the workers
+    find the pipeline runs and waves.
+    """
+    dists = [dist, dist.fallback] if dist.has_fallback else [dist]
+    for d in dists:
+        models.PipelineRun.objects.create(message_distribution=d)
+    if not dist.has_waves:
+        transaction.on_commit(create_message_distributions([d.pk for d in dists]).delay)
+        return
+    for d in dists:
+        header = [create_wave(wave.pk) for wave in d.create_waves()]
+        transaction.on_commit(lambda header=header, dist_id=d.pk: chord(header)(finalize_wave_distribution.s(dist_id)))
+
+
+# Scheduled sending
+# -----------------
+SCHEDULE_HORIZON = timedelta(seconds=settings.QXSMS_SCHEDULE_INTERVAL)
+
+
+def schedule_message_distribution(dist: models.MessageDistribution):
+    """Start sending a message distribution and its fallback, or queue them until close to their send date
+
+    Contacts are imported as late as the estimated import duration allows, so that profile updates made
+    in the meantime are taken into account. Sends due within the next sweep of the queue get an ETA on
+    the broker right away, later ones are left to `dispatch_due_sends`.
+    """
+    dists = [dist, dist.fallback] if dist.has_fallback else [dist]
+    contact_count = sum(d.links.count() for d in dists)
+    eta = dist.get_send_date() - services.estimate_import_lead_time(contact_count)
+    now = timezone.now()
+    if eta <= now:
+        return dispatch_message_distribution(dist)
+    scheduled = models.ScheduledSend.objects.create(message_distribution=dist, eta=eta)
+    logger.info("MessageDistribution %s: dispatch scheduled at %s", dist.short_uid, eta)
+    if eta <= now + SCHEDULE_HORIZON:
+        transaction.on_commit(lambda: dispatch_scheduled_send.apply_async((scheduled.pk,), eta=eta))
+    return scheduled
+
+
+@shared_task(base=BaseTask)
+def dispatch_scheduled_send(scheduled_id: int):
+    """Dispatch a queued send, unless it has already been dispatched
+
+    Sends of distributions being deleted in the background are cancelled.
+    """
+    with transaction.atomic():
+        scheduled = (models.ScheduledSend.objects.select_for_update()
+                     .select_related('message_distribution__link_distribution').filter(pk=scheduled_id).first())
+        if scheduled is None or not scheduled.is_pending:
+            logger.info("ScheduledSend %s: nothing to dispatch", scheduled_id)
+            return None
+        dist = scheduled.message_distribution
+        if dist.is_deleting or dist.link_distribution.is_deleting:
+            logger.info("ScheduledSend %s: cancelled, the distribution is being deleted", scheduled_id)
+            scheduled.status = models.ScheduledSend.STATUS_CANCELLED
+            scheduled.save()
+            return None
+        scheduled.status = models.ScheduledSend.STATUS_DISPATCHED
+        scheduled.dispatched_date = timezone.now()
+        scheduled.save()
+        dispatch_message_distribution(scheduled.message_distribution)
+    return scheduled.message_distribution_id
+
+
+@shared_task(base=BaseTask)
+def dispatch_due_sends() -> int:
+    """Give an ETA to queued sends due before the next sweep
+
+    Run periodically by celery beat. Sends whose ETA is already past, because the broker lost the
+    message or no worker was running, are dispatched at once.
+    """
+    now = timezone.now()
+    due = models.ScheduledSend.objects.filter(status=models.ScheduledSend.STATUS_PENDING,
+                                              eta__lte=now + SCHEDULE_HORIZON)
+    count = 0
+    for scheduled_id, eta in due.values_list('pk', 'eta'):
+        dispatch_scheduled_send.apply_async((scheduled_id,), eta=max(eta, now))
+        count += 1
+    return count
+
+
+# Deletion
+# --------
+DELETION_BATCH_SIZE = 5000
+
+
+def start_deletion(dist) -> models.DeletionJob:
+    """Hide a link set or message distribution (with its fallback), and delete it in the background"""
+    if isinstance(dist, models.LinkDistribution):
+        kwargs = {'kind': models.DeletionJob.KIND_LINK, 'link_distribution': dist}
+        dists = [dist]
+    else:
+        kwargs = {'kind': models.DeletionJob.KIND_MESSAGE, 'message_distribution': dist}
+        dists = [dist, dist.fallback] if dist.has_fallback else [dist]
+    with transaction.atomic():
+        for d in dists:
+            d.is_deleting = True
+            d.save(update_fields=['is_deleting'])
+        job = models.DeletionJob.objects.create(description=str(dist), **kwargs)
+        transaction.on_commit(lambda: delete_distribution.delay(job.pk))
+    return job
+
+
+def _deletion_plan(job: models.DeletionJob):
+    """Message distributions to delete, and the large sets of rows to delete before them
+
+    Once these rows are gone, deleting the distributions no longer requires Django's collector to
+    load every link and recipient row.
+    """
+    if job.kind == models.DeletionJob.KIND_LINK:
+        msgdists = models.MessageDistribution.objects.filter(link_distribution=job.link_distribution_id)
+    else:
+        dist_id = job.message_distribution_id
+        msgdists = models.MessageDistribution.objects.filter(Q(pk=dist_id) | Q(fallback_of=dist_id))
+    querysets = [
+        models.MessageDistribution.links.through.objects.filter(messagedistribution__in=msgdists),
+        SMSStats.objects.filter(msgdist__in=msgdists),
+    ]
+    if job.kind == models.DeletionJob.KIND_LINK:
+        querysets.append(models.Link.objects.filter(distribution=job.link_distribution_id))
+    return msgdists, querysets
+
+
+def _delete_in_batches(queryset, job_id: int) -> None:
+    """Delete the rows of `queryset` by batches of primary keys, recording progress on the job"""
+    model = queryset.model
+    while True:
+        pks = list(queryset.order_by().values_list('pk', flat=True)[:DELETION_BATCH_SIZE])
+        if not pks:
+            return
+        model.objects.filter(pk__in=pks).delete()
+        models.DeletionJob.objects.filter(pk=job_id).update(deleted_rows=F('deleted_rows') + len(pks))
+
+
+@shared_task(base=BaseTask)
+def delete_distribution(job_id: int) -> int:
+    """Delete the distribution of a deletion job, dependent rows first and by bounded batches"""
+    job = models.DeletionJob.objects.get(pk=job_id)
+    jobs = models.DeletionJob.objects.filter(pk=job_id)
+    msgdists, querysets = _deletion_plan(job)
+    jobs.update(status=models.DeletionJob.STATUS_RUNNING, total_rows=sum(qs.count() for qs in querysets))
+    try:
+        for queryset in querysets:
+            _delete_in_batches(queryset, job_id)
+        msgdists.filter(fallback_of__isnull=False).delete()
+        msgdists.delete()
+        if job.kind == models.DeletionJob.KIND_LINK:
+            models.LinkDistribution.objects.filter(pk=job.link_distribution_id).delete()
+    except Exception:
+        jobs.update(status=models.DeletionJob.STATUS_FAILED, ended_date=timezone.now())
+        raise
+    # The job's foreign key has been nulled by the deletion: only update the fields we own
+    jobs.update(status=models.DeletionJob.STATUS_DONE, ended_date=timezone.now())
+    logger.info("DeletionJob %s: deleted %s", job_id, job.description)
+    return job_id
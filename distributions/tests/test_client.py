@@ -61,6 +61,17 @@ class HelpersTestCase(TestCase):
         self.assertEqual(client.format_datetime(dt, iso=False), "2021-05-05 15:00:00")
 
 
+class XMDirectoryTestCase(TestCase):
+
+    def test_request_count(self):
+        session = Mock()
+        session.request.return_value.json.return_value = {'result': {}}
+        xm = client.XMDirectory(api_key='KEY', domain='DOMAIN', session=session)
+        xm.get('surveys/SV_1')
+        xm.post('mailinglists', json_data={})
+        self.assertEqual(xm.request_count, 2)
+
+
 class ContactImportManagerTestCase(TestCase):
 
     @patch('time.sleep')
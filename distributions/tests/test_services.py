@@ -1,8 +1,18 @@
+# -- STDLIB
+from datetime import timedelta
+
 # -- DJANGO
 from django.test import TestCase
 
+# -- QXSMS
+from distributions.factories import MessageDistributionFactory
+from distributions.models import PipelineRun, PipelineStage
+
 # -- QXSMS (LOCAL)
-from ..services import history_links_stats, msg_distributions_stats
+from ..services import (
+    MIN_IMPORT_LEAD_TIME, estimate_import_lead_time, history_links_stats,
+    msg_distributions_stats,
+)
 
 
 class ServicesTestCase(TestCase):
@@ -113,3 +123,18 @@ class ServicesTestCase(TestCase):
         self.assertEqual(msgdist_stats['pp']['hard_bounced'], 1)
         self.assertEqual(msgdist_stats['pp']['opened'], 1)
         self.assertEqual(msgdist_stats['pp']['total'], 2)
+
+
+class ImportLeadTimeTestCase(TestCase):
+
+    def test_no_history(self):
+        self.assertEqual(estimate_import_lead_time(100000), MIN_IMPORT_LEAD_TIME)
+
+    def test_measured_rate(self):
+        run = PipelineRun.objects.create(message_distribution=MessageDistributionFactory())
+        stage = PipelineStage.objects.create(run=run, name=PipelineStage.CONTACT_IMPORT, item_count=1000)
+        stage.ended_date = stage.started_date + timedelta(minutes=10)
+        stage.save()
+        # 10 minutes per 1000 contacts, doubled as a safety margin
+        self.assertEqual(estimate_import_lead_time(10000), timedelta(minutes=200))
+        self.assertEqual(estimate_import_lead_time(10), MIN_IMPORT_LEAD_TIME)
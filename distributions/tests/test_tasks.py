@@ -0,0 +1,318 @@
+# -- STDLIB
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+# -- DJANGO
+from django.core.cache import cache
+from django.test import TestCase
+
+# -- QXSMS
+from distributions import client, services, tasks
+from distributions.factories import (
+    LinkDistributionFactory, MessageDistributionFactory,
+)
+from distributions.models import (
+    DeletionJob, Link, LinkDistribution, MessageDistribution,
+    MessageDistributionWave, PipelineRun, PipelineStage, ScheduledSend,
+)
+from hq.models import SMSStats
+from manager.factories import ManagerFactory
+from panelist.factories import PanelistFactory
+
+
+class MessageDistributionWaveTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        manager = ManagerFactory()
+        panelist = PanelistFactory(panel__managers=[manager])
+        PanelistFactory.create_batch(6, panel=panelist.panel)
+        link_distribution = LinkDistributionFactory(panels=[panelist.panel], create_links=True)
+        cls.send_date = datetime(2022, 3, 1, 8, 0, tzinfo=timezone.utc)
+        cls.msgdist = MessageDistributionFactory(link_distribution=link_distribution,
+                                                 links=link_distribution.links.all(),
+                                                 send_date=cls.send_date, wave_count=3, wave_interval=90)
+
+    def test_create_waves(self):
+        waves = self.msgdist.create_waves()
+        self.assertEqual([w.size for w in waves], [3, 2, 2])
+        self.assertEqual([w.offset for w in waves], [0, 3, 5])
+        self.assertEqual([w.send_date for w in waves],
+                         [self.send_date + timedelta(minutes=90 * i) for i in range(3)])
+        recipients = [link.pk for wave in waves for link in wave.get_links()]
+        self.assertEqual(recipients, list(self.msgdist.links.order_by('pk').values_list('pk', flat=True)))
+
+    def test_create_waves_more_waves_than_recipients(self):
+        self.msgdist.wave_count = 10
+        waves = self.msgdist.create_waves()
+        self.assertEqual(len(waves), 7)
+        self.assertTrue(all(w.size == 1 for w in waves))
+
+    @patch('distributions.client.distributions')
+    def test_send_wave(self, distributions_mock):
+        distributions_mock.return_value.send.return_value = 'EMD_1'
+        wave = self.msgdist.create_waves()[1]
+        wave.qx_batch_id = 'BT_1'
+        wave.save()
+
+        self.assertEqual(tasks.send_wave(wave.pk), 'EMD_1')
+
+        wave.refresh_from_db()
+        self.assertEqual(wave.status, MessageDistributionWave.STATUS_SENT)
+        kwargs = distributions_mock.return_value.send.call_args.kwargs
+        self.assertEqual(kwargs['batch_id'], 'BT_1')
+        self.assertEqual(kwargs['send_date'], self.send_date + timedelta(minutes=90))
+
+    def test_finalize_wave_distribution(self):
+        tasks.finalize_wave_distribution(['EMD_1', 'EMD_2', 'EMD_3'], self.msgdist.pk)
+        self.msgdist.refresh_from_db()
+        self.assertEqual(self.msgdist.qx_id, 'EMD_1')
+        self.assertIsNotNone(self.msgdist.qx_created_date)
+
+    def test_finalize_wave_distribution_without_waves(self):
+        run = PipelineRun.objects.create(message_distribution=self.msgdist)
+        self.assertIsNone(tasks.finalize_wave_distribution([], self.msgdist.pk))
+        self.msgdist.refresh_from_db()
+        self.assertIsNone(self.msgdist.qx_id)
+        run.refresh_from_db()
+        self.assertTrue(run.failed)
+        self.assertIsNotNone(run.ended_date)
+
+    @patch('distributions.tasks.chord')
+    @patch('distributions.tasks.create_message_distributions')
+    def test_dispatch_single_wave(self, canvas_mock, chord_mock):
+        self.msgdist.wave_count = 1
+        with self.captureOnCommitCallbacks() as callbacks:
+            tasks.dispatch_message_distribution(self.msgdist)
+        # Queued once the pipeline run is committed
+        canvas_mock.return_value.delay.assert_not_called()
+        for callback in callbacks:
+            callback()
+        canvas_mock.assert_called_once_with([self.msgdist.pk])
+        canvas_mock.return_value.delay.assert_called_once()
+        chord_mock.assert_not_called()
+
+    @patch('distributions.tasks.chord')
+    def test_dispatch_waves(self, chord_mock):
+        with self.captureOnCommitCallbacks() as callbacks:
+            tasks.dispatch_message_distribution(self.msgdist)
+        chord_mock.assert_not_called()
+        for callback in callbacks:
+            callback()
+        header = chord_mock.call_args.args[0]
+        self.assertEqual(len(header), 3)
+        self.assertEqual(self.msgdist.waves.count(), 3)
+
+
+class PipelineStageTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        manager = ManagerFactory()
+        panelist = PanelistFactory(panel__managers=[manager])
+        link_distribution = LinkDistributionFactory(panels=[panelist.panel], create_links=True)
+        cls.msgdist = MessageDistributionFactory(link_distribution=link_distribution,
+                                                 links=link_distribution.links.all())
+
+    @patch('distributions.tasks.create_message_distributions')
+    def test_dispatch_starts_run(self, canvas_mock):
+        tasks.dispatch_message_distribution(self.msgdist)
+        self.assertEqual(self.msgdist.pipeline_runs.count(), 1)
+
+    @patch('distributions.client.request_count', side_effect=[10, 12])
+    @patch('distributions.client.create_transaction_batch', return_value='BT_1')
+    def test_stage_recorded(self, batch_mock, count_mock):
+        run = PipelineRun.objects.create(message_distribution=self.msgdist)
+        tasks.create_transaction_batch(self.msgdist.pk)
+        stage = run.stages.get()
+        self.assertEqual(stage.name, PipelineStage.TRANSACTION_BATCH)
+        self.assertEqual(stage.qx_calls, 2)
+        self.assertIsNotNone(stage.ended_date)
+        run.refresh_from_db()
+        self.assertIsNone(run.ended_date)
+
+    @patch('distributions.client.request_count', side_effect=[0, 1, 1, 2])
+    @patch('distributions.client.contact_imports')
+    def test_stage_spanning_retries(self, imports_mock, count_mock):
+        imports_mock.return_value.progress.return_value = 50
+        run = PipelineRun.objects.create(message_distribution=self.msgdist)
+        import_spec = (self.msgdist.pk, 'ML_1', 'PGR_1')
+        with self.assertRaises(tasks.ImportInProgress):
+            tasks.wait_until_import_completes.run(import_spec, message_distribution=True)
+        imports_mock.return_value.progress.return_value = 100
+        tasks.wait_until_import_completes.run(import_spec, message_distribution=True)
+        stage = run.stages.get()
+        self.assertEqual(stage.qx_calls, 2)
+        self.assertIsNotNone(stage.ended_date)
+
+    def test_no_run(self):
+        with tasks.pipeline_stage(tasks.send_message_distribution, self.msgdist, PipelineStage.SEND) as stage:
+            stage.item_count = 1
+        self.assertFalse(PipelineStage.objects.exists())
+
+
+class MessageAndFallbackTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        manager = ManagerFactory()
+        email_panelist = PanelistFactory(panel__managers=[manager], phone=None)
+        sms_panelist = PanelistFactory(panel=email_panelist.panel, email=None)
+        link_distribution = LinkDistributionFactory(panels=[email_panelist.panel], create_links=True)
+        cls.msgdist = MessageDistributionFactory(link_distribution=link_distribution,
+                                                 links=link_distribution.links.filter(profile=email_panelist))
+        cls.fallback = MessageDistributionFactory(link_distribution=link_distribution, fallback_of=cls.msgdist,
+                                                  contact_mode=MessageDistribution.MODE_SMS,
+                                                  links=link_distribution.links.filter(profile=sms_panelist))
+        cls.msgdist.refresh_from_db()
+
+    @patch('distributions.tasks.create_message_distributions')
+    def test_dispatch_with_fallback(self, canvas_mock):
+        tasks.dispatch_message_distribution(self.msgdist)
+        canvas_mock.assert_called_once_with([self.msgdist.pk, self.fallback.pk])
+        self.assertEqual(PipelineRun.objects.count(), 2)
+
+    def test_serialize_contacts(self):
+        tasks.serialize_contacts([self.msgdist.pk, self.fallback.pk])
+        contacts = services.get_contacts_snapshot(self.fallback.pk)
+        self.assertEqual(contacts, self.fallback.contacts_for_import())
+        self.assertEqual(len(contacts), 1)
+        self.assertIn('transactionData', contacts[0])
+
+    @patch('distributions.client.import_contacts', return_value='PGR_1')
+    def test_import_uses_snapshot(self, import_mock):
+        cache.set(services.CONTACTS_SNAPSHOT_KEY.format(dist_id=self.msgdist.pk), [{'extRef': 'sentinel'}])
+        tasks.start_contact_import(self.msgdist.pk, message_distribution=True)
+        self.assertEqual(import_mock.call_args.kwargs['contacts'], [{'extRef': 'sentinel'}])
+        self.assertIsNone(services.get_contacts_snapshot(self.msgdist.pk))
+
+    @patch('distributions.tasks.send_message_distribution', side_effect=['EMD_1', 'SMSD_1'])
+    def test_send_message_distributions(self, send_mock):
+        result = tasks.send_message_distributions([self.msgdist.pk, self.fallback.pk])
+        self.assertEqual(result, ['EMD_1', 'SMSD_1'])
+
+    @patch('distributions.tasks._send')
+    def test_retry_send_message_distributions(self, send_mock):
+        """Distributions already sent are not sent again when the fallback's send is retried"""
+        error = client.QxServerError(status_code=503, reason='Service Unavailable', error_message='',
+                                     error_code='', request_id='')
+        send_mock.side_effect = ['EMD_1', error, 'SMSD_1']
+        with self.assertRaises(client.QxServerError):
+            tasks.send_message_distributions([self.msgdist.pk, self.fallback.pk])
+        result = tasks.send_message_distributions([self.msgdist.pk, self.fallback.pk])
+        self.assertEqual(result, ['EMD_1', 'SMSD_1'])
+        self.assertEqual(send_mock.call_count, 3)
+
+    def test_create_message_distributions_canvas(self):
+        canvas = tasks.create_message_distributions([self.msgdist.pk, self.fallback.pk])
+        first, imports = canvas.tasks
+        self.assertEqual(first.task, tasks.serialize_contacts.name)
+        self.assertEqual(len(imports.tasks), 2)
+        self.assertEqual(imports.body.task, tasks.send_message_distributions.name)
+
+
+@patch('distributions.tasks.dispatch_message_distribution')
+class ScheduledSendTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        manager = ManagerFactory()
+        panelist = PanelistFactory(panel__managers=[manager])
+        link_distribution = LinkDistributionFactory(panels=[panelist.panel], create_links=True)
+        cls.msgdist = MessageDistributionFactory(link_distribution=link_distribution,
+                                                 links=link_distribution.links.all())
+
+    def test_send_soon(self, dispatch_mock):
+        self.msgdist.send_date = datetime.now(timezone.utc) + timedelta(minutes=5)
+        tasks.schedule_message_distribution(self.msgdist)
+        dispatch_mock.assert_called_once_with(self.msgdist)
+        self.assertFalse(ScheduledSend.objects.exists())
+
+    @patch('distributions.tasks.dispatch_scheduled_send.apply_async')
+    def test_send_later(self, apply_mock, dispatch_mock):
+        self.msgdist.send_date = datetime.now(timezone.utc) + timedelta(days=3)
+        scheduled = tasks.schedule_message_distribution(self.msgdist)
+        dispatch_mock.assert_not_called()
+        apply_mock.assert_not_called()
+        self.assertTrue(scheduled.is_pending)
+        self.assertEqual(self.msgdist.pending_send, scheduled)
+
+    @patch('distributions.tasks.dispatch_scheduled_send.apply_async')
+    def test_dispatch_due_sends(self, apply_mock, dispatch_mock):
+        now = datetime.now(timezone.utc)
+        overdue = ScheduledSend.objects.create(message_distribution=self.msgdist, eta=now - timedelta(hours=1))
+        later = MessageDistributionFactory(link_distribution=self.msgdist.link_distribution)
+        ScheduledSend.objects.create(message_distribution=later, eta=now + timedelta(days=1))
+        self.assertEqual(tasks.dispatch_due_sends(), 1)
+        self.assertEqual(apply_mock.call_args.args[0], (overdue.pk,))
+
+    def test_dispatch_scheduled_send_once(self, dispatch_mock):
+        scheduled = ScheduledSend.objects.create(message_distribution=self.msgdist, eta=datetime.now(timezone.utc))
+        self.assertEqual(tasks.dispatch_scheduled_send(scheduled.pk), self.msgdist.pk)
+        self.assertIsNone(tasks.dispatch_scheduled_send(scheduled.pk))
+        dispatch_mock.assert_called_once()
+        scheduled.refresh_from_db()
+        self.assertFalse(scheduled.is_pending)
+
+    def test_dispatch_scheduled_send_deleting(self, dispatch_mock):
+        """Sends coming due while their distribution or its link set is being deleted are cancelled"""
+        for dist in (self.msgdist, self.msgdist.link_distribution):
+            with self.subTest(dist=dist):
+                dist.is_deleting = True
+                dist.save()
+                scheduled = ScheduledSend.objects.create(message_distribution=self.msgdist,
+                                                         eta=datetime.now(timezone.utc))
+                self.assertIsNone(tasks.dispatch_scheduled_send(scheduled.pk))
+                scheduled.refresh_from_db()
+                self.assertEqual(scheduled.status, ScheduledSend.STATUS_CANCELLED)
+                dist.is_deleting = False
+                dist.save()
+                scheduled.delete()
+        dispatch_mock.assert_not_called()
+
+
+class DeletionTestCase(TestCase):
+
+    def setUp(self):
+        manager = ManagerFactory()
+        panelist = PanelistFactory(panel__managers=[manager])
+        PanelistFactory.create_batch(3, panel=panelist.panel)
+        self.link_distribution = LinkDistributionFactory(panels=[panelist.panel], create_links=True)
+        self.msgdist = MessageDistributionFactory(link_distribution=self.link_distribution,
+                                                  links=self.link_distribution.links.all())
+        self.fallback = MessageDistributionFactory(link_distribution=self.link_distribution, fallback_of=self.msgdist,
+                                                   contact_mode=MessageDistribution.MODE_SMS,
+                                                   links=self.link_distribution.links.all()[:1])
+        SMSStats.objects.create(panelist=panelist, msgdist=self.fallback)
+        self.msgdist.refresh_from_db()
+
+    @patch('distributions.tasks.delete_distribution.delay')
+    def test_start_deletion(self, delay_mock):
+        job = tasks.start_deletion(self.msgdist)
+        self.msgdist.refresh_from_db()
+        self.fallback.refresh_from_db()
+        self.assertTrue(self.msgdist.is_deleting)
+        self.assertTrue(self.fallback.is_deleting)
+        self.assertEqual(job.status, DeletionJob.STATUS_PENDING)
+
+    @patch('distributions.tasks.DELETION_BATCH_SIZE', 2)
+    def test_delete_message_distribution(self):
+        job = DeletionJob.objects.create(kind=DeletionJob.KIND_MESSAGE, message_distribution=self.msgdist)
+        tasks.delete_distribution(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, DeletionJob.STATUS_DONE)
+        self.assertEqual((job.total_rows, job.deleted_rows, job.progress), (6, 6, 100))
+        self.assertFalse(MessageDistribution.objects.exists())
+        self.assertFalse(SMSStats.objects.exists())
+        self.assertEqual(Link.objects.count(), 4)
+
+    @patch('distributions.tasks.DELETION_BATCH_SIZE', 2)
+    def test_delete_link_distribution(self):
+        job = DeletionJob.objects.create(kind=DeletionJob.KIND_LINK, link_distribution=self.link_distribution)
+        tasks.delete_distribution(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, DeletionJob.STATUS_DONE)
+        self.assertEqual(job.total_rows, 10)
+        self.assertFalse(LinkDistribution.objects.exists())
+        self.assertFalse(MessageDistribution.objects.exists())
+        self.assertFalse(Link.objects.exists())
@@ -1,11 +1,13 @@
 # -- STDLIB
 import logging
+from datetime import timedelta
 
 # -- DJANGO
 from django.conf import settings
 from django.contrib import messages
 from django.db import transaction
 from django.db.models import Count
+from django.http import HttpResponseRedirect
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
 from django.views import generic
@@ -13,8 +15,8 @@ from django.views import generic
 # -- QXSMS (LOCAL)
 from . import forms, services, tasks
 from .forms import LinkDistributionGenerateForm
-from .models import LinkDistribution, MessageDistribution
-from .tasks import create_message_distribution
+from .models import DeletionJob, LinkDistribution, MessageDistribution
+from .tasks import schedule_message_distribution
 
 logger_name = __name__
 if settings.DEBUG:
@@ -36,7 +38,7 @@ class LinkDistributionCreate(generic.CreateView):
 
 
 class LinkDistributionDetail(generic.DetailView):
-    queryset = LinkDistribution.objects.annotate(Count('link'))
+    queryset = LinkDistribution.objects.filter(is_deleting=False).annotate(Count('link'))
     template_name = 'distributions/detail.html'
 
     def get_context_data(self, **kwargs):
@@ -58,7 +60,7 @@ class LinkDistributionHistory(generic.detail.SingleObjectMixin, generic.ListView
     template_name = 'distributions/history.html'
 
     def get(self, request, *args, **kwargs):
-        qs = LinkDistribution.objects.filter(qx_id__isnull=False).annotate(Count('link'))
+        qs = LinkDistribution.objects.filter(qx_id__isnull=False, is_deleting=False).annotate(Count('link'))
         self.object = super().get_object(queryset=qs)
         return super().get(request, *args, **kwargs)
 
@@ -78,29 +80,51 @@ class LinkDistributionHistory(generic.detail.SingleObjectMixin, generic.ListView
 class LinkDistributionGenerate(generic.UpdateView):
     template_name = 'distributions/generate.html'
     form_class = LinkDistributionGenerateForm
-    queryset = LinkDistribution.objects.all()
+    queryset = LinkDistribution.objects.filter(is_deleting=False)
     if not settings.DEBUG:
         queryset = queryset.filter(qx_id__isnull=True)
 
     def form_valid(self, form):
         response = super().form_valid(form)
         self.object.save_links()
-        tasks.create_link_distribution.delay(dist_id=self.object.pk)
+        tasks.dispatch_link_distribution(self.object)
         return response
 
 
-class LinkDistributionList(generic.ListView):
+class DeletionJobsMixin:
+    """Add recent deletion jobs of the listed kind of distribution to the context, to show their progress"""
+    deletion_kind = None
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        since = timezone.now() - timedelta(days=1)
+        context['deletion_jobs'] = DeletionJob.objects.filter(kind=self.deletion_kind, created_date__gte=since)
+        return context
+
+
+class LinkDistributionList(DeletionJobsMixin, generic.ListView):
     template_name = 'distributions/list.html'
-    queryset = LinkDistribution.objects.select_related('survey')
+    queryset = LinkDistribution.objects.filter(is_deleting=False).select_related('survey')
+    deletion_kind = DeletionJob.KIND_LINK
+
 
+class BackgroundDeleteMixin:
+    """Hand the deletion of the object over to a celery task, as it may have a lot of dependent rows"""
 
-class LinkDistributionDelete(generic.DeleteView):
+    def delete(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        success_url = self.get_success_url()
+        tasks.start_deletion(self.object)
+        return HttpResponseRedirect(success_url)
+
+
+class LinkDistributionDelete(BackgroundDeleteMixin, generic.DeleteView):
     template_name = "distributions/delete.html"
     model = LinkDistribution
     success_message = None
 
     def get_queryset(self):
-        return super().get_queryset().filter(expiration_date=None)
+        return super().get_queryset().filter(expiration_date=None, is_deleting=False)
 
     def delete(self, request, *args, **kwargs):
         response = super().delete(request, *args, **kwargs)
@@ -112,8 +136,9 @@ class LinkDistributionDelete(generic.DeleteView):
 # ---------------------
 
 
-class MessageDistributionList(generic.ListView):
+class MessageDistributionList(DeletionJobsMixin, generic.ListView):
     template_name = "distributions/msgd/list.html"
+    deletion_kind = DeletionJob.KIND_MESSAGE
 
     def get_queryset(self):
         related = (
@@ -124,6 +149,8 @@ class MessageDistributionList(generic.ListView):
         )
         kwargs = {
             'fallback_of__isnull': True,
+            'is_deleting': False,
+            'link_distribution__is_deleting': False,
         }
         return MessageDistribution.objects.filter(**kwargs).select_related(*related)
 
@@ -179,6 +206,8 @@ class MessageDistributionFallbackCreate(generic.detail.SingleObjectMixin, generi
             'fallback__isnull': True,
             'fallback_of__isnull': True,
             'send_date__isnull': True,
+            'is_deleting': False,
+            'link_distribution__is_deleting': False,
         }
         return MessageDistribution.objects.filter(**kwargs)
 
@@ -212,7 +241,9 @@ class MessageDistributionSend(generic.UpdateView):
     def get_queryset(self):
         filters = {
             'send_date__isnull': True,
-            'fallback_of__isnull': True
+            'fallback_of__isnull': True,
+            'is_deleting': False,
+            'link_distribution__is_deleting': False,
         }
         return MessageDistribution.objects.filter(**filters)
 
@@ -237,30 +268,31 @@ class MessageDistributionSend(generic.UpdateView):
         # Freeze the set of recipients
         history = self.get_history()
         self.object.save_links(history=history)
-        create_message_distribution.delay(self.object.pk)
         if self.object.has_fallback:
-            self.object.fallback.save_links(history=history)
-            create_message_distribution.delay(self.object.fallback.pk)
+            fallback = self.object.fallback
+            fallback.wave_count = self.object.wave_count
+            fallback.wave_interval = self.object.wave_interval
+            fallback.save()
+            fallback.save_links(history=history)
+        schedule_message_distribution(self.object)
         return response
 
 
 class MessageDistributionDetail(generic.DetailView):
     template_name = "distributions/msgd/detail.html"
-    queryset = MessageDistribution.objects.annotate(Count('links'))
+    queryset = MessageDistribution.objects.filter(is_deleting=False, link_distribution__is_deleting=False)\
+        .annotate(Count('links'))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         skip_cache = 'nocache' in self.request.GET
         if self.object.qx_id is not None:
-            context['stats'] = services.get_distribution_stats(qx_id=self.object.qx_id,
-                                                               survey_id=settings.QXSMS_SEND_SURVEY,
-                                                               skip_cache=skip_cache,
-                                                               is_sms=self.object.is_sms)
+            context['stats'] = services.get_message_distribution_stats(self.object, skip_cache=skip_cache)
         return context
 
 
 class MessageDistributionUpdate(generic.UpdateView):
-    model = MessageDistribution
+    queryset = MessageDistribution.objects.filter(is_deleting=False, link_distribution__is_deleting=False)
     template_name = "distributions/msgd/update.html"
     fields = ['description']
 
@@ -278,10 +310,10 @@ class MessageDistributionUpdate(generic.UpdateView):
         return response
 
 
-class MessageDistributionDelete(generic.DeleteView):
+class MessageDistributionDelete(BackgroundDeleteMixin, generic.DeleteView):
     template_name = "distributions/msgd/delete.html"
     model = MessageDistribution
 
     def get_queryset(self):
-        return super().get_queryset().filter(qx_id=None, qx_created_date=None,
+        return super().get_queryset().filter(qx_id=None, qx_created_date=None, is_deleting=False,
                                              send_date=None, fallback_of__send_date=None)
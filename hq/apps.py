@@ -1,6 +1,25 @@
 # -- DJANGO
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save, pre_delete
 
 
 class HqConfig(AppConfig):
     name = 'hq'
+
+    def ready(self):
+        # -- QXSMS
+        from hq.models import Panel
+        from hq.signals import (
+            bump_blank_slots_version, bump_profiles_version,
+            summarize_profile_sms_stats,
+        )
+        from panelist.models import BlankSlot, BlankSlotValue, Profile
+
+        # Exports of panelists and blank slots are written again once these change
+        for signal in (post_save, post_delete):
+            signal.connect(bump_profiles_version, sender=Profile)
+            signal.connect(bump_profiles_version, sender=Panel)
+            signal.connect(bump_blank_slots_version, sender=BlankSlot)
+            signal.connect(bump_blank_slots_version, sender=BlankSlotValue)
+        # Their SMS statuses being deleted with them, summaries are counted again without them
+        pre_delete.connect(summarize_profile_sms_stats, sender=Profile)
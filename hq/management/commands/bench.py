@@ -0,0 +1,202 @@
+# -- STDLIB
+import json
+import time
+import tracemalloc
+
+# -- DJANGO
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+
+# -- THIRDPARTY
+import tablib
+
+# -- QXSMS
+from distributions import services
+from distributions.factories import (
+    LinkDistributionFactory, MessageDistributionFactory,
+)
+from distributions.models import Link, MessageDistribution
+from hq.factories import PanelFactory
+from manager.management.commands.fakecsv import fake_dataset
+from manager.tasks import import_dataset
+from panelist.models import BlankSlot, Profile
+from utils.csvimport import BlankSlotValueResource, ProfileResource
+
+BLANK_SLOTS = 5
+HISTORY_STATUSES = ['Pending', 'Opened', 'SurveyStarted', 'SurveyFinished', 'SurveyPartiallyFinished']
+
+
+def measure_time(fn):
+    """Run `fn`, and return its wall time and number of queries"""
+    queries = 0
+
+    def count_queries(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    with connection.execute_wrapper(count_queries):
+        fn()
+    elapsed = time.perf_counter() - start
+    return {'time': round(elapsed, 3), 'queries': queries}
+
+
+def measure_memory(fn):
+    """Run `fn`, and return the peak memory allocated by Python
+
+    Tracing allocations slows Python code down severalfold, so it is never done on timed runs.
+    """
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'peak_memory': peak}
+
+
+class Bench:
+    """Benchmarks of a synthetic panel of the profiles of `dataset`, run in order
+
+    Each benchmark prepares its data, partly from the previous ones, and returns the function to measure.
+    Links are generated and histories made up locally: Qualtrics is never called.
+    """
+
+    BENCHMARKS = {
+        'import-dry-run': 'import_dry_run',
+        'import': 'import_profiles',
+        'export': 'export',
+        'blank-slot-import': 'blank_slot_import',
+        'link-generation': 'link_generation',
+        'candidate-selection': 'candidate_selection',
+        'stats': 'stats',
+    }
+
+    def __init__(self, dataset):
+        self.panel = PanelFactory()
+        self.dataset = dataset
+        self.dry_run_errors = {}
+        self.link_distribution = None
+        self.message_distribution = None
+        self.history = []
+
+    def import_dry_run(self):
+        def run():
+            self.dry_run_errors = import_dataset(self.panel.pk, self.dataset, dry_run=True)[1]
+        return run
+
+    def import_profiles(self):
+        # Generated rows may be invalid, the import would be rolled back
+        rows = [row for number, row in enumerate(self.dataset, 1) if number not in self.dry_run_errors]
+        dataset = tablib.Dataset(*rows, headers=self.dataset.headers)
+        return lambda: import_dataset(self.panel.pk, dataset, dry_run=False)
+
+    def export(self):
+        return lambda: list(ProfileResource(panel_id=self.panel.pk).iter_export())
+
+    def blank_slot_import(self):
+        # Names are unique, the panel's keeps them apart from existing blank slots
+        names = [BlankSlot.objects.create(name=f'bench{self.panel.pk}x{i}', description='bench').name
+                 for i in range(BLANK_SLOTS)]
+        profiles = Profile.objects.filter(panel=self.panel).values_list('ess_id', 'country')
+        dataset = tablib.Dataset(*[(ess_id, country, name, 'value') for ess_id, country in profiles for name in names],
+                                 headers=['idno', 'cntry', 'addvar', 'value'])
+        return lambda: BlankSlotValueResource(panel_id=self.panel.pk).import_data(dataset)
+
+    def link_generation(self):
+        self.link_distribution = LinkDistributionFactory(panels=[self.panel])
+
+        def run():
+            self.link_distribution.save_links()
+            self.link_distribution.contacts_for_import()
+        return run
+
+    def candidate_selection(self):
+        links = list(self.link_distribution.links.all())
+        for i, link in enumerate(links):
+            link.qx_contact_id = f'CID_{i}'
+        Link.objects.bulk_update(links, ['qx_contact_id'])
+        self.history = [{'contactId': link.qx_contact_id, 'status': HISTORY_STATUSES[i % len(HISTORY_STATUSES)]}
+                        for i, link in enumerate(links)]
+        self.message_distribution = MessageDistributionFactory(link_distribution=self.link_distribution,
+                                                               target=MessageDistribution.TARGET_NOT_FINISHED)
+        return lambda: self.message_distribution.candidates(history=self.history)
+
+    def stats(self):
+        def run():
+            links = self.link_distribution.links.select_related('profile__panel')
+            services.history_links_stats(services.merge_links_and_history(links, self.history))
+            self.message_distribution.get_candidates_stats(self.history)
+        return run
+
+    def run(self, name, measure):
+        return measure(getattr(self, self.BENCHMARKS[name])())
+
+
+class Command(BaseCommand):
+    help = 'Measure import, export, link and stats performance on a synthetic panel, optionally against a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--size', type=int, default=1000, help='Number of profiles of the panel')
+        parser.add_argument('-o', '--output', type=str, help='Save results as JSON under given file name')
+        parser.add_argument('-b', '--baseline', type=str, help='JSON results to compare with')
+        parser.add_argument('-t', '--tolerance', type=float, default=0.25,
+                            help='Relative increase of time or memory over the baseline reported as a regression')
+
+    def read_baseline(self, file, size):
+        try:
+            with open(file) as f:
+                baseline = json.load(f)
+        except (IOError, ValueError) as e:
+            raise CommandError(f"Could not read baseline {file}: {e}")
+        if baseline['size'] != size:
+            raise CommandError(f"The baseline was measured with {baseline['size']} profiles.")
+        return baseline
+
+    def write_report(self, file, report):
+        try:
+            with open(file, 'w') as f:
+                json.dump(report, f, indent=2)
+        except IOError:
+            raise CommandError(f"Could not write results to file: {file}.")
+
+    def handle(self, *args, **options):
+        baseline = options['baseline'] and self.read_baseline(options['baseline'], options['size'])
+
+        dataset = fake_dataset(options['size'])
+        results = {name: {} for name in Bench.BENCHMARKS}
+        # Time and memory are measured on separate runs of the benchmarks, from the same dataset
+        for measure in (measure_time, measure_memory):
+            # Nothing is kept of the synthetic panel
+            with transaction.atomic():
+                bench = Bench(dataset)
+                for name in Bench.BENCHMARKS:
+                    results[name].update(bench.run(name, measure))
+                transaction.set_rollback(True)
+        for name, result in results.items():
+            self.stdout.write(f"{name}: {self.format(result)}")
+
+        if options['output']:
+            self.write_report(options['output'], {'size': options['size'], 'results': results})
+
+        if baseline:
+            regressions = self.compare(results, baseline['results'], options['tolerance'])
+            if regressions:
+                raise CommandError("Regressions over the baseline:\n" + "\n".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regression over the baseline."))
+
+    def format(self, result):
+        return f"{result['time']:0.3f}s, {result['peak_memory'] / 2 ** 20:0.1f} MiB, {result['queries']} queries"
+
+    def compare(self, results, baseline, tolerance):
+        regressions = []
+        for name, result in results.items():
+            base = baseline.get(name)
+            if base is None:
+                continue
+            if (result['time'] > base['time'] * (1 + tolerance)
+                    or result['peak_memory'] > base['peak_memory'] * (1 + tolerance)
+                    or result['queries'] > base['queries']):
+                regressions.append(f"{name}: {self.format(result)} (baseline {self.format(base)})")
+        return regressions
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.12 on 2026-10-19 15:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('hq', '0003_smsstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('version', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('profiles', 'Panelists of a panel'), ('hq-profiles', 'Panelists'), ('blank-slots', 'Additional variables'), ('links', 'Individual links of a survey')], max_length=20)),
+                ('params', models.JSONField(default=dict)),
+                ('data_version', models.CharField(blank=True, max_length=100)),
+                ('file_name', models.CharField(max_length=250)),
+                ('file', models.FileField(blank=True, upload_to='exports/')),
+                ('status', models.PositiveSmallIntegerField(choices=[(0, 'Pending'), (1, 'Running'), (2, 'Done'), (3, 'Failed')], default=0)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('ended_date', models.DateTimeField(null=True)),
+                ('panel', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to='hq.panel')),
+                ('requested_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_date'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.12 on 2026-10-19 15:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hq', '0004_dataversion_exportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='file_format',
+            field=models.CharField(choices=[('csv', 'CSV'), ('parquet', 'Parquet'), ('arrow', 'Arrow')], default='csv', max_length=10),
+        ),
+    ]
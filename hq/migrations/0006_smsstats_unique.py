@@ -0,0 +1,32 @@
+# Generated by Django 3.2.12 on 2026-10-19 15:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('panelist', '0005_profile_import_hash'),
+        ('distributions', '0007_auto_20261019_1434'),
+        ('hq', '0005_exportjob_file_format'),
+    ]
+
+    operations = [
+        # Keep the stats of the newest file of each panelist and message distribution
+        migrations.RunSQL(
+            """
+            DELETE FROM hq_smsstats WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, row_number() OVER (
+                        PARTITION BY panelist_id, msgdist_id ORDER BY datefile DESC NULLS LAST, id DESC
+                    ) AS rank FROM hq_smsstats
+                ) AS ranked WHERE rank > 1
+            )
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterUniqueTogether(
+            name='smsstats',
+            unique_together={('panelist', 'msgdist')},
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.12 on 2026-10-19 15:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('hq', '0006_smsstats_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SMSStatsJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('import', 'Import of SMS statuses'), ('email', 'Email of SMS statuses')], max_length=10)),
+                ('force_save', models.BooleanField(default=False)),
+                ('emails', models.CharField(blank=True, max_length=56)),
+                ('status', models.PositiveSmallIntegerField(choices=[(0, 'Pending'), (1, 'Running'), (2, 'Done'), (3, 'Failed')], default=0)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('ended_date', models.DateTimeField(null=True)),
+                ('requested_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sms_stats_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SMSStatsFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=250)),
+                ('file', models.FileField(blank=True, upload_to='sms-stats/')),
+                ('status', models.PositiveSmallIntegerField(choices=[(0, 'Pending'), (1, 'Running'), (2, 'Done'), (3, 'Failed')], default=0)),
+                ('total_rows', models.PositiveIntegerField(default=0)),
+                ('saved_rows', models.PositiveIntegerField(default=0)),
+                ('errors', models.JSONField(default=list)),
+                ('error', models.CharField(blank=True, max_length=250)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='files', to='hq.smsstatsjob')),
+            ],
+            options={
+                'ordering': ['pk'],
+            },
+        ),
+    ]
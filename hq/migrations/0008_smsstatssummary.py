@@ -0,0 +1,46 @@
+# Generated by Django 3.2.12 on 2026-10-19 15:50
+
+from django.db import migrations, models
+from django.db.models import Count, Value
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def summarize_stats(apps, schema_editor):
+    SMSStats = apps.get_model('hq', 'SMSStats')
+    SMSStatsSummary = apps.get_model('hq', 'SMSStatsSummary')
+    counts = (SMSStats.objects
+              .annotate(status=Coalesce('smsstatus', Value('')), reason=Coalesce('bouncereason', Value('')))
+              .values('msgdist', 'panelist__panel', 'status', 'reason')
+              .annotate(count=Count('pk')))
+    SMSStatsSummary.objects.bulk_create([
+        SMSStatsSummary(msgdist_id=row['msgdist'], panel_id=row['panelist__panel'], smsstatus=row['status'],
+                        bouncereason=row['reason'], count=row['count'])
+        for row in counts
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distributions', '0007_auto_20261019_1434'),
+        ('hq', '0007_smsstatsjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SMSStatsSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('smsstatus', models.CharField(blank=True, max_length=255)),
+                ('bouncereason', models.CharField(blank=True, max_length=255)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('msgdist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sms_summaries', to='distributions.messagedistribution')),
+                ('panel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sms_summaries', to='hq.panel')),
+            ],
+            options={
+                'unique_together': {('msgdist', 'panel', 'smsstatus', 'bouncereason')},
+            },
+        ),
+        migrations.RunPython(summarize_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.2.12 on 2026-10-19 16:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import hq.storage
+
+
+def forget_export_files(apps, schema_editor):
+    # Files written to the filesystem before cannot be read from the database storage
+    apps.get_model('hq', 'ExportJob').objects.exclude(file='').update(file='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hq', '0008_smsstatssummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=250, unique=True)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='exportjob',
+            name='file',
+            field=models.FileField(blank=True, storage=hq.storage.DatabaseStorage(), upload_to='exports/'),
+        ),
+        migrations.CreateModel(
+            name='StoredFileChunk',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('offset', models.PositiveBigIntegerField()),
+                ('data', models.BinaryField()),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='hq.storedfile')),
+            ],
+            options={
+                'unique_together': {('file', 'index')},
+            },
+        ),
+        migrations.RunPython(forget_export_files, migrations.RunPython.noop),
+    ]
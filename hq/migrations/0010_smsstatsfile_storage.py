@@ -0,0 +1,19 @@
+# Generated by Django 3.2.12 on 2026-10-19 16:04
+
+from django.db import migrations, models
+import hq.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hq', '0009_storedfile'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='smsstatsfile',
+            name='file',
+            field=models.FileField(blank=True, storage=hq.storage.DatabaseStorage(), upload_to='sms-stats/'),
+        ),
+    ]
@@ -1,11 +1,16 @@
 # -- STDLIB
 import logging
+import weakref
 
 # -- DJANGO
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.utils.translation import gettext_lazy as _
 
+# -- QXSMS (LOCAL)
+from .storage import database_storage
+
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
@@ -27,6 +32,8 @@ class Panel(models.Model):
 
 
 class SMSStats(models.Model):
+    class Meta:
+        unique_together = ('panelist', 'msgdist')
     panelist = models.ForeignKey("panelist.Profile", on_delete=models.CASCADE)
     msgdist = models.ForeignKey("distributions.MessageDistribution", on_delete=models.CASCADE)
     smsstatus = models.CharField(max_length=255, null=True)
@@ -35,3 +42,217 @@ class SMSStats(models.Model):
 
     def __repr__(self):
         return f"{self.panelist}|{self.msgdist}|{self.datefile}"
+
+
+class SMSStatsSummary(models.Model):
+    """Number of SMS statuses of a message distribution by panel, status and bounce reason
+
+    Counted again for the message distributions of each imported file, so that pages do not read every status,
+    and for those of a deleted profile, whose statuses are deleted with it.
+    """
+    class Meta:
+        unique_together = ('msgdist', 'panel', 'smsstatus', 'bouncereason')
+    msgdist = models.ForeignKey("distributions.MessageDistribution", on_delete=models.CASCADE,
+                                related_name='sms_summaries')
+    panel = models.ForeignKey(Panel, on_delete=models.CASCADE, related_name='sms_summaries')
+    smsstatus = models.CharField(max_length=255, blank=True)
+    bouncereason = models.CharField(max_length=255, blank=True)
+    count = models.PositiveIntegerField(default=0)
+
+    def __repr__(self):
+        return f"{self.panel}|{self.msgdist}|{self.smsstatus}|{self.bouncereason}:{self.count}"
+
+
+class DataVersion(models.Model):
+    """Counter bumped whenever a set of data changes, telling whether exports of this data are up to date"""
+
+    PROFILES = 'profiles'
+    BLANK_SLOTS = 'blank-slots'
+
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}:{self.version}"
+
+    @classmethod
+    def bump(cls, name):
+        if not cls.objects.filter(name=name).update(version=F('version') + 1):
+            cls.objects.get_or_create(name=name, defaults={'version': 1})
+
+    @classmethod
+    def bump_on_commit(cls, name):
+        """Bump the version of `name` once the current transaction commits, once however many changes it makes
+
+        Bumping right away would lock the row of the version until the commit, so that concurrent imports
+        and edits would wait for each other. Pending bumps are kept on the connection by weak references,
+        which are dropped with the callbacks of rolled back transactions and savepoints, such as dry runs.
+        """
+        connection = transaction.get_connection()
+        if not hasattr(connection, 'pending_data_versions'):
+            connection.pending_data_versions = weakref.WeakValueDictionary()
+        pending = connection.pending_data_versions
+        if name in pending:
+            return
+
+        def callback():
+            pending.pop(name, None)
+            cls.bump(name)
+        pending[name] = callback
+        transaction.on_commit(callback)
+
+    @classmethod
+    def stamp(cls, *names) -> str:
+        """Current versions of the sets of data `names`"""
+        versions = dict(cls.objects.filter(name__in=names).values_list('name', 'version'))
+        return ",".join(f"{name}:{versions.get(name, 0)}" for name in names)
+
+
+class StoredFile(models.Model):
+    """File of the database storage, such as an export, written by chunks"""
+    name = models.CharField(max_length=250, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    created_date = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class StoredFileChunk(models.Model):
+    class Meta:
+        unique_together = ('file', 'index')
+
+    file = models.ForeignKey(StoredFile, on_delete=models.CASCADE, related_name='chunks')
+    index = models.PositiveIntegerField()
+    offset = models.PositiveBigIntegerField()
+    data = models.BinaryField()
+
+
+class ExportJob(models.Model):
+    """Export file written in the background by a celery worker, offered for download once done
+
+    The file is kept in the database, which the workers share with the web application.
+    """
+
+    KIND_PROFILES = 'profiles'
+    KIND_HQ_PROFILES = 'hq-profiles'
+    KIND_BLANK_SLOTS = 'blank-slots'
+    KIND_LINKS = 'links'
+    KIND_CHOICES = (
+        (KIND_PROFILES, _("Panelists of a panel")),
+        (KIND_HQ_PROFILES, _("Panelists")),
+        (KIND_BLANK_SLOTS, _("Additional variables")),
+        (KIND_LINKS, _("Individual links of a survey")),
+    )
+
+    STATUS_PENDING = 0
+    STATUS_RUNNING = 1
+    STATUS_DONE = 2
+    STATUS_FAILED = 3
+    STATUS_CHOICES = (
+        (STATUS_PENDING, _("Pending")),
+        (STATUS_RUNNING, _("Running")),
+        (STATUS_DONE, _("Done")),
+        (STATUS_FAILED, _("Failed")),
+    )
+
+    FORMAT_CSV = 'csv'
+    FORMAT_PARQUET = 'parquet'
+    FORMAT_ARROW = 'arrow'
+    FORMAT_CHOICES = (
+        (FORMAT_CSV, _("CSV")),
+        (FORMAT_PARQUET, _("Parquet")),
+        (FORMAT_ARROW, _("Arrow")),
+    )
+    # Extensions of the files of each format, CSV files are compressed
+    FORMAT_EXTENSIONS = {
+        FORMAT_CSV: 'csv.gz',
+        FORMAT_PARQUET: 'parquet',
+        FORMAT_ARROW: 'arrow',
+    }
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    requested_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_jobs')
+    panel = models.ForeignKey(Panel, null=True, on_delete=models.CASCADE, related_name='export_jobs')
+    params = models.JSONField(default=dict)
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default=FORMAT_CSV)
+    # Versions of the exported data, exports are not reused when blank
+    data_version = models.CharField(max_length=100, blank=True)
+    file_name = models.CharField(max_length=250)
+    file = models.FileField(upload_to='exports/', storage=database_storage, blank=True)
+    status = models.PositiveSmallIntegerField(choices=STATUS_CHOICES, default=STATUS_PENDING)
+    created_date = models.DateTimeField(auto_now_add=True)
+    ended_date = models.DateTimeField(null=True)
+
+    class Meta:
+        ordering = ['-created_date']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} ({self.file_name})"
+
+    @property
+    def download_name(self):
+        extension = self.FORMAT_EXTENSIONS[self.file_format]
+        return f"{self.created_date.strftime('%Y-%m-%d-%H%M')}-{self.file_name}.{extension}"
+
+
+class SMSStatsJob(models.Model):
+    """SMS statuses files uploaded by a staff member, imported or emailed in the background by a celery worker"""
+
+    KIND_IMPORT = 'import'
+    KIND_EMAIL = 'email'
+    KIND_CHOICES = (
+        (KIND_IMPORT, _("Import of SMS statuses")),
+        (KIND_EMAIL, _("Email of SMS statuses")),
+    )
+
+    STATUS_PENDING = 0
+    STATUS_RUNNING = 1
+    STATUS_DONE = 2
+    STATUS_FAILED = 3
+    STATUS_CHOICES = (
+        (STATUS_PENDING, _("Pending")),
+        (STATUS_RUNNING, _("Running")),
+        (STATUS_DONE, _("Done")),
+        (STATUS_FAILED, _("Failed")),
+    )
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    requested_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sms_stats_jobs')
+    # Save statuses of older files over those of newer ones
+    force_save = models.BooleanField(default=False)
+    # Recipients of the report of emailed statuses, separated by semicolons
+    emails = models.CharField(max_length=56, blank=True)
+    status = models.PositiveSmallIntegerField(choices=STATUS_CHOICES, default=STATUS_PENDING)
+    created_date = models.DateTimeField(auto_now_add=True)
+    ended_date = models.DateTimeField(null=True)
+
+    class Meta:
+        ordering = ['-created_date']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} ({self.created_date:%Y-%m-%d %H:%M})"
+
+    @property
+    def ended(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+
+class SMSStatsFile(models.Model):
+    """File of a SMS statuses job, staged in the database until a worker processes it, and the summary of its rows"""
+
+    job = models.ForeignKey(SMSStatsJob, on_delete=models.CASCADE, related_name='files')
+    name = models.CharField(max_length=250)
+    file = models.FileField(upload_to='sms-stats/', storage=database_storage, blank=True)
+    status = models.PositiveSmallIntegerField(choices=SMSStatsJob.STATUS_CHOICES, default=SMSStatsJob.STATUS_PENDING)
+    total_rows = models.PositiveIntegerField(default=0)
+    saved_rows = models.PositiveIntegerField(default=0)
+    # Rows which could not be processed, and what failed for the whole file
+    errors = models.JSONField(default=list)
+    error = models.CharField(max_length=250, blank=True)
+
+    class Meta:
+        ordering = ['pk']
+
+    def __str__(self):
+        return self.name
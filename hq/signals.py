@@ -0,0 +1,23 @@
+# -- DJANGO
+from django.db import transaction
+
+# -- QXSMS
+from utils.smsstats import summarize_stats
+
+# -- QXSMS (LOCAL)
+from .models import DataVersion, SMSStats
+
+
+def bump_profiles_version(sender, *args, **kwargs):
+    DataVersion.bump_on_commit(DataVersion.PROFILES)
+
+
+def bump_blank_slots_version(sender, *args, **kwargs):
+    DataVersion.bump_on_commit(DataVersion.BLANK_SLOTS)
+
+
+def summarize_profile_sms_stats(sender, instance, *args, **kwargs):
+    """Count again the SMS statuses of the message distributions sent to a profile, once it is deleted"""
+    msgdist_ids = list(SMSStats.objects.filter(panelist=instance).values_list('msgdist', flat=True).distinct())
+    if msgdist_ids:
+        transaction.on_commit(lambda: summarize_stats(msgdist_ids))
@@ -0,0 +1,104 @@
+# -- STDLIB
+import io
+
+# -- DJANGO
+from django.apps import apps
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.files import File
+from django.core.files.storage import Storage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import cached_property
+
+
+class StoredFileReader(io.RawIOBase):
+    """Read-only file over the chunks of a StoredFile, read from the database one chunk at a time"""
+
+    def __init__(self, stored_file):
+        self.stored_file = stored_file
+        self.position = 0
+        self.chunk = (0, b'')
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        start = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.stored_file.size}[whence]
+        self.position = max(start + offset, 0)
+        return self.position
+
+    def readinto(self, buffer):
+        if self.position >= self.stored_file.size:
+            return 0
+        offset, data = self.chunk
+        if not offset <= self.position < offset + len(data):
+            chunk = self.stored_file.chunks.filter(offset__lte=self.position).order_by('-offset')
+            offset, data = chunk.values_list('offset', 'data').first()
+            self.chunk = offset, bytes(data)
+            data = self.chunk[1]
+        data = data[self.position - offset:][:len(buffer)]
+        memoryview(buffer).cast('B')[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+@deconstructible
+class DatabaseStorage(Storage):
+    """Files kept in the database by chunks
+
+    The web application and the celery workers share no filesystem: files written by one of them, such as
+    exports or uploads, are read by the other.
+    """
+
+    chunk_size = 1024 * 1024
+
+    @cached_property
+    def stored_files(self):
+        return apps.get_model('hq', 'StoredFile').objects
+
+    def _open(self, name, mode='rb'):
+        if 'w' in mode or 'a' in mode or '+' in mode:
+            raise ValueError("Stored files are read-only")
+        try:
+            stored_file = self.stored_files.get(name=name)
+        except ObjectDoesNotExist:
+            raise FileNotFoundError(name)
+        return File(io.BufferedReader(StoredFileReader(stored_file), buffer_size=self.chunk_size), name=name)
+
+    def _save(self, name, content):
+        content.seek(0)
+        with transaction.atomic():
+            stored_file = self.stored_files.create(name=name)
+            index = 0
+            while True:
+                data = content.read(self.chunk_size)
+                if not data:
+                    break
+                if isinstance(data, str):
+                    data = data.encode()
+                stored_file.chunks.create(index=index, offset=stored_file.size, data=data)
+                stored_file.size += len(data)
+                index += 1
+            stored_file.save(update_fields=['size'])
+        return name
+
+    def delete(self, name):
+        self.stored_files.filter(name=name).delete()
+
+    def exists(self, name):
+        return self.stored_files.filter(name=name).exists()
+
+    def size(self, name):
+        return self.stored_files.get(name=name).size
+
+    def get_created_time(self, name):
+        return self.stored_files.get(name=name).created_date
+
+
+database_storage = DatabaseStorage()
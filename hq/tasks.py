@@ -0,0 +1,112 @@
+# -- STDLIB
+from datetime import timedelta
+
+# -- DJANGO
+from django.db import transaction
+from django.utils import timezone
+
+# -- THIRDPARTY
+from celery import shared_task
+from celery.utils.log import get_task_logger
+
+# -- QXSMS
+from utils.exports import (
+    COLUMNAR_EXPORTS, EXPORTS, get_data_version, write_batches, write_rows,
+)
+from utils.smsstats import email_files, import_files
+
+# -- QXSMS (LOCAL)
+from .models import ExportJob, SMSStatsFile, SMSStatsJob
+
+logger = get_task_logger(__name__)
+
+# Export files are deleted once they are this old
+STALE_EXPORT_AGE = timedelta(days=7)
+
+
+def start_export(kind, user, file_name, panel=None, file_format=ExportJob.FORMAT_CSV, **params) -> ExportJob:
+    """Queue the export of `kind` for `user`, to a file of `file_format`
+
+    The file of an identical export of unchanged data is reused, instead of being written again.
+    """
+    data_version = get_data_version(kind)
+    job = ExportJob.objects.create(kind=kind, requested_by=user, panel=panel, params=params, file_name=file_name,
+                                   file_format=file_format, data_version=data_version)
+    previous = None
+    if data_version:
+        previous = ExportJob.objects.filter(
+            kind=kind, panel=panel, params=params, file_format=file_format, data_version=data_version,
+            status=ExportJob.STATUS_DONE,
+        ).exclude(file='').first()
+    if previous:
+        job.file = previous.file.name
+        job.status = ExportJob.STATUS_DONE
+        job.ended_date = timezone.now()
+        job.save()
+    else:
+        transaction.on_commit(lambda: write_export.delay(job.pk))
+    return job
+
+
+@shared_task
+def write_export(job_id):
+    job = ExportJob.objects.get(pk=job_id)
+    job.status = ExportJob.STATUS_RUNNING
+    job.save(update_fields=['status'])
+    try:
+        if job.file_format == ExportJob.FORMAT_CSV:
+            rows, _ = EXPORTS[job.kind]
+            write_rows(job, rows(job))
+        else:
+            write_batches(job, *COLUMNAR_EXPORTS[job.kind](job))
+    except Exception:
+        logger.exception("Export %s failed", job)
+        job.status = ExportJob.STATUS_FAILED
+    else:
+        job.status = ExportJob.STATUS_DONE
+    job.ended_date = timezone.now()
+    job.save(update_fields=['file', 'status', 'ended_date'])
+
+
+@shared_task
+def discard_stale_exports():
+    """Delete old export jobs, and their files once no other job refers to them"""
+    stale = ExportJob.objects.filter(created_date__lt=timezone.now() - STALE_EXPORT_AGE)
+    names = set(stale.exclude(file='').values_list('file', flat=True))
+    deleted, _ = stale.delete()
+    names -= set(ExportJob.objects.filter(file__in=names).values_list('file', flat=True))
+    for name in names:
+        ExportJob.file.field.storage.delete(name)
+    return deleted
+
+
+def start_sms_stats_job(kind, user, files, force_save=False, emails='') -> SMSStatsJob:
+    """Stage the SMS statuses `files` uploaded by `user` in the database, and queue their import or email"""
+    job = SMSStatsJob.objects.create(kind=kind, requested_by=user, force_save=force_save, emails=emails)
+    for f in files:
+        stats_file = SMSStatsFile(job=job, name=f.name)
+        stats_file.file.save(f.name, f, save=False)
+        stats_file.save()
+    transaction.on_commit(lambda: process_sms_stats.delay(job.pk))
+    return job
+
+
+@shared_task
+def process_sms_stats(job_id):
+    job = SMSStatsJob.objects.get(pk=job_id)
+    job.status = SMSStatsJob.STATUS_RUNNING
+    job.save(update_fields=['status'])
+    try:
+        if job.kind == SMSStatsJob.KIND_EMAIL:
+            email_files(job)
+        else:
+            import_files(job)
+    except Exception:
+        logger.exception("SMS statuses job %s failed", job)
+        job.status = SMSStatsJob.STATUS_FAILED
+        for stats_file in job.files.exclude(file=''):
+            stats_file.file.delete()
+    else:
+        job.status = SMSStatsJob.STATUS_DONE
+    job.ended_date = timezone.now()
+    job.save(update_fields=['status', 'ended_date'])
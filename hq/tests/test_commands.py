@@ -0,0 +1,58 @@
+# -- STDLIB
+import io
+import json
+import tempfile
+import tracemalloc
+
+# -- DJANGO
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+# -- QXSMS
+from hq.management.commands.bench import Bench, measure_memory, measure_time
+from panelist.models import BlankSlot, Profile
+
+
+class BenchTestCase(TestCase):
+
+    def bench(self, *args):
+        out = io.StringIO()
+        call_command('bench', '--size', '3', *args, stdout=out)
+        return out.getvalue()
+
+    def test_bench(self):
+        # Blank slots of the database are left alone
+        BlankSlot.objects.create(name='bench0', description='existing')
+        with tempfile.NamedTemporaryFile(mode='r', suffix='.json') as output:
+            self.bench('--output', output.name)
+            report = json.load(output)
+        self.assertEqual(report['size'], 3)
+        self.assertEqual(list(report['results']), list(Bench.BENCHMARKS))
+        self.assertGreater(report['results']['import']['queries'], 0)
+        # The synthetic panel is not kept
+        self.assertFalse(Profile.objects.exists())
+
+    def test_measure(self):
+        """Allocations are only traced on the runs measuring memory"""
+        tracing = []
+        result = measure_time(lambda: tracing.append(tracemalloc.is_tracing()))
+        self.assertEqual(set(result), {'time', 'queries'})
+        result = measure_memory(lambda: tracing.append(tracemalloc.is_tracing()))
+        self.assertEqual(set(result), {'peak_memory'})
+        self.assertEqual(tracing, [False, True])
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_baseline(self):
+        results = {name: {'time': 1000, 'peak_memory': 2 ** 40, 'queries': 10 ** 6} for name in Bench.BENCHMARKS}
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.json') as baseline:
+            json.dump({'size': 3, 'results': results}, baseline)
+            baseline.flush()
+            self.assertIn("No regression", self.bench('--baseline', baseline.name))
+
+            results['export']['queries'] = 0
+            baseline.seek(0)
+            baseline.truncate()
+            json.dump({'size': 3, 'results': results}, baseline)
+            baseline.flush()
+            with self.assertRaisesMessage(CommandError, "export:"):
+                self.bench('--baseline', baseline.name)
@@ -0,0 +1,31 @@
+# -- DJANGO
+from django.core.files.base import ContentFile
+from django.test import TestCase
+
+# -- QXSMS
+from hq.storage import DatabaseStorage
+
+
+class DatabaseStorageTestCase(TestCase):
+
+    def setUp(self):
+        self.storage = DatabaseStorage()
+        self.storage.chunk_size = 4
+
+    def test_save_and_open(self):
+        name = self.storage.save('exports/file.csv', ContentFile(b'0123456789'))
+        self.assertEqual(self.storage.size(name), 10)
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), b'0123456789')
+            f.seek(5)
+            self.assertEqual(f.read(3), b'567')
+
+        # Names are not reused
+        self.assertNotEqual(self.storage.save('exports/file.csv', ContentFile(b'')), name)
+
+    def test_delete(self):
+        name = self.storage.save('exports/file.csv', ContentFile(b'0123456789'))
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+        with self.assertRaises(FileNotFoundError):
+            self.storage.open(name)
@@ -0,0 +1,168 @@
+# -- STDLIB
+import csv
+import gzip
+import io
+from datetime import timedelta
+from unittest.mock import patch
+
+# -- DJANGO
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+# -- THIRDPARTY
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# -- QXSMS
+from hq import tasks
+from hq.factories import HqFactory
+from hq.models import DataVersion, ExportJob
+from manager.factories import ManagerFactory
+from panelist.factories import PanelistFactory
+from panelist.models import BlankSlot, BlankSlotValue
+
+
+@patch('hq.tasks.write_export.delay')
+class ExportTasksTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hq = HqFactory()
+        cls.nc = ManagerFactory()
+        # Committed, so that data versions are bumped again by the tests
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.panelist = PanelistFactory(panel__managers=[cls.nc])
+
+    def export(self, kind, panel=None, **params):
+        """Start an export, and write it if a worker would"""
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            job = tasks.start_export(kind, self.hq, 'export', panel=panel, **params)
+        if callbacks:
+            tasks.write_export(job.pk)
+        job.refresh_from_db()
+        return job
+
+    def change(self, instance):
+        """Save `instance`, bumping the version of its data as the commit would"""
+        with self.captureOnCommitCallbacks(execute=True):
+            instance.save()
+
+    def read(self, job):
+        with job.file.open('rb') as f:
+            return list(csv.reader(io.StringIO(gzip.decompress(f.read()).decode())))
+
+    def test_write_export(self, write_export):
+        job = self.export(ExportJob.KIND_PROFILES, panel=self.panelist.panel, fields=['ess_id', 'panel__name'])
+        self.assertEqual(job.status, ExportJob.STATUS_DONE)
+        self.assertIsNotNone(job.ended_date)
+        self.assertEqual(self.read(job), [['idno', 'panel'], [str(self.panelist.ess_id), self.panelist.panel.name]])
+
+    def test_write_blank_slot_export(self, write_export):
+        blankslot = BlankSlot.objects.create(name='blankslot1', description='description1')
+        BlankSlotValue.objects.create(blankslot=blankslot, profile=self.panelist, value='value1')
+        job = self.export(ExportJob.KIND_BLANK_SLOTS)
+        self.assertEqual(self.read(job), [['cntry', 'idno', 'addvar', 'value'],
+                                          [self.panelist.country, str(self.panelist.ess_id), 'blankslot1', 'value1']])
+
+        job = self.export(ExportJob.KIND_BLANK_SLOTS, wide=True)
+        self.assertEqual(self.read(job), [['cntry', 'idno', 'blankslot1'],
+                                          [self.panelist.country, str(self.panelist.ess_id), 'value1']])
+
+    def test_write_columnar_export(self, write_export):
+        """Columnar exports keep the types of the values"""
+        self.panelist.education_years = 12
+        self.panelist.email = ''
+        self.panelist.save()
+        readers = {
+            ExportJob.FORMAT_PARQUET: pq.read_table,
+            ExportJob.FORMAT_ARROW: lambda f: pa.ipc.open_file(f).read_all(),
+        }
+        for file_format, read in readers.items():
+            with self.subTest(file_format):
+                job = self.export(ExportJob.KIND_PROFILES, panel=self.panelist.panel, file_format=file_format)
+                self.assertEqual(job.status, ExportJob.STATUS_DONE)
+                self.assertTrue(job.download_name.endswith(f'.{file_format}'))
+                with job.file.open('rb') as f:
+                    row = read(io.BytesIO(f.read())).to_pylist()[0]
+                self.assertEqual(row['idno'], self.panelist.ess_id)
+                self.assertEqual(row['eduyrs'], 12)
+                self.assertIs(row['opto'], False)
+                self.assertIs(row['emailpres'], False)
+                self.assertEqual(row['mobile'], str(self.panelist.phone))
+                self.assertEqual(row['age'], self.panelist.age)
+
+    @patch('utils.exports.ProfileHQResource.iter_export', side_effect=ValueError)
+    def test_write_export_failed(self, iter_export, write_export):
+        job = self.export(ExportJob.KIND_HQ_PROFILES)
+        self.assertEqual(job.status, ExportJob.STATUS_FAILED)
+        self.assertFalse(job.file)
+
+    def test_export_reused(self, write_export):
+        """Identical exports of unchanged data are written once"""
+        first = self.export(ExportJob.KIND_HQ_PROFILES)
+        second = self.export(ExportJob.KIND_HQ_PROFILES)
+        self.assertEqual(write_export.call_count, 1)
+        self.assertEqual((second.status, second.file.name), (ExportJob.STATUS_DONE, first.file.name))
+
+        # Not with other parameters
+        self.export(ExportJob.KIND_PROFILES, panel=self.panelist.panel, exclude_readonly=True)
+        self.assertEqual(write_export.call_count, 2)
+        self.export(ExportJob.KIND_HQ_PROFILES, file_format=ExportJob.FORMAT_PARQUET)
+        self.assertEqual(write_export.call_count, 3)
+
+        # Nor once the data changed
+        self.change(self.panelist)
+        third = self.export(ExportJob.KIND_HQ_PROFILES)
+        self.assertEqual(write_export.call_count, 4)
+        self.assertNotEqual(third.file.name, first.file.name)
+
+    def test_link_export_not_reused(self, write_export):
+        for _ in range(2):
+            tasks.start_export(ExportJob.KIND_LINKS, self.nc, 'export', panel=self.panelist.panel, distribution=1)
+        self.assertFalse(ExportJob.objects.exclude(data_version='').exists())
+
+    def test_data_version(self, write_export):
+        DataVersion.objects.filter(name=DataVersion.PROFILES).update(version=1)
+        self.assertEqual(DataVersion.stamp(DataVersion.PROFILES, DataVersion.BLANK_SLOTS),
+                         'profiles:1,blank-slots:0')
+        with self.captureOnCommitCallbacks(execute=True):
+            BlankSlot.objects.create(name='blankslot1', description='description1')
+        self.change(self.panelist)
+        self.change(self.panelist)
+        self.assertEqual(DataVersion.stamp(DataVersion.PROFILES, DataVersion.BLANK_SLOTS),
+                         'profiles:3,blank-slots:1')
+
+    def test_data_version_bumped_once(self, write_export):
+        """Versions are bumped once per transaction, when it commits"""
+        DataVersion.objects.filter(name=DataVersion.PROFILES).update(version=0)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.panelist.save()
+            self.panelist.panel.save()
+        self.assertEqual(DataVersion.stamp(DataVersion.PROFILES), 'profiles:0')
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertEqual(DataVersion.stamp(DataVersion.PROFILES), 'profiles:1')
+
+    def test_data_version_rolled_back(self, write_export):
+        """Bumps of rolled back savepoints do not hold back those of later changes"""
+        DataVersion.objects.filter(name=DataVersion.PROFILES).update(version=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.panelist.save()
+                transaction.set_rollback(True)
+            self.panelist.save()
+        self.assertEqual(DataVersion.stamp(DataVersion.PROFILES), 'profiles:1')
+
+    def test_discard_stale_exports(self, write_export):
+        stale = self.export(ExportJob.KIND_HQ_PROFILES)
+        reused = self.export(ExportJob.KIND_HQ_PROFILES)
+        self.change(self.panelist)
+        other = self.export(ExportJob.KIND_HQ_PROFILES)
+        ExportJob.objects.filter(pk__in=[stale.pk, other.pk]).update(created_date=timezone.now() - timedelta(days=8))
+
+        self.assertEqual(tasks.discard_stale_exports(), 2)
+        self.assertQuerysetEqual(ExportJob.objects.all(), [reused])
+        # The file of the stale export is still used by the reused one
+        self.assertTrue(ExportJob.file.field.storage.exists(reused.file.name))
+        self.assertFalse(ExportJob.file.field.storage.exists(other.file.name))
@@ -1,4 +1,6 @@
 # -- STDLIB
+import csv
+import io
 from unittest.mock import patch
 
 # -- DJANGO
@@ -15,10 +17,11 @@ from distributions.factories import (
 )
 from distributions.models import MessageDistribution
 from hq.factories import HqFactory
-from hq.models import Panel
+from hq.models import ExportJob, Panel, SMSStats
 from manager.factories import ManagerFactory
 from panelist.factories import PanelistFactory
 from panelist.models import BlankSlot, BlankSlotValue, Profile
+from utils.smsstats import summarize_stats
 
 User = get_user_model()
 
@@ -165,22 +168,19 @@ class BlankSlotTestCase(TestCase):
         self.assertQuerysetEqual(BlankSlot.objects.all(), [])
         self.assertQuerysetEqual(BlankSlotValue.objects.all(), [])
 
-    def test_csv_export(self):
-        bs1 = BlankSlot.objects.create(
-            name='blankslot1',
-            description='description1',
-        )
+    @patch('hq.tasks.write_export.delay')
+    def test_csv_export(self, write_export):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(reverse('hq:blank-slot-export'))
+        job = ExportJob.objects.get()
+        self.assertRedirects(response, reverse('hq:export-job', args=[job.pk]))
+        self.assertEqual(job.kind, ExportJob.KIND_BLANK_SLOTS)
+        self.assertIsNone(job.panel)
+        self.assertEqual(job.params, {'wide': False})
+        write_export.assert_called_once_with(job.pk)
 
-        BlankSlotValue.objects.create(
-            blankslot=bs1,
-            profile=Profile.objects.get(email=self.pm.email),
-            value="value1"
-        )
-
-        response = self.client.get(reverse('hq:blank-slot-export'))
-        self.assertEqual(response.status_code, 200)
-        self.assertContains(response, "blankslot1")
-        self.assertContains(response, "value1")
+        self.client.get(reverse('hq:blank-slot-export'), {'wide': ''})
+        self.assertEqual(ExportJob.objects.latest('pk').params, {'wide': True})
 
 
 @modify_settings(MIDDLEWARE={'remove': 'qxsms.middleware.AuthorizationMiddleware'})
@@ -296,16 +296,30 @@ class ExportCSVPanelistsTestCase(TestCase):
         cls.manager = ManagerFactory()
         cls.pm = PanelistFactory(panel__managers=[cls.manager])
 
-    def test_csv_export(self):
+    @patch('hq.tasks.write_export.delay')
+    def test_csv_export(self, write_export):
         self.client.login(username=self.hq.email, password='hq')
-        response = self.client.get(reverse('hq:panelist-export'))
-        self.assertEqual(response.status_code, 200)
-        self.assertContains(response, self.pm.country)
-        self.assertContains(response, self.pm.panel.name)
-
-        header, other = response.content.decode(response.charset).split("\r\n", 1)
-        fields = header.split(",")
-        self.assertIn('panel', fields)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(reverse('hq:panelist-export'))
+        job = ExportJob.objects.get()
+        self.assertRedirects(response, reverse('hq:export-job', args=[job.pk]))
+        self.assertEqual((job.kind, job.requested_by), (ExportJob.KIND_HQ_PROFILES, self.hq))
+        write_export.assert_called_once_with(job.pk)
+
+    def test_export_job(self):
+        self.client.login(username=self.hq.email, password='hq')
+        job = ExportJob.objects.create(kind=ExportJob.KIND_HQ_PROFILES, requested_by=self.hq, file_name='export')
+        url = reverse('hq:export-job', args=[job.pk])
+        self.assertContains(self.client.get(url), "Export in progress.")
+        response = self.client.get(url, {'format': 'json'})
+        self.assertEqual(response.json(), {'status': ExportJob.STATUS_PENDING, 'status_display': 'Pending',
+                                           'ended': False})
+        # Exports are only offered to whoever requested them
+        other = ExportJob.objects.create(kind=ExportJob.KIND_HQ_PROFILES, requested_by=self.manager,
+                                         file_name='export')
+        self.assertEqual(self.client.get(reverse('hq:export-job', args=[other.pk])).status_code, 404)
+        # Nor downloaded before they are written
+        self.assertEqual(self.client.get(reverse('hq:export-job-download', args=[job.pk])).status_code, 404)
 
 
 class MessageTestCase(TestCase):
@@ -394,3 +408,43 @@ class MessageDistributionDetailTestCase(TestCase):
         url = resolve_url('hq:msg-distribution-detail', pk=self.message_distribution_2.pk)
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
+
+    def test_deleting_distribution_not_found(self):
+        """A distribution whose background deletion has started can no longer be opened, edited or sent"""
+        self.link_distribution_1.is_deleting = True
+        self.link_distribution_1.save()
+        for name in ('hq:msg-distribution-detail', 'hq:msg-distribution-update', 'hq:msg-distribution-send'):
+            with self.subTest(name=name):
+                response = self.client.get(resolve_url(name, pk=self.message_distribution_1.pk))
+                self.assertEqual(response.status_code, 404)
+
+    @patch('distributions.services.get_message_distribution_stats', return_value={})
+    def test_detailed_sms_stats(self, stats_mock):
+        """SMS statuses are summarized, and listed by page"""
+        self.message_distribution_1.qx_id = 'SMSD_1'
+        self.message_distribution_1.save()
+        panelists = [self.pm_1, *PanelistFactory.create_batch(2, panel=self.pm_1.panel)]
+        for panelist in panelists:
+            SMSStats.objects.create(panelist=panelist, msgdist=self.message_distribution_1, smsstatus='Delivered')
+        summarize_stats([self.message_distribution_1.pk])
+        url = resolve_url('hq:msg-distribution-detail', pk=self.message_distribution_1.pk)
+        with patch('hq.views.MessageDistributionDetail.paginated_by', 2):
+            response = self.client.get(url, {'page': 2})
+        self.assertEqual([summary.count for summary in response.context['sms_summaries']], [3])
+        self.assertEqual([stat['panelist'] for stat in response.context['detailedstatssms']], [
+            max(panelists, key=lambda panelist: panelist.ess_id).pk,
+        ])
+
+    def test_download_sms_stats(self):
+        """SMS statuses are streamed with their profile and panel, without a query per row"""
+        panelists = [self.pm_1, *PanelistFactory.create_batch(2, panel=self.pm_1.panel)]
+        for panelist in panelists:
+            SMSStats.objects.create(panelist=panelist, msgdist=self.message_distribution_1, smsstatus='Delivered')
+        url = resolve_url('hq:msg-distribution-dlsmsstats', pk=self.message_distribution_1.pk)
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+            content = b''.join(response.streaming_content).decode()
+        self.assertEqual(list(csv.reader(io.StringIO(content)))[1:], sorted(
+            ([panelist.panelist_id, panelist.panel.name, 'Delivered', '', ''] for panelist in panelists),
+            key=lambda row: int(row[0][2:]),
+        ))
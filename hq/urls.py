@@ -5,18 +5,18 @@ from django.urls import path
 from hq.views import (
     BlankSlotCreate, BlankSlotDelete, BlankSlotImportCsv, BlankSlotList,
     BlankSlotUpdate, BlankSlotValueList, BlankSlotValueUpdate,
-    EmailDistributionCreate, Home, HqProfileUpdate, LinkDistributionCreate,
-    LinkDistributionDelete, LinkDistributionDetail, LinkDistributionGenerate,
-    LinkDistributionList, ManagerCreate, ManagerDelete, ManagerList,
-    ManagerUpdate, MessageDistributionDelete, MessageDistributionDetail,
-    MessageDistributionFallbackCreate, MessageDistributionHistory,
-    MessageDistributionList, MessageDistributionSend,
-    MessageDistributionUpdate, MessageList, PanelCreate, PanelDetail,
-    PanelList, PanelManagerAssign, PanelManagerUnassign, PanelmemberList,
-    PanelUpdate, ProfileExportCSV, SMSDistributionCreate, SurveyList,
-    download_sms_stats,
+    EmailDistributionCreate, ExportJobDetail, Home, HqProfileUpdate,
+    LinkDistributionCreate, LinkDistributionDelete, LinkDistributionDetail,
+    LinkDistributionGenerate, LinkDistributionList, ManagerCreate,
+    ManagerDelete, ManagerList, ManagerUpdate, MessageDistributionDelete,
+    MessageDistributionDetail, MessageDistributionFallbackCreate,
+    MessageDistributionHistory, MessageDistributionList,
+    MessageDistributionSend, MessageDistributionUpdate, MessageList,
+    PanelCreate, PanelDetail, PanelList, PanelManagerAssign,
+    PanelManagerUnassign, PanelmemberList, PanelUpdate, ProfileExportCSV,
+    SMSDistributionCreate, SurveyList, download_sms_stats,
 )
-from utils.views import blank_slot_export_csv
+from utils.views import ExportJobDownload, blank_slot_export_csv
 
 app_name = 'hq'
 urlpatterns = [
@@ -50,6 +50,8 @@ urlpatterns = [
     path('panelist/export/', ProfileExportCSV.as_view(), name='panelist-export'),
     path('blankslot/import/', BlankSlotImportCsv.as_view(), name='blank-slot-import'),
     path('blankslot/export/', blank_slot_export_csv, name='blank-slot-export'),
+    path('exports/<int:pk>/', ExportJobDetail.as_view(), name='export-job'),
+    path('exports/<int:pk>/download/', ExportJobDownload.as_view(), name='export-job-download'),
     # LINK DISTRIBUTIONS
     path('links/', LinkDistributionList.as_view(), name='link-distribution-list'),
     path('links/create/', LinkDistributionCreate.as_view(), name='link-distribution-create'),
@@ -1,5 +1,5 @@
 # -- STDLIB
-import csv
+import itertools
 import logging
 from datetime import datetime, timezone
 
@@ -9,9 +9,7 @@ from django.contrib.auth import get_user_model
 from django.contrib.messages.views import SuccessMessageMixin
 from django.core.paginator import Paginator
 from django.db.models import Count
-from django.http import (
-    HttpResponse, HttpResponseNotAllowed, HttpResponseRedirect,
-)
+from django.http import HttpResponseNotAllowed, HttpResponseRedirect
 from django.shortcuts import get_object_or_404
 from django.urls import reverse, reverse_lazy
 from django.utils.translation import gettext_lazy as _
@@ -31,16 +29,19 @@ from hq.forms import (
     ManagerAddMultipleForm, ManagerCreateForm, ManagerUpdateForm,
     PanelCreateForm, PanelUpdateForm,
 )
-from hq.models import Panel, SMSStats
+from hq.models import ExportJob, Panel, SMSStats
+from hq.tasks import start_export
 from manager.filters import MessageDeliveryReportFilter
 from manager.forms import BlankSlotImportForm
 from panelist.models import BlankSlot, Profile
 from qxauth.forms import UserUpdateForm
 from qxsms import settings
-from utils.csvimport import BlankSlotValueResource, ProfileHQResource
+from utils.csvimport import BlankSlotValueResource
+from utils.smsstats import stats_values
 from utils.utils import get_panelist_counts
 from utils.views import (
-    BaseBlankSlotValueList, BaseBlankSlotValueUpdate, csv_response,
+    BaseBlankSlotValueList, BaseBlankSlotValueUpdate, BaseExportJobDetail,
+    export_job_redirect, get_export_format, streaming_csv_response,
 )
 
 # -- QXSMS (LOCAL)
@@ -170,6 +171,7 @@ class LinkDistributionDetail(distviews.LinkDistributionDetail):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context['pipeline_run'] = self.object.pipeline_runs.prefetch_related('stages').first()
         if self.object.qx_id:
             skip_cache = 'nocache' in self.request.GET
             history = services.get_distribution_history(qx_id=self.object.qx_id, skip_cache=skip_cache)
@@ -209,43 +211,37 @@ class MessageDistributionList(distviews.MessageDistributionList):
 
 
 def download_sms_stats(request, pk):
-    filename = f"stats_sms_{distmodels.MessageDistribution.objects.get(pk=pk).short_uid}.csv"
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-
-    writer = csv.DictWriter(response, fieldnames=["Panelist ID", "Panel", "Status", "Bounce Reason",
-                                                  "Last status update"])
-
-    writer.writeheader()
-    for stat in SMSStats.objects.filter(msgdist_id=pk):
-        writer.writerow({"Panelist ID": stat.panelist.panelist_id, "Panel": stat.panelist.panel.name,
-                         "Status": stat.smsstatus, "Bounce Reason": stat.bouncereason,
-                         "Last status update": stat.datefile})
-
-    return response
+    msgdist = get_object_or_404(distmodels.MessageDistribution, pk=pk)
+    stats = stats_values(SMSStats.objects.filter(msgdist=msgdist))
+    rows = ([stat['panelist_code'], stat['panel_name'], stat['smsstatus'], stat['bouncereason'], stat['datefile']]
+            for stat in stats.iterator(chunk_size=2000))
+    header = ["Panelist ID", "Panel", "Status", "Bounce Reason", "Last status update"]
+    return streaming_csv_response(f"stats_sms_{msgdist.short_uid}.csv", itertools.chain([header], rows))
 
 
 class MessageDistributionDetail(DetailView):
     template_name = "hq/msgdist/detail.html"
-    queryset = distmodels.MessageDistribution.objects.annotate(Count('links'))
+    paginated_by = 25
+    queryset = distmodels.MessageDistribution.objects.filter(is_deleting=False, link_distribution__is_deleting=False)\
+        .annotate(Count('links'))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context['pipeline_run'] = self.object.pipeline_runs.prefetch_related('stages').first()
         if self.object.qx_id is None:
             return context
         skip_cache = 'nocache' in self.request.GET
 
         # Include global stats if we have an SMS
         if self.object.is_sms:
-            statssms = SMSStats.objects.filter(msgdist=self.object)
-            context['detailedstatssms'] = statssms
-            stats = services.get_distribution_stats(qx_id=self.object.qx_id,
-                                                    survey_id=settings.QXSMS_SEND_SURVEY,
-                                                    skip_cache=skip_cache,
-                                                    is_sms=True)
+            summaries = self.object.sms_summaries.select_related('panel')
+            context['sms_summaries'] = summaries.order_by('panel__name', '-count')
+            paginator = Paginator(stats_values(SMSStats.objects.filter(msgdist=self.object)), self.paginated_by)
+            context['detailedstatssms'] = paginator.get_page(self.request.GET.get('page'))
+            stats = services.get_message_distribution_stats(self.object, skip_cache=skip_cache)
         # For emails, include stats aggregated by panel
         else:
-            history = services.get_distribution_history(qx_id=self.object.qx_id, skip_cache=skip_cache)
+            history = services.get_message_distribution_history(self.object, skip_cache=skip_cache)
             links = self.object.links.select_related('profile__panel')
             links_with_history = services.merge_links_and_history(links, history)
             stats = services.msg_distributions_stats(links_with_history)
@@ -305,7 +301,8 @@ class MessageDistributionHistory(SingleObjectMixin, FilterView):
     paginated_by = 25
 
     def get(self, request, *args, **kwargs):
-        self.object = super().get_object(queryset=distviews.MessageDistribution.objects.all())
+        self.object = super().get_object(queryset=distviews.MessageDistribution.objects.filter(
+            is_deleting=False, link_distribution__is_deleting=False))
         return super().get(request, *args, **kwargs)
 
     def get_queryset(self):
@@ -315,7 +312,7 @@ class MessageDistributionHistory(SingleObjectMixin, FilterView):
     def get_filterset_kwargs(self, filterset_class):
         kwargs = super().get_filterset_kwargs(filterset_class)
         skip_cache = 'nocache' in self.request.GET
-        self.history = services.get_distribution_history(qx_id=self.object.qx_id, skip_cache=skip_cache)
+        self.history = services.get_message_distribution_history(self.object, skip_cache=skip_cache)
         kwargs['history'] = self.history
         return kwargs
 
@@ -335,10 +332,7 @@ class MessageDistributionHistory(SingleObjectMixin, FilterView):
         page = self.request.GET.get('page')
         context['profiles'] = paginator.get_page(page)
         if self.object.is_sms:
-            stats = services.get_distribution_stats(qx_id=self.object.qx_id,
-                                                    survey_id=settings.QXSMS_SEND_SURVEY,
-                                                    skip_cache=skip_cache,
-                                                    is_sms=True)
+            stats = services.get_message_distribution_stats(self.object, skip_cache=skip_cache)
         else:
             stats = services.msg_distributions_stats(context['object_list'])
 
@@ -500,9 +494,13 @@ class BlankSlotDelete(DeleteView):
 class ProfileExportCSV(View):
 
     def get(self, request, *args, **kwargs):
-        dataset = ProfileHQResource().export()
-        response = csv_response(dataset.csv, 'export-panelist-data')
-        return response
+        job = start_export(ExportJob.KIND_HQ_PROFILES, request.user, 'export-panelist-data',
+                           file_format=get_export_format(request))
+        return export_job_redirect(request, job)
+
+
+class ExportJobDetail(BaseExportJobDetail):
+    template_name = 'hq/export_job_detail.html'
 
 
 class BlankSlotValueUpdate(BaseBlankSlotValueUpdate):
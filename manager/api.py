@@ -17,6 +17,8 @@ class TaskInfo(TypedDict):
     errors: dict
     completed: bool
     dry_run: bool
+    ended: bool
+    progress: dict
 
 
 def get_task_info(panel_pk, task_import_id) -> TaskInfo:
@@ -28,17 +30,23 @@ def get_task_info(panel_pk, task_import_id) -> TaskInfo:
 
 def _get_task_info(task_import) -> TaskInfo:
 
-    task = AsyncResult(task_import.celery_group_id)
+    if not task_import.ended:
+        # Results are kept by the import tasks, the result backend is only read for older imports
+        task = AsyncResult(task_import.celery_group_id)
+        if task.ready():
+            task_import.result = task.get()
+            task_import.save(update_fields=['result'])
 
     completed = False
     result = Counter()
     validation_error = {}
 
-    if task.ready():
-        result, validation_error, b = task.get()
+    if task_import.ended:
+        result, validation_error, b = task_import.result
         completed = not b
-        if completed:
+        if completed and not task_import.success:
             task_import.success = True
-            task_import.save()
+            task_import.save(update_fields=['success'])
 
-    return {"results": result, "errors": validation_error, "completed": completed, "dry_run": task_import.dry_run}
+    return {"results": result, "errors": validation_error, "completed": completed, "dry_run": task_import.dry_run,
+            "ended": task_import.ended, "progress": task_import.get_progress()}
@@ -28,12 +28,13 @@ class CSVDatasetField(forms.FileField):
                             "Got the following unexpected fields: %(fields)s."),
         'invalid_file': _("Invalid CSV file."),
         'invalid_encoding': _("UTF8 text encoding is expected."),
-        'invalid_file_length': _(f"Invalid file length (should be no more than {MAX_LINES} rows).")
+        'invalid_file_length': _("Invalid file length (should be no more than %(max_lines)s rows).")
     }
 
-    def __init__(self, *args, expected_fields=None, **kwargs):
+    def __init__(self, *args, expected_fields=None, max_lines=MAX_LINES, **kwargs):
         super().__init__(*args, **kwargs)
         self.expected_fields = expected_fields
+        self.max_lines = max_lines
         self.widget.attrs.update({'accept': '.csv'})
 
     def to_python(self, data):
@@ -45,8 +46,9 @@ class CSVDatasetField(forms.FileField):
             raise forms.ValidationError(self.error_messages['invalid_encoding'], code='invalid_encoding')
         except (csv.Error, tablib.InvalidDimensions):
             raise forms.ValidationError(self.error_messages['invalid_file'], code='invalid_file')
-        if len(dataset) > self.MAX_LINES:
-            raise forms.ValidationError(self.error_messages['invalid_file_length'], code='invalid_file_length')
+        if len(dataset) > self.max_lines:
+            raise forms.ValidationError(self.error_messages['invalid_file_length'], code='invalid_file_length',
+                                        params={'max_lines': self.max_lines})
 
         dataset.headers = self.clean_header(dataset.headers or [])
         return dataset
@@ -72,6 +74,7 @@ class CSVImportForm(forms.Form):
         label='CSV file',
         required=True,
         expected_fields=fields,
+        max_lines=settings.QXSMS_IMPORT_MAX_LINES,
         help_text=_(f"The following header line is expected: {','.join(fields)}")
     )
     dry_run = forms.BooleanField(label=_('Dry run'), required=False,
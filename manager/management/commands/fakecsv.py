@@ -6,6 +6,13 @@ from panelist.factories import PanelistFactory
 from utils.csvimport import ProfileResource
 
 
+def fake_dataset(nb_rows, include_readonly=False):
+    """Dataset of `nb_rows` fake profiles, as exported for a panel"""
+    profiles = PanelistFactory.build_batch(nb_rows, panel=None)
+    resource = ProfileResource(panel_id=None)
+    return resource.export(exclude_readonly=(not include_readonly), queryset=profiles)
+
+
 class Command(BaseCommand):
     help = 'Generate fake profile CSV data'
 
@@ -20,9 +27,7 @@ class Command(BaseCommand):
         file = options['output']
         include_readonly = options['include_readonly']
 
-        profiles = PanelistFactory.build_batch(nb_rows, panel=None)
-        resource = ProfileResource(panel_id=None)
-        dataset = resource.export(exclude_readonly=(not include_readonly), queryset=profiles)
+        dataset = fake_dataset(nb_rows, include_readonly)
 
         if file:
             try:
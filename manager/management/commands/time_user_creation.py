@@ -0,0 +1,33 @@
+# -- STDLIB
+import time
+
+# -- DJANGO
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import transaction
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Measure time to create panelist users, with a hashed random password or an unusable password'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--number', type=int, help='Number of users to create', default=100)
+
+    def time_creation(self, label, number, get_password):
+        with transaction.atomic():
+            t = time.perf_counter()
+            users = [User.objects.init_user(get_password(), email=f'time-user-creation-{i}@example.com')
+                     for i in range(number)]
+            User.objects.bulk_create(users)
+            elapsed = time.perf_counter() - t
+            transaction.set_rollback(True)
+        self.stdout.write(f'{label:<20} Time {elapsed:0.4}s  Per row {elapsed / number * 1000:0.4}ms')
+        return elapsed
+
+    def handle(self, *args, **options):
+        number = options['number']
+        hashed = self.time_creation('Hashed password', number, User.objects.make_random_password)
+        unusable = self.time_creation('Unusable password', number, lambda: None)
+        self.stdout.write(f'Saving per row {(hashed - unusable) / number * 1000:0.4}ms')
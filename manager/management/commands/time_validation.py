@@ -0,0 +1,61 @@
+# -- STDLIB
+import concurrent.futures
+import multiprocessing
+import os
+import time
+
+# -- DJANGO
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connections
+
+# -- THIRDPARTY
+import tablib
+
+# -- QXSMS
+from hq.models import Panel
+from manager import tasks
+from manager.management.commands.fakecsv import fake_dataset
+
+
+def validate_chunk(panel_pk, headers, rows, offset):
+    return tasks.import_dataset(panel_pk, tablib.Dataset(*rows, headers=headers), dry_run=True, offset=offset)
+
+
+class Command(BaseCommand):
+    help = 'Measure time to validate generated CSV panelists, in a single process and by chunks in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-p', '--panel', type=int, required=True, help='Panel id')
+        parser.add_argument('-n', '--nb-rows', type=int, nargs='+', default=[10000, 50000, 200000],
+                            help='Numbers of rows of the generated files')
+        parser.add_argument('-c', '--chunk', type=int, default=settings.QXSMS_IMPORT_CHUNK_SIZE, help='Chunk size')
+        parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help='Number of processes')
+
+    def validate(self, panel_pk, dataset, chunk, workers):
+        """Validate `dataset` by chunks, and return the number of invalid rows"""
+        chunks = [(panel_pk, dataset.headers, dataset[offset:offset + chunk], offset)
+                  for offset in range(0, len(dataset), chunk)]
+        if workers == 1:
+            results = [validate_chunk(*args) for args in chunks]
+        else:
+            # Forked processes open their own database connections
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                results = list(executor.map(validate_chunk, *zip(*chunks)))
+        return sum(len(errors) for _, errors, _ in results)
+
+    def handle(self, *args, **options):
+        panel_pk = options['panel']
+        if not Panel.objects.filter(pk=panel_pk).exists():
+            raise CommandError(f"No panel with id={panel_pk}.")
+
+        for nb_rows in options['nb_rows']:
+            dataset = fake_dataset(nb_rows)
+            for workers in sorted({1, options['workers']}):
+                t = time.perf_counter()
+                invalid = self.validate(panel_pk, dataset, options['chunk'], workers)
+                elapsed = time.perf_counter() - t
+                self.stdout.write(f"{nb_rows} rows, {workers} process(es): {elapsed:0.2f}s "
+                                  f"({nb_rows / elapsed:0.0f} rows/s, {invalid} invalid)")
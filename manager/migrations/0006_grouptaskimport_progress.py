@@ -0,0 +1,43 @@
+# Generated by Django 3.2.12 on 2026-10-19 15:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manager', '0005_importupload_importuploadchunk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grouptaskimport',
+            name='created_rows',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='grouptaskimport',
+            name='processed_rows',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='grouptaskimport',
+            name='result',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='grouptaskimport',
+            name='skipped_rows',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='grouptaskimport',
+            name='total_rows',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='grouptaskimport',
+            name='updated_rows',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,3 +1,7 @@
+# -- STDLIB
+import csv
+import io
+
 # -- DJANGO
 from django.db import models
 
@@ -12,3 +16,61 @@ class GroupTaskImport(models.Model):
     upload_date = models.DateTimeField(auto_now_add=True)
     panel = models.ForeignKey(Panel, on_delete=models.CASCADE, null=True)
     success = models.BooleanField(default=False)
+
+    # Progress of the current pass over the rows, validation by chunks or import
+    total_rows = models.PositiveIntegerField(default=0)
+    processed_rows = models.PositiveIntegerField(default=0)
+    created_rows = models.PositiveIntegerField(default=0)
+    updated_rows = models.PositiveIntegerField(default=0)
+    skipped_rows = models.PositiveIntegerField(default=0)
+    # (totals, validation errors by row number, has errors) of the import once it ended
+    result = models.JSONField(null=True, blank=True)
+
+    PROGRESS_FIELDS = ('processed_rows', 'created_rows', 'updated_rows', 'skipped_rows')
+
+    @property
+    def ended(self):
+        return self.result is not None
+
+    def get_progress(self):
+        return {name: getattr(self, name) for name in ('total_rows',) + self.PROGRESS_FIELDS}
+
+
+class ImportUpload(models.Model):
+    """Rows of an uploaded file, staged in the database by chunks until the import tasks read them
+
+    Only the reference to the upload goes through the broker. It is deleted once the import completes.
+    """
+    task_import = models.OneToOneField(GroupTaskImport, on_delete=models.CASCADE, related_name='upload')
+    headers = models.JSONField()
+    row_count = models.PositiveIntegerField(default=0)
+    created_date = models.DateTimeField(auto_now_add=True)
+
+    def write(self, rows, chunk_size):
+        """Stage `rows` as CSV chunks of `chunk_size` rows"""
+        chunks = []
+        for index, offset in enumerate(range(0, len(rows), chunk_size)):
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows[offset:offset + chunk_size])
+            chunks.append(ImportUploadChunk(upload=self, index=index, offset=offset, data=buffer.getvalue()))
+        ImportUploadChunk.objects.bulk_create(chunks)
+        self.row_count = len(rows)
+        self.save(update_fields=['row_count'])
+
+    def iter_rows(self, index=None):
+        """Read the staged rows, one chunk at a time, or only the rows of chunk `index`"""
+        chunks = self.chunks.order_by('index')
+        if index is not None:
+            chunks = chunks.filter(index=index)
+        for data in chunks.values_list('data', flat=True).iterator(chunk_size=1):
+            yield from csv.reader(io.StringIO(data))
+
+
+class ImportUploadChunk(models.Model):
+    class Meta:
+        unique_together = ('upload', 'index')
+
+    upload = models.ForeignKey(ImportUpload, on_delete=models.CASCADE, related_name='chunks')
+    index = models.PositiveIntegerField()
+    offset = models.PositiveIntegerField()
+    data = models.TextField()
@@ -1,44 +1,169 @@
+# -- STDLIB
+from collections import Counter
+from datetime import timedelta
+
+# -- DJANGO
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
 # -- THIRDPARTY
 import tablib
-from celery import shared_task
+from celery import chord, shared_task
 from celery.utils.log import get_task_logger
+from import_export.results import RowResult
 
 # -- QXSMS
-from utils.csvimport import ProfileResource
+from utils.csvimport import BulkProfileResource
 
 # -- QXSMS (LOCAL)
-from .models import GroupTaskImport
+from .models import GroupTaskImport, ImportUpload
 
 logger = get_task_logger(__name__)
 
+# Staged uploads left behind by an import that did not complete
+STALE_UPLOAD_AGE = timedelta(days=1)
+
+
+class ImportProgress:
+    """Count the rows processed by an import on its GroupTaskImport, through a database connection of its own
+
+    The rows are imported in a transaction, which would hide the counts until the import ends.
+    """
+
+    COLUMNS = {
+        RowResult.IMPORT_TYPE_NEW: 'created_rows',
+        RowResult.IMPORT_TYPE_UPDATE: 'updated_rows',
+        RowResult.IMPORT_TYPE_SKIP: 'skipped_rows',
+    }
+
+    def __init__(self, task_import_pk):
+        self.task_import_pk = task_import_pk
+        self.connection = connections.create_connection(DEFAULT_DB_ALIAS)
+
+    def __call__(self, counts):
+        qn = self.connection.ops.quote_name
+        columns = ['processed_rows', *self.COLUMNS.values()]
+        params = [sum(counts.values()), *(counts.get(import_type, 0) for import_type in self.COLUMNS)]
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {qn(GroupTaskImport._meta.db_table)} "
+                f"SET {', '.join(f'{qn(column)} = {qn(column)} + %s' for column in columns)} WHERE id = %s",
+                params + [self.task_import_pk],
+            )
+
+    def close(self):
+        self.connection.close()
+
 
 def import_data_celery(headers, dataset, panel_pk, filename,
-                       dry_run=True) -> GroupTaskImport:
+                       dry_run=True, chunk_size=None) -> GroupTaskImport:
 
-    gt_import = GroupTaskImport.objects.create(file_name=filename,
-                                               dry_run=dry_run, panel_id=panel_pk)
+    gt_import = GroupTaskImport.objects.create(file_name=filename, dry_run=dry_run, panel_id=panel_pk,
+                                               total_rows=len(dataset))
 
-    result = task_import_data_celery.delay(panel_pk, dataset, headers, dry_run)
-    gt_import.celery_group_id = result.id
+    # Stage the rows in the database, the tasks only get a reference to them
+    chunk_size = chunk_size or settings.QXSMS_IMPORT_CHUNK_SIZE
+    upload = ImportUpload.objects.create(task_import=gt_import, headers=list(headers))
+    upload.write(dataset, chunk_size)
+
+    if len(dataset) <= chunk_size:
+        task = canvas = task_import_data_celery.s(panel_pk, upload.pk, dry_run)
+    else:
+        # Validate large files by chunks in parallel, and only import them once every chunk is valid
+        chunks = [validate_import_chunk.s(panel_pk, upload.pk, index, offset)
+                  for index, offset in upload.chunks.order_by('index').values_list('index', 'offset')]
+        task = finalize_chunked_import.s(panel_pk, upload.pk, dry_run)
+        canvas = chord(chunks, task)
+    # Queued once the transaction commits, so that the workers find the staged rows: the id of the
+    # task whose result is awaited is set beforehand
+    gt_import.celery_group_id = task.freeze().id
     gt_import.save()
+    transaction.on_commit(canvas.delay)
     return gt_import
 
 
-@shared_task(bind=True)
-def task_import_data_celery(self, panel_pk, dataset, headers, dry_run):
+def import_dataset(panel_pk, ds, dry_run, offset=0, validated=False, progress=None):
+    """Import `ds`, and summarize the result as (totals, validation errors by row number, has errors)
 
-    resource = ProfileResource(panel_id=panel_pk)
-    ds = tablib.Dataset(*dataset, headers=headers)
-    res = resource.import_data(ds, dry_run=True)
+    Row numbers are shifted by `offset`. Rows `validated` by a previous dry run are only checked for uniqueness.
+    """
+    resource = BulkProfileResource(panel_id=panel_pk, validated=validated, progress=progress)
+    # Validate and save in a single pass: the whole import is rolled back to its savepoint
+    # when any row has errors, instead of dry-running it first and importing it again
+    res = resource.import_data(ds, dry_run=dry_run, rollback_on_validation_errors=True)
 
     validation_error = {}
 
     if res.has_validation_errors():
         for line in res.invalid_rows:
-            validation_error[line.number] = {}
-            validation_error[line.number].update(line.error_dict)
-
-    elif not dry_run:
-        res = resource.import_data(ds, dry_run=False)
+            validation_error[line.number + offset] = {}
+            validation_error[line.number + offset].update(line.error_dict)
 
     return (res.totals, validation_error, res.has_errors() or res.has_validation_errors())
+
+
+def _import_data(panel_pk, upload, dry_run, index=None, offset=0, validated=False):
+    """Import staged rows, only those of chunk `index` when it is set, reporting their progress"""
+    ds = tablib.Dataset(*upload.iter_rows(index), headers=upload.headers)
+    progress = ImportProgress(upload.task_import_id)
+    try:
+        return import_dataset(panel_pk, ds, dry_run, offset=offset, validated=validated, progress=progress)
+    finally:
+        progress.close()
+
+
+def _end_import(task_import_pk, result):
+    """Keep the result of an import, so that it is not read from the result backend again"""
+    totals, validation_error, has_errors = result
+    GroupTaskImport.objects.filter(pk=task_import_pk).update(result=[dict(totals), validation_error, has_errors])
+    return result
+
+
+@shared_task
+def task_import_data_celery(panel_pk, upload_pk, dry_run):
+    upload = ImportUpload.objects.get(pk=upload_pk)
+    try:
+        return _end_import(upload.task_import_id, _import_data(panel_pk, upload, dry_run))
+    finally:
+        upload.delete()
+
+
+@shared_task
+def validate_import_chunk(panel_pk, upload_pk, index, offset):
+    upload = ImportUpload.objects.get(pk=upload_pk)
+    return _import_data(panel_pk, upload, dry_run=True, index=index, offset=offset)
+
+
+@shared_task
+def finalize_chunked_import(results, panel_pk, upload_pk, dry_run):
+    """Merge the validation results of the chunks of a file, and import the whole file if they are all valid"""
+    upload = ImportUpload.objects.get(pk=upload_pk)
+    try:
+        totals = Counter()
+        validation_error = {}
+        has_errors = False
+        for chunk_totals, chunk_validation_error, chunk_has_errors in results:
+            totals.update(chunk_totals)
+            # Row numbers are serialized as strings by the result backend
+            validation_error.update((int(number), errors) for number, errors in chunk_validation_error.items())
+            has_errors = has_errors or chunk_has_errors
+
+        if has_errors or dry_run:
+            logger.info("Chunked import of %s rows validated, errors: %s", upload.row_count, has_errors)
+            return _end_import(upload.task_import_id, (dict(totals), validation_error, has_errors))
+
+        # Every row was validated by the chunks, only the uniqueness across chunks is checked again
+        # as the whole file is written by this single task
+        GroupTaskImport.objects.filter(pk=upload.task_import_id).update(
+            **{name: 0 for name in GroupTaskImport.PROGRESS_FIELDS})
+        return _end_import(upload.task_import_id, _import_data(panel_pk, upload, dry_run=False, validated=True))
+    finally:
+        upload.delete()
+
+
+@shared_task
+def discard_stale_uploads():
+    """Delete staged uploads of imports that failed before completing"""
+    deleted, _ = ImportUpload.objects.filter(created_date__lt=timezone.now() - STALE_UPLOAD_AGE).delete()
+    return deleted
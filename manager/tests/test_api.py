@@ -8,6 +8,7 @@ from django.test import TestCase
 # -- QXSMS
 from manager.api import get_task_info
 from manager.factories import GroupTaskImportFactory, ManagerFactory
+from manager.models import GroupTaskImport
 from panelist.factories import PanelistFactory
 
 
@@ -34,4 +35,19 @@ class APICeleryTestCase(TestCase):
                          {'results': {'new': 10, 'update': 0, 'delete': 0, 'skip': 0, 'error': 0, 'invalid': 0},
                           'errors': {},
                           'completed': True,
-                          'dry_run': False})
+                          'dry_run': False,
+                          'ended': True,
+                          'progress': self.task_import.get_progress()})
+
+        # The result is kept, the result backend is not read again
+        ready.reset_mock()
+        self.assertEqual(get_task_info(self.panelist.panel.pk, self.task_import.pk)['results']['new'], 10)
+        ready.assert_not_called()
+
+    @patch('celery.result.AsyncResult.ready', return_value=False)
+    def test_task_in_progress(self, ready):
+        GroupTaskImport.objects.filter(pk=self.task_import.pk).update(total_rows=10, processed_rows=4, created_rows=4)
+        task_info = get_task_info(self.panelist.panel.pk, self.task_import.pk)
+        self.assertFalse(task_info['ended'])
+        self.assertEqual(task_info['progress'], {'total_rows': 10, 'processed_rows': 4, 'created_rows': 4,
+                                                 'updated_rows': 0, 'skipped_rows': 0})
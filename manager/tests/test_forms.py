@@ -2,6 +2,8 @@
 from io import BytesIO
 
 # -- DJANGO
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import RequestFactory, TestCase
 
 # -- QXSMS
@@ -9,7 +11,7 @@ from hq.factories import PanelFactory
 from hq.models import Panel
 
 # -- QXSMS (LOCAL)
-from ..forms import CSVImportForm, PanelUpdateForm
+from ..forms import CSVDatasetField, CSVImportForm, PanelUpdateForm
 
 
 class CSVImportFormTestCase(TestCase):
@@ -27,6 +29,13 @@ class CSVImportFormTestCase(TestCase):
         self.assertTrue(form.is_valid())
         self.assertFalse(csv_file.closed)
 
+    def test_max_lines(self):
+        field = CSVDatasetField(max_lines=2)
+        csv_str = 'idno\n1\n2\n3\n'
+        csv_file = SimpleUploadedFile('data.csv', csv_str.encode('utf8'))
+        with self.assertRaisesMessage(ValidationError, 'should be no more than 2 rows'):
+            field.clean(csv_file)
+
     # TODO
     def test_clean_headers(self):
         """Normalizes headers by lowercasing and removing whitespace"""
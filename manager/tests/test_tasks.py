@@ -1,20 +1,22 @@
 # -- STDLIB
 from collections import OrderedDict
+from datetime import timedelta
 from unittest.mock import patch
 
 # -- DJANGO
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
 
 # -- THIRDPARTY
 import import_export.results
 import tablib
-from celery.result import AsyncResult
 
 # -- QXSMS
 from manager import tasks
 from manager.factories import ManagerFactory
-from manager.models import GroupTaskImport
+from manager.models import GroupTaskImport, ImportUpload
 from panelist.factories import PanelistFactory
+from panelist.models import Profile
 
 
 class ContactTasksTestCase(TestCase):
@@ -33,6 +35,12 @@ class ContactTasksTestCase(TestCase):
             dry_run=True,
             panel=cls.panelist.panel)
 
+    def stage(self, rows, chunk_size=1000):
+        task_import = GroupTaskImport.objects.create(file_name='TEST', dry_run=True, panel=self.panelist.panel)
+        upload = ImportUpload.objects.create(task_import=task_import, headers=self.headers)
+        upload.write(rows, chunk_size)
+        return upload.pk
+
     def test_import_contact(self):
         return_value = (OrderedDict(
             [('new', 1), ('update', 1), ('delete', 0), ('skip', 0), ('error', 0), ('invalid', 0)]),
@@ -40,40 +48,139 @@ class ContactTasksTestCase(TestCase):
             False)
 
         self.assertEqual(
-            tasks.task_import_data_celery(self.panelist.panel.pk, self.rows, self.headers, dry_run=True),
+            tasks.task_import_data_celery(self.panelist.panel.pk, self.stage(self.rows), dry_run=True),
             return_value)
 
-        tasks.task_import_data_celery(self.panelist.panel.pk, self.rows, self.headers, dry_run=True)
+        tasks.task_import_data_celery(self.panelist.panel.pk, self.stage(self.rows), dry_run=True)
         self.rows.append(('3', '9', 'ERROR', 'RO', '9', '2', '6', '6', '1974', 'EN'))
         return_value = (OrderedDict(
             [('new', 1), ('update', 1), ('delete', 0), ('skip', 0), ('error', 0), ('invalid', 1)]),
             {3: {'email': ['Enter a valid email address.']}},
             True)
         self.assertEqual(
-            tasks.task_import_data_celery(self.panelist.panel.pk, self.rows, self.headers, dry_run=True),
+            tasks.task_import_data_celery(self.panelist.panel.pk, self.stage(self.rows), dry_run=True),
             return_value)
 
-    @patch('manager.tasks.task_import_data_celery.delay')
-    def test_import_data_celery(self, delay):
-        delay.return_value = AsyncResult(id='test')
+    def test_import_data_celery(self):
         dataset = tablib.Dataset(*self.rows, headers=self.headers)
         nb = GroupTaskImport.objects.count()
         tasks.import_data_celery(self.headers, dataset, self.panelist.panel.pk, 'test_file_name')
         self.assertEqual(GroupTaskImport.objects.count(), nb+1)
 
-    @patch('manager.tasks.task_import_data_celery.delay')
-    def test_import_data_celery_nodryrun(self, delay):
+    def test_import_data_celery_nodryrun(self):
         nb = GroupTaskImport.objects.count()
-        delay.return_value = AsyncResult(id='parent')
         tasks.import_data_celery(self.headers, self.rows, self.panelist.panel.pk, 'test_file_name', dry_run=False)
         self.assertEqual(GroupTaskImport.objects.count(), nb + 1)
 
     @patch('import_export.results.Result.has_validation_errors')
-    @patch('utils.csvimport.ProfileResource.import_data')
-    def test_import_data_called_twice(self, import_data, has_validation_errors):
-        # Test that import_data() is called twice when dry_run is set to False without validation_error
+    @patch('utils.csvimport.BulkProfileResource.import_data')
+    def test_import_data_called_once(self, import_data, has_validation_errors):
+        # Test that import_data() is called once, with rollback on validation errors, when dry_run is set to False
         import_data.return_value = import_export.results.Result()
         has_validation_errors.return_value = False
-        dataset = tablib.Dataset(*self.rows, headers=self.headers)
-        tasks.task_import_data_celery(self.panelist.panel.pk, dataset, self.headers, False)
-        self.assertEqual(import_data.call_count, 2)
+        tasks.task_import_data_celery(self.panelist.panel.pk, self.stage(self.rows), False)
+        self.assertEqual(import_data.call_count, 1)
+        self.assertEqual(import_data.call_args.kwargs, {'dry_run': False, 'rollback_on_validation_errors': True})
+
+    def test_import_rolled_back_on_validation_errors(self):
+        rows = self.rows + [('3', '9', 'ERROR', 'RO', '9', '2', '6', '6', '1974', 'EN')]
+        *_, has_errors = tasks.task_import_data_celery(self.panelist.panel.pk, self.stage(rows), False)
+        self.assertTrue(has_errors)
+        self.panelist.refresh_from_db()
+        self.assertNotEqual(self.panelist.email, 'cid_new@qxsms.com')
+        self.assertFalse(self.panelist.panel.profile_set.filter(ess_id=self.panelist.ess_id + 1).exists())
+
+    def test_import_saved_in_single_pass(self):
+        *_, has_errors = tasks.task_import_data_celery(self.panelist.panel.pk, self.stage(self.rows), False)
+        self.assertFalse(has_errors)
+        self.panelist.refresh_from_db()
+        self.assertEqual(self.panelist.email, 'cid_new@qxsms.com')
+
+    def test_import_data_celery_staged(self):
+        with patch('manager.tasks.task_import_data_celery.apply_async') as apply_async:
+            with self.captureOnCommitCallbacks() as callbacks:
+                gt_import = tasks.import_data_celery(self.headers, self.rows, self.panelist.panel.pk,
+                                                     'test_file_name')
+            # Queued once the staged rows are committed
+            apply_async.assert_not_called()
+            for callback in callbacks:
+                callback()
+        upload = gt_import.upload
+        self.assertEqual(apply_async.call_args.args[0], (self.panelist.panel.pk, upload.pk, True))
+        self.assertEqual(apply_async.call_args.kwargs['task_id'], gt_import.celery_group_id)
+        self.assertEqual([tuple(row) for row in upload.iter_rows()], self.rows)
+
+        tasks.task_import_data_celery(self.panelist.panel.pk, upload.pk, True)
+        self.assertFalse(ImportUpload.objects.exists())
+
+    @patch('manager.tasks.chord')
+    def test_import_data_celery_chunked(self, chord_mock):
+        rows = self.rows * 3
+        with self.captureOnCommitCallbacks(execute=True):
+            gt_import = tasks.import_data_celery(self.headers, rows, self.panelist.panel.pk, 'big_file',
+                                                 chunk_size=4)
+        chord_mock.return_value.delay.assert_called_once()
+        chunks, body = chord_mock.call_args.args
+        self.assertEqual(gt_import.celery_group_id, body.id)
+        self.assertEqual([chunk.args[2:] for chunk in chunks], [(0, 0), (1, 4)])
+        self.assertEqual(len(list(gt_import.upload.iter_rows(1))), 2)
+
+    def test_validate_import_chunk(self):
+        rows = self.rows + [('3', '9', 'ERROR', 'RO', '9', '2', '6', '6', '1974', 'EN')]
+        upload_pk = self.stage(rows, chunk_size=2)
+        totals, errors, has_errors = tasks.validate_import_chunk(self.panelist.panel.pk, upload_pk, 1, 2)
+        self.assertEqual(errors, {3: {'email': ['Enter a valid email address.']}})
+        self.assertTrue(has_errors)
+
+    def test_finalize_chunked_import_errors(self):
+        results = [
+            ({'new': 1, 'update': 1, 'invalid': 0}, {}, False),
+            ({'new': 0, 'update': 0, 'invalid': 1}, {'3': {'email': ['Enter a valid email address.']}}, True),
+        ]
+        totals, errors, has_errors = tasks.finalize_chunked_import(results, self.panelist.panel.pk,
+                                                                   self.stage(self.rows), False)
+        self.assertEqual(totals, {'new': 1, 'update': 1, 'invalid': 1})
+        self.assertEqual(errors, {3: {'email': ['Enter a valid email address.']}})
+        self.assertTrue(has_errors)
+        self.panelist.refresh_from_db()
+        self.assertNotEqual(self.panelist.email, 'cid_new@qxsms.com')
+        self.assertFalse(ImportUpload.objects.exists())
+
+    def test_finalize_chunked_import(self):
+        results = [({'new': 1, 'update': 0}, {}, False), ({'new': 0, 'update': 1}, {}, False)]
+        with patch('panelist.models.Profile.full_clean') as full_clean:
+            totals, errors, has_errors = tasks.finalize_chunked_import(results, self.panelist.panel.pk,
+                                                                       self.stage(self.rows, chunk_size=1), False)
+        # Rows validated by the chunks are not validated again
+        full_clean.assert_not_called()
+        self.assertFalse(has_errors)
+        self.assertEqual((totals['new'], totals['update']), (1, 1))
+        self.panelist.refresh_from_db()
+        self.assertEqual(self.panelist.email, 'cid_new@qxsms.com')
+
+    def test_discard_stale_uploads(self):
+        upload_pk = self.stage(self.rows)
+        ImportUpload.objects.filter(pk=upload_pk).update(created_date=timezone.now() - timedelta(days=2))
+        self.stage(self.rows)
+        self.assertEqual(tasks.discard_stale_uploads(), 2)
+        self.assertEqual(ImportUpload.objects.count(), 1)
+
+
+class ImportProgressTestCase(TransactionTestCase):
+
+    def test_progress(self):
+        panelist = PanelistFactory(panel__managers=[ManagerFactory()])
+        headers = ['idno', 'sex', 'email', 'cntry', 'netusoft', 'eduyrs', 'dybrn', 'mthbrn', 'yrbrn', 'lng']
+        rows = [(str(panelist.ess_id), '9', 'cid_new@qxsms.com', 'SK', '9', '0', '10', '8', '1970', 'FR'),
+                (str(panelist.ess_id + 1), '9', 'cid_0448852@qxsms.com', 'HR', '9', '3', '1', '8', '1984', 'EN')]
+        with patch('manager.tasks.task_import_data_celery.apply_async') as apply_async:
+            task_import = tasks.import_data_celery(headers, rows, panelist.panel.pk, 'TEST', dry_run=True)
+        tasks.task_import_data_celery(*apply_async.call_args.args[0])
+
+        # Counts are written on their own connection, and are kept when the dry run is rolled back
+        task_import.refresh_from_db()
+        self.assertEqual(task_import.get_progress(), {'total_rows': 2, 'processed_rows': 2, 'created_rows': 1,
+                                                      'updated_rows': 1, 'skipped_rows': 0})
+        self.assertTrue(task_import.ended)
+        self.assertEqual(task_import.result[0]['new'], 1)
+        self.assertFalse(Profile.objects.filter(ess_id=panelist.ess_id + 1).exists())
@@ -1,5 +1,6 @@
 # -- STDLIB
 import csv
+import gzip
 import io
 from datetime import datetime, timedelta, timezone
 from unittest.mock import patch
@@ -10,6 +11,10 @@ from django.shortcuts import resolve_url, reverse
 from django.test import TestCase, TransactionTestCase, modify_settings
 from django.test.utils import override_settings
 
+# -- THIRDPARTY
+import pyarrow as pa
+import pyarrow.parquet as pq
+
 # -- QXSMS
 from distributions.client import parse_datetime
 from distributions.factories import (
@@ -17,6 +22,8 @@ from distributions.factories import (
 )
 from distributions.models import Link, MessageDistribution
 from hq.factories import HqFactory, PanelFactory
+from hq.models import ExportJob, SMSStats
+from hq.tasks import write_export
 from manager.factories import GroupTaskImportFactory, ManagerFactory
 from manager.forms import CSVImportForm
 from manager.models import GroupTaskImport
@@ -129,7 +136,26 @@ class BlankSlotValueTestCase(TestCase):
         self.assertEqual(response.status_code, 404)
 
 
-class CSVExportTestCase(TestCase):
+class ExportMixin:
+    """Write requested exports right away"""
+
+    def export_file(self, url, data=None, method='get'):
+        """File of the export requested at `url`"""
+        with patch('hq.tasks.write_export.delay', side_effect=write_export):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = getattr(self.client, method)(url, data)
+        job = ExportJob.objects.latest('pk')
+        self.assertRedirects(response, resolve_url('manager:export-job', pk=job.pk))
+        self.assertEqual(job.status, ExportJob.STATUS_DONE)
+        response = self.client.get(resolve_url('manager:export-job-download', pk=job.pk))
+        return b''.join(response.streaming_content)
+
+    def export(self, url, data=None, method='get'):
+        """Content of the CSV file of the export requested at `url`"""
+        return gzip.decompress(self.export_file(url, data, method)).decode()
+
+
+class CSVExportTestCase(ExportMixin, TestCase):
 
     @classmethod
     def setUpTestData(cls):
@@ -173,15 +199,14 @@ class CSVExportTestCase(TestCase):
             'notxt',
             'noem',
         ]
-        response = self.client.get(self.url)
-        self.assertEqual(response.status_code, 200)
-        content = response.content.decode()
+        content = self.export(self.url)
         reader = csv.DictReader(io.StringIO(content))
         self.assertSetEqual(set(reader.fieldnames), set(expect_headers))
+        row, = reader
+        self.assertEqual(row['idno'], str(self.pm.ess_id))
 
     def test_export_csv_all_fields(self):
-        response = self.client.get(self.url, {'all': ''})
-        content = response.content.decode()
+        content = self.export(self.url, {'all': ''})
         reader = csv.DictReader(io.StringIO(content))
         self.assertSetEqual(set(reader.fieldnames), set(FIELD_MAP.values()))
 
@@ -190,8 +215,7 @@ class CSVExportTestCase(TestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
         self.assertIsNotNone(response.context.get('panel'))
-        response = self.client.post(url, {'panelist_id': True, 'age': True})
-        f = io.StringIO(response.content.decode())
+        f = io.StringIO(self.export(url, {'panelist_id': True, 'age': True}, method='post'))
         reader = csv.DictReader(f)
         self.assertListEqual(reader.fieldnames, ['age', 'uid'])
 
@@ -229,7 +253,8 @@ class CSVImportTestCase(TestCase):
                                             dry_run=False, panel_id=self.panel.pk)
         import_data_celery.return_value = gt
         results = {"new": 10, "update": 0, "delete": 0, "skip": 0, "error": 0, "invalid": 0}
-        get_task_info.return_value = {"results": results, "errors": {}, "completed": True, "dry_run": False}
+        get_task_info.return_value = {"results": results, "errors": {}, "completed": True, "dry_run": False,
+                                      "ended": True, "progress": gt.get_progress()}
 
         profile = {
             'idno': '1',
@@ -284,11 +309,14 @@ class BlankSLotExportCSVTestCase(TestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
 
-    def test_export_CSV(self):
+    @patch('hq.tasks.write_export.delay')
+    def test_export_CSV(self, write_export):
         self.client.force_login(self.nc)
         url = resolve_url('manager:panel-blank-slot-export', panel_pk=self.panel.pk)
         response = self.client.post(url)
-        self.assertEqual(response.status_code, 200)
+        job = ExportJob.objects.get()
+        self.assertRedirects(response, resolve_url('manager:export-job', pk=job.pk))
+        self.assertEqual((job.kind, job.panel), (ExportJob.KIND_BLANK_SLOTS, self.panel))
 
     def test_export_CSV_bad_panel(self):
         self.client.force_login(self.nc)
@@ -555,6 +583,23 @@ class MessageDistributionDetailTestCase(TestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 404)
 
+    def test_download_sms_stats(self):
+        other = PanelistFactory()
+        for panelist in (self.pm_1, other):
+            SMSStats.objects.create(panelist=panelist, msgdist=self.message_distribution_sms, smsstatus='Delivered')
+        url = resolve_url('manager:msg-distribution-dlsmsstats', panel_pk=self.pm_1.panel.pk,
+                          msgdist_pk=self.message_distribution_sms.pk)
+        self.client.force_login(self.m_1)
+        response = self.client.get(url)
+        self.assertEqual(list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode()))), [
+            ["Panelist ID", "Status", "Bounce Reason", "Last status update"],
+            [self.pm_1.panelist_id, 'Delivered', '', ''],
+        ])
+
+        # Only for the panels of the manager
+        self.client.force_login(ManagerFactory())
+        self.assertEqual(self.client.get(url).status_code, 404)
+
     @patch('distributions.services.get_distribution_history')
     def test_history(self, get_distribution_history):
         get_distribution_history.return_value = self.history
@@ -609,9 +654,10 @@ class MessageDistributionDetailTestCase(TestCase):
         self.assertEqual(len(response.context['profiles']), 1)
 
 
-class LinkDistributionExportTestCase(TestCase):
+class LinkDistributionExportTestCase(ExportMixin, TestCase):
 
     def setUp(self) -> None:
+        super().setUp()
         self.m_1 = ManagerFactory()
         self.pm_1 = PanelistFactory(panel__managers=[self.m_1])
         self.pm_2 = PanelistFactory(panel=self.pm_1.panel)
@@ -634,10 +680,7 @@ class LinkDistributionExportTestCase(TestCase):
     @patch('distributions.services.get_distribution_history')
     def test_export(self, get_distribution_history):
         get_distribution_history.return_value = self.history
-        response = self.client.get(self.url)
-        self.assertEqual(response.status_code, 200)
-
-        content = response.content.decode()
+        content = self.export(self.url)
         reader = csv.DictReader(io.StringIO(content))
         for row in reader:
             if row['ess_id'] == str(self.pm_1.ess_id):
@@ -645,6 +688,14 @@ class LinkDistributionExportTestCase(TestCase):
             if row['ess_id'] == str(self.pm_2.ess_id):
                 self.assertEqual(row['status'], 'SurveyFinished')
 
+    @patch('distributions.services.get_distribution_history')
+    def test_export_parquet(self, get_distribution_history):
+        get_distribution_history.return_value = self.history
+        table = pq.read_table(io.BytesIO(self.export_file(self.url, {'format': 'parquet'})))
+        self.assertEqual(table.schema.field('ess_id').type, pa.int64())
+        self.assertCountEqual(table.column('ess_id').to_pylist(), [self.pm_1.ess_id, self.pm_2.ess_id])
+        self.assertCountEqual(table.column('status').to_pylist(), ['Pending', 'SurveyFinished'])
+
 
 class PanelSurveyListViewTestCase(TestCase):
 
@@ -692,3 +743,11 @@ class TaskImportListTestCase(TestCase):
 
         response = self.client.get(url, {'sort': 'asc'})
         self.assertEqual(response.context['object_list'][0], first_import)
+
+    @patch('celery.result.AsyncResult.ready', return_value=False)
+    def test_detail_progress(self, ready):
+        task_import = GroupTaskImportFactory(panel=self.panel, total_rows=10, processed_rows=4, skipped_rows=4)
+        url = resolve_url('manager:task-import-detail', pk=self.panel.pk, task_pk=task_import.pk)
+        response = self.client.get(url, {'format': 'json'})
+        self.assertEqual(response.json(), {'ended': False, 'total_rows': 10, 'processed_rows': 4, 'created_rows': 0,
+                                           'updated_rows': 0, 'skipped_rows': 4})
@@ -2,17 +2,18 @@
 from django.urls import path
 
 # -- QXSMS
-from utils.views import blank_slot_export_csv
+from utils.views import ExportJobDownload, blank_slot_export_csv
 
 # -- QXSMS (LOCAL)
 from .views import (
-    BlankSlotValueImportCsv, BlankSlotValueList, BlankSlotValueUpdate, Home,
-    LinkDistributionExport, ManagerProfileUpdate, MemberList,
-    MessageDistributionDetail, MessageDistributionList, PanelDetail, PanelList,
-    PanelSurveyDetail, PanelSurveyList, PanelUpdate, ProfileCreate,
-    ProfileDeactivate, ProfileDelete, ProfileExportCsv, ProfileExportCustomCsv,
-    ProfileImportCsv, ProfilePasswordReset, ProfileUpdate, TaskImportDetail,
-    TaskImportList, download_sms_stats, members_import_csv_sample,
+    BlankSlotValueImportCsv, BlankSlotValueList, BlankSlotValueUpdate,
+    ExportJobDetail, Home, LinkDistributionExport, ManagerProfileUpdate,
+    MemberList, MessageDistributionDetail, MessageDistributionList,
+    PanelDetail, PanelList, PanelSurveyDetail, PanelSurveyList, PanelUpdate,
+    ProfileCreate, ProfileDeactivate, ProfileDelete, ProfileExportCsv,
+    ProfileExportCustomCsv, ProfileImportCsv, ProfilePasswordReset,
+    ProfileUpdate, TaskImportDetail, TaskImportList, download_sms_stats,
+    members_import_csv_sample,
 )
 
 app_name = 'manager'
@@ -52,6 +53,9 @@ urlpatterns = [
     # TASKS
     path('panels/<int:pk>/import/list/', TaskImportList.as_view(), name='task-import-list'),
     path('panels/<int:pk>/import/detail/<int:task_pk>/', TaskImportDetail.as_view(), name='task-import-detail'),
+    # EXPORTS
+    path('exports/<int:pk>/', ExportJobDetail.as_view(), name='export-job'),
+    path('exports/<int:pk>/download/', ExportJobDownload.as_view(), name='export-job-download'),
     # API
     # MESSAGE DISTRIBUTIONS
     path('panels/<int:pk>/msgdist/', MessageDistributionList.as_view(), name='msg-distribution-list'),
@@ -1,5 +1,6 @@
 # -- STDLIB
 import csv
+import itertools
 from datetime import MINYEAR, datetime, timezone
 
 # -- DJANGO
@@ -7,7 +8,9 @@ from django.contrib import messages
 from django.contrib.messages.views import SuccessMessageMixin
 from django.core.paginator import Paginator
 from django.db.models import Count
-from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.http import (
+    Http404, HttpResponse, HttpResponseRedirect, JsonResponse,
+)
 from django.shortcuts import get_object_or_404
 from django.template.loader import render_to_string
 from django.urls import reverse, reverse_lazy
@@ -26,19 +29,21 @@ from django_filters.views import FilterView
 # -- QXSMS
 from distributions import services, views as distviews
 from distributions.models import MessageDistribution
-from hq.models import Panel, SMSStats
+from hq.models import ExportJob, Panel, SMSStats
+from hq.tasks import start_export
 from hq.views import BlankSlotImportCsv
 from panelist.forms import ProfileForm
 from panelist.models import Profile
 from qxauth.forms import UserUpdateForm
 from qxauth.views import PasswordReset
-from qxsms import settings
 from utils.context_processors import get_instance_name
 from utils.csvimport import BlankSlotValueResource, ProfileResource
+from utils.smsstats import stats_values
 from utils.translation import lng_to_country
 from utils.utils import get_panelist_counts
 from utils.views import (
-    BaseBlankSlotValueList, BaseBlankSlotValueUpdate, csv_response,
+    BaseBlankSlotValueList, BaseBlankSlotValueUpdate, BaseExportJobDetail,
+    export_job_redirect, get_export_format, streaming_csv_response,
 )
 
 # -- QXSMS (LOCAL)
@@ -321,7 +326,7 @@ class TaskImportDetail(DetailView):
     pk_url_kwarg = 'task_pk'
 
     def decompose_result(self):
-        task_info = get_task_info(self.kwargs['pk'], self.object.id)
+        self.task_info = task_info = get_task_info(self.kwargs['pk'], self.object.id)
         result = task_info['results']
         errors = task_info['errors']
         completed = task_info['completed']
@@ -333,9 +338,17 @@ class TaskImportDetail(DetailView):
         context['panel'] = self.object.panel
         context['result'], context['errors'], context['completed'], context['dry_run'] =\
             self.decompose_result()
+        context['ended'] = self.task_info['ended']
+        context['progress'] = self.task_info['progress']
 
         return context
 
+    def render_to_response(self, context, **response_kwargs):
+        """Progress of the import polled by the detail page"""
+        if self.request.GET.get('format') == 'json':
+            return JsonResponse({'ended': context['ended'], **context['progress']})
+        return super().render_to_response(context, **response_kwargs)
+
 
 # Surveys
 class PanelSurveyList(PanelRelatedList):
@@ -343,7 +356,8 @@ class PanelSurveyList(PanelRelatedList):
 
     def get_queryset(self):
         # query link distributions that contains the current panel
-        qs = self.object.distributions.filter(qx_created_date__isnull=False).order_by('-qx_created_date')
+        qs = self.object.distributions.filter(qx_created_date__isnull=False, is_deleting=False)
+        qs = qs.order_by('-qx_created_date')
         return qs.select_related('survey')
 
 
@@ -356,7 +370,7 @@ class PanelSurveyDetail(SingleObjectMixin, FilterView):
 
     def get(self, request, *args, **kwargs):
         self.panel: Panel = get_object_or_404(request.user.panel_set.all(), pk=kwargs.get('pk'))
-        self.object = super().get_object(queryset=self.panel.distributions.all())
+        self.object = super().get_object(queryset=self.panel.distributions.filter(is_deleting=False))
         return super().get(request, *args, **kwargs)
 
     def get_queryset(self):
@@ -408,34 +422,14 @@ class LinkDistributionExport(View):
 
     panel_pk_url_kwarg = 'pk'
     distribution_pk_url_kwarg = 'linkdistribution_pk'
-    columns = ['ess_id', 'status', 'started_at']
-
-    def get_links_for_panel(self, dist, panel):
-        """Filter distribution links belonging to given panel"""
-        return dist.links.filter(profile__panel=panel).prefetch_related('profile')
-
-    def get_history(self, dist):
-        skip_cache = 'nocache' in self.request.GET
-        return services.get_distribution_history(qx_id=dist.qx_id, skip_cache=skip_cache)
-
-    def render_to_csv_response(self, history_links, filename):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
-
-        writer = csv.DictWriter(response, fieldnames=self.columns, extrasaction='ignore')
-        writer.writeheader()
-        writer.writerows(history_links)
-
-        return response
 
     def get(self, request, *args, **kwargs):
         panel = get_object_or_404(request.user.panel_set.all(), pk=kwargs.get(self.panel_pk_url_kwarg))
         dist = get_object_or_404(panel.distributions.all(), pk=kwargs.get(self.distribution_pk_url_kwarg))
-
-        links = self.get_links_for_panel(dist, panel)
-        history = self.get_history(dist)
-        history_links = services.merge_links_and_history(links, history)
-        return self.render_to_csv_response(history_links, filename=f"{panel.name}-{dist.short_uid}")
+        job = start_export(ExportJob.KIND_LINKS, request.user, f"{panel.name}-{dist.short_uid}", panel=panel,
+                           file_format=get_export_format(request), distribution=dist.pk,
+                           nocache='nocache' in request.GET)
+        return export_job_redirect(request, job)
 
 
 class ProfileExportCsv(SingleObjectMixin, View):
@@ -445,11 +439,10 @@ class ProfileExportCsv(SingleObjectMixin, View):
 
     def get(self, request, *args, **kwargs):
         panel = self.get_object()
-        resource = ProfileResource(panel_id=panel.pk)
         exclude_readonly = "all" not in request.GET
-        dataset = resource.export(exclude_readonly=exclude_readonly)
-        response = csv_response(dataset.csv, 'export-' + panel.name)
-        return response
+        job = start_export(ExportJob.KIND_PROFILES, request.user, 'export-' + panel.name, panel=panel,
+                           file_format=get_export_format(request), exclude_readonly=exclude_readonly)
+        return export_job_redirect(request, job)
 
 
 class ProfileExportCustomCsv(FormView):
@@ -459,9 +452,9 @@ class ProfileExportCustomCsv(FormView):
     def form_valid(self, form):
         selected_fields = [k for k, v in form.cleaned_data.items() if v]
         panel = self.request.user.panel_set.all().get(pk=self.kwargs['pk'])
-        dataset = ProfileResource(panel_id=panel.pk).export(fields=selected_fields)
-        response = csv_response(dataset.csv, 'export-' + panel.name)
-        return response
+        job = start_export(ExportJob.KIND_PROFILES, self.request.user, 'export-' + panel.name, panel=panel,
+                           fields=selected_fields)
+        return export_job_redirect(self.request, job)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -469,6 +462,10 @@ class ProfileExportCustomCsv(FormView):
         return context
 
 
+class ExportJobDetail(BaseExportJobDetail):
+    template_name = 'manager/export_job_detail.html'
+
+
 def members_import_csv_sample(request):
     resource = ProfileResource()
     fieldnames = resource.get_user_visible_headers()
@@ -528,17 +525,12 @@ class MessageDistributionList(distviews.MessageDistributionList):
 
 
 def download_sms_stats(request, panel_pk, msgdist_pk):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="stats_sms.csv"'
-
-    writer = csv.DictWriter(response, fieldnames=["Panelist ID", "Status", "Bounce Reason", "Last status update"])
-
-    writer.writeheader()
-    for stat in SMSStats.objects.filter(msgdist_id=msgdist_pk, panelist__panel_id=panel_pk):
-        writer.writerow({"Panelist ID": stat.panelist.panelist_id, "Status": stat.smsstatus,
-                         "Bounce Reason": stat.bouncereason, "Last status update": stat.datefile})
-
-    return response
+    panel = get_object_or_404(request.user.panel_set.all(), pk=panel_pk)
+    stats = stats_values(SMSStats.objects.filter(msgdist_id=msgdist_pk, panelist__panel=panel))
+    rows = ([stat['panelist_code'], stat['smsstatus'], stat['bouncereason'], stat['datefile']]
+            for stat in stats.iterator(chunk_size=2000))
+    header = ["Panelist ID", "Status", "Bounce Reason", "Last status update"]
+    return streaming_csv_response("stats_sms.csv", itertools.chain([header], rows))
 
 
 class MessageDistributionDetail(SingleObjectMixin, FilterView):
@@ -550,7 +542,8 @@ class MessageDistributionDetail(SingleObjectMixin, FilterView):
     history = None
 
     def get(self, request, *args, **kwargs):
-        self.object = super().get_object(queryset=MessageDistribution.objects.annotate(Count('links')))
+        queryset = MessageDistribution.objects.filter(is_deleting=False, link_distribution__is_deleting=False)
+        self.object = super().get_object(queryset=queryset.annotate(Count('links')))
         # There are no detailed stats by panel for sms
         return super().get(request, *args, **kwargs)
 
@@ -566,7 +559,7 @@ class MessageDistributionDetail(SingleObjectMixin, FilterView):
         kwargs = super().get_filterset_kwargs(filterset_class)
         skip_cache = 'nocache' in self.request.GET
         if self.object.qx_id:
-            self.history = services.get_distribution_history(qx_id=self.object.qx_id, skip_cache=skip_cache)
+            self.history = services.get_message_distribution_history(self.object, skip_cache=skip_cache)
         kwargs['history'] = self.history
         return kwargs
 
@@ -587,14 +580,10 @@ class MessageDistributionDetail(SingleObjectMixin, FilterView):
             context['profiles'] = paginator.get_page(page)
 
             if self.object.is_sms:
-                statssms = SMSStats.objects.filter(panelist__panel=context["panel"], msgdist=self.object)
-                context['detailedstatssms'] = statssms
-                stats = services.get_distribution_stats(
-                    qx_id=self.object.qx_id,
-                    survey_id=settings.QXSMS_SEND_SURVEY,
-                    skip_cache=skip_cache,
-                    is_sms=True,
-                )
+                context['sms_summaries'] = self.object.sms_summaries.filter(panel=context["panel"]).order_by('-count')
+                stats = SMSStats.objects.filter(panelist__panel=context["panel"], msgdist=self.object)
+                context['detailedstatssms'] = Paginator(stats_values(stats), self.paginated_by).get_page(page)
+                stats = services.get_message_distribution_stats(self.object, skip_cache=skip_cache)
             else:
                 stats = services.msg_distributions_stats(context['object_list'])
 
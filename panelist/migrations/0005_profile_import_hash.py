@@ -0,0 +1,18 @@
+# Generated by Django 3.2.12 on 2026-10-19 15:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('panelist', '0004_auto_20220307_1604'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='import_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
@@ -107,6 +107,9 @@ class AbstractProfile(models.Model):
         ('UA', _('Ukraine')),
     ]
 
+    # Attributes mirrored on the related user
+    USER_FIELDS = ('first_name', 'last_name', 'email', 'phone', 'is_active')
+
     ACCOUNT_NOTACTIVATED = 0
     ACCOUNT_ACTIVATED = 1
     ACCOUNT_DEACTIVATED = 2
@@ -229,10 +232,17 @@ class AbstractProfile(models.Model):
     def age(self):
         try:
             today = timezone.now().date()
-            return relativedelta(today, self.date_of_birth).years
+            date_of_birth = self.date_of_birth
+            if date_of_birth is None:
+                return None
+            return relativedelta(today, date_of_birth).years
         except Exception:
             return None
 
+    def get_user_fields(self):
+        """Profile attributes mirrored on the related user"""
+        return {field: getattr(self, field) for field in self.USER_FIELDS}
+
     def save(self, *args, **kwargs):
         # Change from blank strings to None so that we don't have uniqueness problems between profiles.
         self.email = self.email or None
@@ -240,25 +250,11 @@ class AbstractProfile(models.Model):
         if self.user_id is None and self.pk is None:
             # Instance is being created and user not created
             with transaction.atomic():
-                self.user = User.objects.create_user(
-                    User.objects.make_random_password(),
-                    email=self.email,
-                    first_name=self.first_name,
-                    last_name=self.last_name,
-                    phone=self.phone,
-                    is_active=self.is_active,
-                )
+                self.user = User.objects.provision_user(**self.get_user_fields())
                 self.user.groups.add(Group.objects.get_or_create(name=settings.QXSMS_GROUP_PANEL_MEMBERS)[0])
         elif self.user_id:
             # User already exists
-            fields_to_update = {
-                'first_name': self.first_name,
-                'last_name': self.last_name,
-                'email': self.email,
-                'phone': self.phone,
-                'is_active': self.is_active,
-            }
-            User.objects.filter(id=self.user_id).update(**fields_to_update)
+            User.objects.filter(id=self.user_id).update(**self.get_user_fields())
 
         return super().save(*args, **kwargs)
 
@@ -322,6 +318,16 @@ class Profile(AbstractProfile):
     no_text = models.BooleanField(default=False)
     no_email = models.BooleanField(default=False)
 
+    # Fingerprint of the row of the last bulk import of the profile, to skip it when it is imported unchanged
+    import_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
+
+    def save(self, *args, **kwargs):
+        # Once changed by any other means, the profile may no longer match its last imported row
+        self.import_hash = ''
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = [*kwargs['update_fields'], 'import_hash']
+        return super().save(*args, **kwargs)
+
     @property
     def panelist_id(self):
         return f'{self.country}{self.ess_id}'
@@ -337,11 +343,12 @@ class Profile(AbstractProfile):
 
     @property
     def age_group(self):
+        age = self.age
         for value, rng in self.AGE_GROUPS:
             rng_min = rng['min']
             rng_max = rng['max']
-            if rng_min and rng_min <= self.age:
-                if (rng_max and self.age <= rng_max) or not rng_max:
+            if rng_min and age is not None and rng_min <= age:
+                if (rng_max and age <= rng_max) or not rng_max:
                     return rng['code'], value
         na_value, na_rng = self.AGE_GROUPS[-1]
         return na_rng['code'], na_value
@@ -359,8 +366,12 @@ class Profile(AbstractProfile):
             'panel': self.panel.name,
         }
 
-        for name, value in self.blankslotvalue_set.values_list('blankslot__name', 'value'):
-            data[name] = value
+        # Use blank slot values prefetched by bulk serializations when available
+        slot_values = self.blankslotvalue_set.all()
+        if 'blankslotvalue_set' not in getattr(self, '_prefetched_objects_cache', {}):
+            slot_values = slot_values.select_related('blankslot')
+        for slot_value in slot_values:
+            data[slot_value.blankslot.name] = slot_value.value
         return data
 
     def clean(self):
@@ -92,3 +92,8 @@ class ProfileTestCase(TestCase):
             profile = Profile(year_of_birth=1993, month_of_birth=27, day_of_birth=11)
             with self.assertRaisesMessage(ValueError, "month must be in 1..12"):
                 profile.date_of_birth
+
+    def test_age_group_unknown_date_of_birth(self):
+        profile = Profile(year_of_birth=9999, month_of_birth=1, day_of_birth=1)
+        self.assertIsNone(profile.age)
+        self.assertEqual(profile.age_group_code, 9)
@@ -1,4 +1,5 @@
 # -- STDLIB
+import unicodedata
 from datetime import timedelta
 
 # -- DJANGO
@@ -25,6 +26,11 @@ from qxsms import settings
 User = get_user_model()
 
 
+def _unicode_ci_compare(s1, s2):
+    """Case-insensitive comparison of two strings, as done by Django's `PasswordResetForm`"""
+    return unicodedata.normalize('NFKC', s1).casefold() == unicodedata.normalize('NFKC', s2).casefold()
+
+
 class QxsmsAuthForm(AuthenticationForm):
     field_order = ['username', 'password']
 
@@ -186,6 +192,25 @@ class SetPhoneForm(PasswordResetForm):
         return self.user
 
 
+class EmailPasswordResetForm(PasswordResetForm):
+
+    def get_users(self, email):
+        """ Return active users with a matching email, including panelists without a password yet
+
+        As `PasswordResetForm.get_users()`, with `can_reset_password()` instead of `has_usable_password()`.
+        """
+        email_field_name = User.get_email_field_name()
+        active_users = User._default_manager.filter(**{
+            '%s__iexact' % email_field_name: email,
+            'is_active': True,
+        })
+        return (
+            u for u in active_users
+            if u.can_reset_password() and
+            _unicode_ci_compare(email, getattr(u, email_field_name))
+        )
+
+
 class PhonePasswordResetForm(PasswordResetForm):
     email = PhoneNumberField(label=_("Phone number"), widget=PhoneNumberPrefixWidget)
 
@@ -196,7 +221,7 @@ class PhonePasswordResetForm(PasswordResetForm):
             profile__isnull=False,
             is_active=True,
         )
-        return (u for u in active_users if u.has_usable_password())
+        return (u for u in active_users if u.can_reset_password())
 
     def save(self, *args, email_template_name='registration/password_reset_email.html',
              use_https=False, token_generator=default_token_generator, request=None, **kwargs):
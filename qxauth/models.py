@@ -26,16 +26,33 @@ class QxsmsUserManager(BaseUserManager):
         """
         Create and save a user with the given email and password.
         """
-        user = self.model(**extra_fields)
-        user.set_password(password)
+        user = self.init_user(password, **extra_fields)
         user.save(using=self._db)
         return user
 
-    def create_user(self, password, **extra_fields):
+    def init_user(self, password, **extra_fields):
+        """
+        Initialize an unsaved user with the given password.
+
+        A `None` password gives the user an unusable password, which costs no hashing.
+        """
         extra_fields.setdefault('is_staff', False)
         extra_fields.setdefault('is_superuser', False)
+        user = self.model(**extra_fields)
+        user.set_password(password)
+        return user
+
+    def create_user(self, password, **extra_fields):
         return self._create_user(password, **extra_fields)
 
+    def provision_user(self, **extra_fields):
+        """
+        Create a user account without a password, for a panelist.
+
+        The panelist chooses a password through the password reset flow.
+        """
+        return self.create_user(None, **extra_fields)
+
     def create_superuser(self, password, **extra_fields):
         """
         Create and save an admin user with the given email and password.
@@ -166,6 +183,10 @@ class User(AbstractBaseUser, EverybodyIsFreeMixin):
         """Return the login username for this User."""
         return self.email or str(self.phone)
 
+    def can_reset_password(self):
+        """Panelist accounts are provisioned without a password, and get one through the reset flow"""
+        return self.has_usable_password() or hasattr(self, 'profile')
+
     def get_tokens(self):
         uid = urlsafe_base64_encode(force_bytes(self.pk))
         token = default_token_generator.make_token(self)
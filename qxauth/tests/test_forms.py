@@ -4,7 +4,10 @@ from django.test import TestCase
 # -- QXSMS
 from manager.factories import ManagerFactory
 from panelist.factories import PanelistFactory
-from qxauth.forms import QxsmsAuthByEmailForm, QxsmsAuthByPhoneForm
+from qxauth.forms import (
+    EmailPasswordResetForm, QxsmsAuthByEmailForm, QxsmsAuthByPhoneForm,
+)
+from qxauth.models import User
 
 
 class LoginFormTestCase(TestCase):
@@ -30,3 +33,25 @@ class LoginFormTestCase(TestCase):
     def test_phone_login_form(self):
         form = QxsmsAuthByPhoneForm(None, self.data)
         self.assertTrue(form.is_valid())
+
+
+class EmailPasswordResetFormTestCase(TestCase):
+
+    def test_panelist_without_password(self):
+        pm = PanelistFactory()
+        pm.user.set_unusable_password()
+        pm.user.save()
+        form = EmailPasswordResetForm()
+        self.assertEqual(list(form.get_users(pm.email.upper())), [pm.user])
+
+    def test_user_without_password(self):
+        user = User.objects.create_user(None, email='user@qxsms.eu')
+        form = EmailPasswordResetForm()
+        self.assertEqual(list(form.get_users(user.email)), [])
+
+    def test_unicode_collision(self):
+        """Emails only matching once case-folded by the database are ignored"""
+        pm = PanelistFactory(email='mike@example.org')
+        form = EmailPasswordResetForm()
+        self.assertEqual(list(form.get_users('mıke@example.org')), [])
+        self.assertEqual(list(form.get_users('MIKE@example.org')), [pm.user])
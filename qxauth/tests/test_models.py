@@ -26,6 +26,11 @@ class QxsmsUserManagerTestCase(TestCase):
         with self.assertRaises(User.DoesNotExist):
             User.objects.get_by_natural_key('+33666618542')
 
+    def test_provision_user(self):
+        user = User.objects.provision_user(email='panelist@qxsms.eu')
+        self.assertFalse(user.has_usable_password())
+        self.assertFalse(user.is_staff)
+
 
 class UserTestCase(TestCase):
 
@@ -1,6 +1,5 @@
 # -- DJANGO
 from django.conf import settings
-from django.contrib.auth.forms import PasswordResetForm
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import (
     LoginView, PasswordChangeView, PasswordResetConfirmView, PasswordResetView,
@@ -12,7 +11,8 @@ from django.utils.translation import gettext_lazy as _
 
 # -- QXSMS
 from qxauth.forms import (
-    PhonePasswordResetForm, QxsmsAuthByEmailForm, QxsmsAuthByPhoneForm,
+    EmailPasswordResetForm, PhonePasswordResetForm, QxsmsAuthByEmailForm,
+    QxsmsAuthByPhoneForm,
 )
 
 
@@ -77,7 +77,7 @@ class PasswordChange(LoginRequiredMixin, AppLabelMixin, PasswordChangeView):
 
 
 class PasswordReset(SuccessMessageMixin, PasswordResetView):
-    form_class = PasswordResetForm
+    form_class = EmailPasswordResetForm
     template_name = 'password_reset.html'
     email_template_name = 'password_reset_email.html'
     success_message = _("An email with a password reset link has been sent.")
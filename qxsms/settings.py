@@ -74,6 +74,25 @@ DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
 # Celery
 CELERY_BROKER_URL = f'pyamqp://{RABBIT_HOST}:{RABBIT_PORT}'
 CELERY_RESULT_BACKEND = 'django-db'
+# Seconds between sweeps of the queue of scheduled message distributions
+QXSMS_SCHEDULE_INTERVAL = int(os.environ.get('QXSMS_SCHEDULE_INTERVAL', '300'))
+# Maximum rows of an uploaded profile file, and rows validated by each import task
+QXSMS_IMPORT_MAX_LINES = int(os.environ.get('QXSMS_IMPORT_MAX_LINES', '100000'))
+QXSMS_IMPORT_CHUNK_SIZE = int(os.environ.get('QXSMS_IMPORT_CHUNK_SIZE', '1000'))
+CELERY_BEAT_SCHEDULE = {
+    'dispatch-due-sends': {
+        'task': 'distributions.tasks.dispatch_due_sends',
+        'schedule': QXSMS_SCHEDULE_INTERVAL,
+    },
+    'discard-stale-uploads': {
+        'task': 'manager.tasks.discard_stale_uploads',
+        'schedule': 60 * 60,
+    },
+    'discard-stale-exports': {
+        'task': 'hq.tasks.discard_stale_exports',
+        'schedule': 24 * 60 * 60,
+    },
+}
 
 # Application definition
 INSTALLED_APPS = [
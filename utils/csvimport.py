@@ -1,9 +1,40 @@
+# -- STDLIB
+import calendar
+import hashlib
+import json
+import logging
+import traceback
+from collections import Counter
+
+# -- DJANGO
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import (
+    BooleanField, Case, CharField, F, IntegerField, Max, Q, Value, When,
+)
+from django.db.models.functions import Cast, Coalesce, Concat, LPad
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
 # -- THIRDPARTY
 from import_export import resources, widgets
 from import_export.fields import Field
+from import_export.instance_loaders import (
+    BaseInstanceLoader, CachedInstanceLoader,
+)
+from import_export.results import RowResult
+from phonenumber_field.phonenumber import to_python as to_phone_number
 
 # -- QXSMS
+from hq.models import DataVersion
 from panelist.models import BlankSlot, BlankSlotValue, Profile
+from utils.utils import bulk_upsert
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
 
 FIELD_MAP = {
     'ess_id': 'idno',
@@ -68,6 +99,76 @@ class IsNotBlankField(resources.Field):
         return "1"
 
 
+# Conditions on the dates aliased by `alias_birth_date()` for them to be valid dates
+VALID_BIRTH_DATE = Q(birth_year__isnull=False, birth_month__range=(1, 12), birth_day__gte=1) & (
+    Q(birth_day__lte=28)
+    | Q(birth_month__in=(1, 3, 5, 7, 8, 10, 12), birth_day__lte=31)
+    | Q(birth_month__in=(4, 6, 9, 11), birth_day__lte=30)
+    | Q(birth_month=2, birth_day=29, birth_year_mod4=0) & (~Q(birth_year_mod100=0) | Q(birth_year_mod400=0))
+)
+
+
+def alias_birth_date(queryset):
+    """Alias the year, month and day of `Profile.date_of_birth`
+
+    Unknown years of birth are NULL, unknown months and days of birth count as the first one.
+    """
+    return queryset.alias(
+        birth_year=Case(When(year_of_birth__range=(1, 7776), then=F('year_of_birth')), output_field=IntegerField()),
+        birth_month=Case(When(month_of_birth__gte=77, then=Value(1)), default=F('month_of_birth'),
+                         output_field=IntegerField()),
+        birth_day=Case(When(day_of_birth__gte=77, then=Value(1)), default=F('day_of_birth'),
+                       output_field=IntegerField()),
+    ).alias(
+        birth_year_mod4=F('birth_year') % 4,
+        birth_year_mod100=F('birth_year') % 100,
+        birth_year_mod400=F('birth_year') % 400,
+    )
+
+
+def age_expression(today):
+    """Age in years on `today` of profiles aliased by `alias_birth_date()`, as `Profile.age`
+
+    The age is NULL when the date of birth is not known or is not a valid date.
+    """
+    day = today.day
+    if (today.month, today.day) == (2, 28) and not calendar.isleap(today.year):
+        # As with `relativedelta`, birthdays on February 29th are on the 28th in common years
+        day = 29
+    birthday_to_come = Q(birth_month__gt=today.month) | Q(birth_month=today.month, birth_day__gt=day)
+    return Case(
+        When(
+            VALID_BIRTH_DATE,
+            then=Value(today.year) - F('birth_year') - Case(When(birthday_to_come, then=Value(1)), default=Value(0)),
+        ),
+        output_field=IntegerField(),
+    )
+
+
+def age_group_expression(age):
+    """Code of the `Profile.AGE_GROUPS` of the `age` alias, as `Profile.age_group_code`"""
+    whens = []
+    for rng in dict(Profile.AGE_GROUPS).values():
+        if rng['min'] is None:
+            default = rng['code']
+        elif rng['max'] is None:
+            whens.append(When(**{f'{age}__gte': rng['min']}, then=Value(rng['code'])))
+        else:
+            whens.append(When(**{f'{age}__range': (rng['min'], rng['max'])}, then=Value(rng['code'])))
+    return Case(*whens, default=Value(default))
+
+
+def is_not_blank_expression(name, typed=False):
+    """"1" when the `name` attribute of profiles is not blank, "0" otherwise, as `IsNotBlankField`
+
+    The expression is a boolean when `typed`.
+    """
+    blank = Q(**{f'{name}__isnull': True}) | Q(**{name: ''})
+    if typed:
+        return Case(When(blank, then=Value(False)), default=Value(True), output_field=BooleanField())
+    return Case(When(blank, then=Value('0')), default=Value('1'))
+
+
 class EmptyToNoneWidget(widgets.Widget):
     """This widget that transforms an empty string into None is useful for phone and email fields
      so that an empty string is not considered as a new value for the field
@@ -131,6 +232,86 @@ class BaseProfileResource(resources.ModelResource):
         """Ensure fields are ordered as in the FIELD_MAP"""
         return tuple(name for name in FIELD_MAP if name in self.fields)
 
+    def get_export_expressions(self):
+        """Expressions computing the read-only fields in the database, by field name
+
+        They match the values exported from profile instances, and rely on the `export_age_years` alias.
+        """
+        return {
+            'date_of_birth': Concat(
+                LPad(Cast(Coalesce('day_of_birth', 0), CharField()), 2, Value('0')),
+                LPad(Cast(Coalesce('month_of_birth', 0), CharField()), 2, Value('0')),
+                Cast(Coalesce('year_of_birth', 0), CharField()),
+            ),
+            'age': Coalesce(Cast('export_age_years', CharField()), Value('999')),
+            'age_group_code': age_group_expression('export_age_years'),
+            'panelist_id': Concat('country', Cast('ess_id', CharField())),
+            'email_not_blank': is_not_blank_expression('email'),
+            'phone_not_blank': is_not_blank_expression('phone'),
+            'address_not_blank': is_not_blank_expression('address'),
+            'false_email': Case(When(email__endswith='opinionsurvey.org', then=Value('1')), default=Value('0')),
+            'panel__name': F('panel__name'),
+        }
+
+    def get_typed_export_expressions(self):
+        """Expressions of the read-only fields exported with their own type, to columnar formats
+
+        Ages are integers, NULL when unknown, and presence flags are booleans.
+        """
+        return {
+            'age': F('export_age_years'),
+            'email_not_blank': is_not_blank_expression('email', typed=True),
+            'phone_not_blank': is_not_blank_expression('phone', typed=True),
+            'address_not_blank': is_not_blank_expression('address', typed=True),
+            'false_email': Case(When(email__endswith='opinionsurvey.org', then=Value(True)), default=Value(False),
+                                output_field=BooleanField()),
+        }
+
+    def get_export_values(self, queryset=None, typed=False, **kwargs):
+        """Fields to export, with the model fields their values are read from, and the queryset of the values
+
+        Only the exported columns are read with `.values_list()`, the read-only ones being computed by the
+        database. `typed` values are not meant to be rendered as text, see `get_typed_export_expressions()`.
+        """
+        self.before_export(queryset, **kwargs)
+        if queryset is None:
+            queryset = self.get_queryset()
+        today = timezone.now().date()
+        expressions = self.get_export_expressions()
+        if typed:
+            expressions.update(self.get_typed_export_expressions())
+        queryset = alias_birth_date(queryset).alias(export_age_years=age_expression(today))
+
+        fields = self.get_export_fields()
+        names = {field: name for name, field in self.fields.items()}
+        columns = []
+        for field in fields:
+            if names[field] in expressions:
+                column = f'export_{field.column_name}'
+                queryset = queryset.annotate(**{column: expressions[names[field]]})
+                columns.append(column)
+            else:
+                columns.append(field.attribute)
+
+        output_fields = [
+            queryset.query.annotations[column].output_field if column in queryset.query.annotations
+            else queryset.model._meta.get_field(column)
+            for column in columns
+        ]
+        return fields, output_fields, queryset.values_list(*columns)
+
+    def iter_export(self, queryset=None, chunk_size=2000, **kwargs):
+        """Export rows one at a time: the header row, then one row per profile
+
+        Unlike `export()`, no dataset is built, and no profile instance either: the values are
+        read from a server-side cursor, `chunk_size` rows at a time, so that they can be streamed.
+        """
+        fields, _, values = self.get_export_values(queryset, **kwargs)
+        yield self.get_export_headers()
+        for row in values.iterator(chunk_size=chunk_size):
+            # As `Field.export()`
+            yield ["" if value is None else field.widget.render(value) for field, value in zip(fields, row)]
+
 
 class ProfileResource(BaseProfileResource):
     """Resource used for import and export of profile data by national coordinators."""
@@ -213,11 +394,320 @@ class ProfileResource(BaseProfileResource):
             instance.panel_id = self.panel_id
 
 
-class ProfileForeignKeyWidget(widgets.ForeignKeyWidget):
+class BatchSaveMixin:
+    """Save the instances of a bulk import by batches, each batch in its own savepoint
+
+    Errors occurring while saving a batch cannot be attributed to a row: they are
+    reported as base errors of the import result, so that the whole import is rolled back.
+    Batches do not send the model signals either, so the `data_version` the import
+    changes is bumped once the import is committed.
+    """
+
+    data_version = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bulk_errors = []
+
+    def save_batch(self, instances, save, using_transactions, dry_run):
+        if not instances or (not using_transactions and dry_run):
+            instances.clear()
+            return
+        try:
+            with transaction.atomic():
+                save(instances)
+        except Exception as e:
+            logger.debug(e, exc_info=e)
+            self.bulk_errors.append(self.get_error_result_class()(e, traceback.format_exc()))
+        finally:
+            instances.clear()
+
+    def after_import(self, dataset, result, using_transactions, dry_run, **kwargs):
+        for error in self.bulk_errors:
+            result.append_base_error(error)
+        self.bulk_errors = []
+        if not dry_run:
+            DataVersion.bump_on_commit(self.data_version)
+
+
+class BulkProfileResource(BatchSaveMixin, ProfileResource):
+    """Import profiles by batches, bypassing `Profile.save()`
+
+    Uniqueness of ESS IDs, emails and phones is checked for the whole file before the import.
+    Existing profiles are loaded in a single query, then users, their panel members group
+    membership and profiles are created or updated with one query per batch. The user
+    attributes are mirrored from `Profile.get_user_fields()`, and users are provisioned
+    without a password, as `Profile.save()` does.
+
+    Rows already `validated` by a dry run, as chunked imports do in parallel before writing
+    the whole file, are only checked for uniqueness again, not validated by the model.
+    The counts of rows by import type are passed to `progress` for every batch of rows.
+    """
+
+    class Meta(ProfileResource.Meta):
+        use_bulk = True
+        batch_size = 1000
+        instance_loader_class = CachedInstanceLoader
+
+    UNIQUE_FIELDS = ('email', 'phone')
+    data_version = DataVersion.PROFILES
+
+    def __init__(self, *args, validated=False, progress=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.validated = validated
+        self.progress = progress
+        self.progress_counts = Counter()
+        self.unique_errors = {}
+        self.row_hashes = {}
+        self.unchanged_rows = set()
+        self.row_number = None
+
+    def get_row_hash(self, row):
+        """Fingerprint of the normalised import columns of `row`"""
+        columns = sorted(field.column_name for field in self.get_import_fields() if field.column_name in row)
+        values = [(column, str(row[column] if row[column] is not None else '').strip()) for column in columns]
+        return hashlib.sha256(json.dumps(values).encode()).hexdigest()
+
+    def get_unchanged_rows(self, dataset):
+        """Numbers of the rows identical to the last imported rows of their profiles
+
+        Rows of ESS IDs appearing more than once in the file are always imported, so that the
+        last one is applied, as are rows with uniqueness errors.
+        """
+        ess_ids = {}
+        for number, row in enumerate(dataset.dict, 1):
+            self.row_hashes[number] = self.get_row_hash(row)
+            try:
+                ess_ids[number] = self.fields['ess_id'].clean(row)
+            except (KeyError, ValueError):
+                pass
+        counts = Counter(ess_ids.values())
+        stored = dict(
+            Profile.objects.filter(panel_id=self.panel_id, ess_id__in=counts).exclude(import_hash='')
+            .values_list('ess_id', 'import_hash')
+        )
+        return {
+            number for number, ess_id in ess_ids.items()
+            if counts[ess_id] == 1 and number not in self.unique_errors
+            and stored.get(ess_id) == self.row_hashes[number]
+        }
+
+    def get_unique_values(self, dataset):
+        """Cleaned ESS ID, email and phone of each row, by row number"""
+        rows = {}
+        for number, row in enumerate(dataset.dict, 1):
+            values = {}
+            for name in ('ess_id',) + self.UNIQUE_FIELDS:
+                try:
+                    values[name] = self.fields[name].clean(row) or None
+                except (KeyError, ValueError):
+                    values[name] = None
+            if values['email']:
+                values['email'] = values['email'].strip()
+            if values['phone']:
+                phone = to_phone_number(values['phone'])
+                values['phone'] = phone.as_e164 if phone and phone.is_valid() else None
+            rows[number] = values
+        return rows
+
+    def get_unique_owners(self, rows):
+        """Primary keys of the profiles and users owning the emails and phones of the file"""
+        lookup = Q(pk__in=[])
+        for name in self.UNIQUE_FIELDS:
+            lookup |= Q(**{f'{name}__in': {values[name] for values in rows.values() if values[name]}})
+        owners = {}
+        for model in (Profile, User):
+            for pk, *unique_values in model.objects.filter(lookup).values_list('pk', *self.UNIQUE_FIELDS):
+                for name, value in zip(self.UNIQUE_FIELDS, unique_values):
+                    if value:
+                        owners[(model, name, str(value))] = pk
+        return owners
+
+    def get_unique_errors(self, dataset):
+        """Check the uniqueness of ESS IDs, emails and phones of the whole file with a few queries
+
+        Replaces the per row checks of `Profile.validate_unique()`: values are checked against
+        other profiles and users, and against the other rows of the file.
+        Returns validation errors by row number.
+        """
+        rows = self.get_unique_values(dataset)
+        ess_ids = {values['ess_id'] for values in rows.values() if values['ess_id'] is not None}
+        existing = {
+            ess_id: (pk, user_id) for ess_id, pk, user_id in
+            Profile.objects.filter(panel_id=self.panel_id, ess_id__in=ess_ids).values_list('ess_id', 'pk', 'user_id')
+        }
+        owners = self.get_unique_owners(rows)
+
+        errors = {}
+        seen = {}
+        for number, values in rows.items():
+            ess_id = values['ess_id']
+            profile_pk, user_pk = existing.get(ess_id, (None, None))
+            row_errors = {}
+            for name in self.UNIQUE_FIELDS:
+                value = values[name]
+                if not value:
+                    continue
+                other_row = seen.setdefault((name, value), (number, ess_id))
+                if other_row[1] != ess_id:
+                    row_errors[name] = [_("%(name)s is also used on row %(row)s.") % {
+                        'name': name.capitalize(), 'row': other_row[0],
+                    }]
+                elif owners.get((Profile, name, value), profile_pk) != profile_pk:
+                    row_errors[name] = [Profile._meta.get_field(name).error_messages['unique']]
+                elif owners.get((User, name, value), user_pk) != user_pk:
+                    row_errors[name] = [_("%(name)s belongs to another user.") % {'name': name.capitalize()}]
+            if ess_id is not None and profile_pk is None:
+                # New profiles are only created when their batch is saved, and cannot be updated by a later row
+                other_row = seen.setdefault(('ess_id', ess_id), (number, ess_id))
+                if other_row[0] != number:
+                    row_errors['ess_id'] = [_("%(name)s is also used on row %(row)s.") % {
+                        'name': "ESS ID", 'row': other_row[0],
+                    }]
+            if row_errors:
+                errors[number] = row_errors
+        return errors
+
+    def before_import(self, dataset, using_transactions, dry_run, **kwargs):
+        super().before_import(dataset, using_transactions, dry_run, **kwargs)
+        self.unique_errors = self.get_unique_errors(dataset)
+        self.unchanged_rows = self.get_unchanged_rows(dataset)
+
+    def import_row(self, row, instance_loader, **kwargs):
+        """Skip the unchanged rows without cleaning, comparing nor validating them"""
+        if kwargs.get('row_number') in self.unchanged_rows:
+            row_result = self.get_row_result_class()()
+            row_result.import_type = RowResult.IMPORT_TYPE_SKIP
+        else:
+            row_result = super().import_row(row, instance_loader, **kwargs)
+        self.progress_counts[row_result.import_type] += 1
+        if sum(self.progress_counts.values()) >= self._meta.batch_size:
+            self.report_progress()
+        return row_result
+
+    def report_progress(self):
+        if self.progress and self.progress_counts:
+            self.progress(dict(self.progress_counts))
+        self.progress_counts.clear()
+
+    def before_import_row(self, row, row_number=None, **kwargs):
+        self.row_number = row_number
+
+    def validate_instance(self, instance, import_validation_errors=None, validate_unique=True):
+        """Add the errors of the batch uniqueness checks, instead of checking uniqueness row by row
+
+        The panel is set by the resource, and is not checked for each row either.
+        """
+        errors = dict(import_validation_errors or {})
+        for name, messages in self.unique_errors.get(self.row_number, {}).items():
+            errors.setdefault(name, messages)
+        if not self.validated:
+            try:
+                instance.full_clean(exclude=list(errors) + ['panel'], validate_unique=False)
+            except ValidationError as e:
+                errors = e.update_error_dict(errors)
+        if errors:
+            raise ValidationError(errors)
+
+    def get_bulk_update_fields(self):
+        fields = [f.attribute for f in self.get_import_fields() if f.attribute not in self._meta.import_id_fields]
+        return fields + ['import_hash']
+
+    def before_save_instance(self, instance, using_transactions, dry_run):
+        # Same normalization as `Profile.save()`
+        instance.email = instance.email or None
+        instance.phone = instance.phone or None
+        instance.import_hash = self.row_hashes.get(self.row_number, '')
+
+    def create_users(self, profiles):
+        users = [User.objects.init_user(None, **profile.get_user_fields()) for profile in profiles]
+        User.objects.bulk_create(users)
+
+        group, _ = Group.objects.get_or_create(name=settings.QXSMS_GROUP_PANEL_MEMBERS)
+        User.groups.through.objects.bulk_create([User.groups.through(user=user, group=group) for user in users])
+        for profile, user in zip(profiles, users):
+            profile.user = user
+
+    def update_users(self, profiles):
+        users = [User(pk=profile.user_id, **profile.get_user_fields()) for profile in profiles if profile.user_id]
+        User.objects.bulk_update(users, Profile.USER_FIELDS)
+
+    def bulk_create(self, using_transactions, dry_run, raise_errors, batch_size=None):
+        def save(profiles):
+            self.create_users(profiles)
+            Profile.objects.bulk_create(profiles, batch_size=batch_size)
+        self.save_batch(self.create_instances, save, using_transactions, dry_run)
+
+    def bulk_update(self, using_transactions, dry_run, raise_errors, batch_size=None):
+        def save(profiles):
+            self.update_users(profiles)
+            Profile.objects.bulk_update(profiles, self.get_bulk_update_fields(), batch_size=batch_size)
+        self.save_batch(self.update_instances, save, using_transactions, dry_run)
+
+    def after_import(self, dataset, result, using_transactions, dry_run, **kwargs):
+        self.report_progress()
+        super().after_import(dataset, result, using_transactions, dry_run, **kwargs)
+
+
+class PreloadedForeignKeyWidget(widgets.ForeignKeyWidget):
+    """Resolve related objects among those loaded for the whole file by `preload()`
+
+    Falls back to a query per row when nothing was preloaded.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.objects = None
+
+    def to_lookup_value(self, value):
+        return self.model._meta.get_field(self.field).to_python(value)
+
+    def get_row_key(self, value, row):
+        return value
+
+    def get_object_key(self, obj):
+        return getattr(obj, self.field)
+
+    def get_preload_queryset(self, values, rows):
+        return self.model.objects.filter(**{f'{self.field}__in': values})
+
+    def preload(self, column_name, rows):
+        """Load the objects referenced in `column_name` by every row in a single query"""
+        values = set()
+        for row in rows:
+            try:
+                values.add(self.to_lookup_value(row.get(column_name) or None))
+            except ValidationError:
+                pass
+        values.discard(None)
+        self.objects = {self.get_object_key(obj): obj for obj in self.get_preload_queryset(values, rows)}
+
+    def clean(self, value, row=None, *args, **kwargs):
+        if self.objects is None:
+            return super().clean(value, row, *args, **kwargs)
+        if not value:
+            return None
+        try:
+            return self.objects[self.get_row_key(self.to_lookup_value(value), row)]
+        except KeyError:
+            raise self.model.DoesNotExist(f"{self.model._meta.object_name} matching query does not exist.")
+
+
+class ProfileForeignKeyWidget(PreloadedForeignKeyWidget):
 
     def get_queryset(self, value, row, *args, **kwargs):
         return self.model.objects.filter(country=row["cntry"])
 
+    def get_row_key(self, value, row):
+        return (row["cntry"], value)
+
+    def get_object_key(self, obj):
+        return (obj.country, obj.ess_id)
+
+    def get_preload_queryset(self, values, rows):
+        countries = {row.get("cntry") for row in rows}
+        return super().get_preload_queryset(values, rows).filter(country__in=countries)
+
 
 class ProfileHQResource(BaseProfileResource):
 
@@ -245,7 +735,28 @@ class ProfileHQResource(BaseProfileResource):
         }
 
 
-class BlankSlotValueResource(resources.ModelResource):
+class BlankSlotValueInstanceLoader(BaseInstanceLoader):
+    """Load the existing values of the profiles and blank slots preloaded for the file in a single query"""
+
+    def __init__(self, resource, dataset=None):
+        super().__init__(resource, dataset)
+        profiles = {profile.pk: profile for profile in resource.fields['profile'].widget.objects.values()}
+        blankslots = {blankslot.pk: blankslot for blankslot in resource.fields['blankslot'].widget.objects.values()}
+        self.values = {}
+        queryset = resource.get_queryset().filter(profile__in=profiles, blankslot__in=blankslots)
+        for value in queryset:
+            value.profile = profiles[value.profile_id]
+            value.blankslot = blankslots[value.blankslot_id]
+            self.values[(value.profile_id, value.blankslot_id)] = value
+
+    def get_instance(self, row):
+        profile = self.resource.fields['profile'].clean(row)
+        blankslot = self.resource.fields['blankslot'].clean(row)
+        if profile and blankslot:
+            return self.values.get((profile.pk, blankslot.pk))
+
+
+class BlankSlotValueResource(BatchSaveMixin, resources.ModelResource):
 
     profile = resources.Field(
         attribute="profile",
@@ -256,7 +767,7 @@ class BlankSlotValueResource(resources.ModelResource):
     blankslot = resources.Field(
         attribute="blankslot",
         column_name="addvar",
-        widget=widgets.ForeignKeyWidget(BlankSlot, field="name")
+        widget=PreloadedForeignKeyWidget(BlankSlot, field="name")
     )
 
     country = resources.Field(
@@ -272,18 +783,68 @@ class BlankSlotValueResource(resources.ModelResource):
         export_order = ('country', 'profile', 'blankslot', 'value')
         skip_unchanged = True
         use_transactions = True
+        use_bulk = True
+        batch_size = 1000
+        instance_loader_class = BlankSlotValueInstanceLoader
+
+    data_version = DataVersion.BLANK_SLOTS
 
     def __init__(self, *args, panel_id=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.panel_id = panel_id
 
+    def before_import(self, dataset, using_transactions, dry_run, **kwargs):
+        """Load the profiles and blank slots referenced by the file, with a query each"""
+        rows = dataset.dict
+        for name in ('profile', 'blankslot'):
+            field = self.fields[name]
+            field.widget.preload(field.column_name, rows)
+
     def before_save_instance(self, instance, using_transactions, dry_run):
         """Check that we are allowed to alter blank slot values for this panelist."""
-        if self.panel_id and instance.profile.panel.pk != self.panel_id:
+        if self.panel_id and instance.profile.panel_id != self.panel_id:
             raise ValueError('Attempted modifications outside of current panel.')
 
+    def upsert(self, values):
+        bulk_upsert(BlankSlotValue, values, unique_fields=('profile', 'blankslot'), update_fields=('value',))
+
+    def bulk_create(self, using_transactions, dry_run, raise_errors, batch_size=None):
+        self.save_batch(self.create_instances, self.upsert, using_transactions, dry_run)
+
+    def bulk_update(self, using_transactions, dry_run, raise_errors, batch_size=None):
+        self.save_batch(self.update_instances, self.upsert, using_transactions, dry_run)
+
     def get_queryset(self):
         queryset = super().get_queryset()
         if self.panel_id is not None:
             queryset = queryset.filter(profile__panel_id=self.panel_id)
         return queryset
+
+    def iter_export(self, chunk_size=2000):
+        """Export rows one at a time: the header row, then one row per value
+
+        Unlike `export()`, no dataset is built: the values and their profile and blank slot are read
+        from a server-side cursor, `chunk_size` rows at a time, so that they can be streamed.
+        """
+        yield self.get_export_headers()
+        queryset = self.get_queryset().select_related('profile', 'blankslot')
+        for value in queryset.iterator(chunk_size=chunk_size):
+            yield self.export_resource(value)
+
+    def iter_wide_export(self, chunk_size=2000):
+        """Export rows one at a time: the header row, then one row per profile with a column per blank slot
+
+        The values are pivoted by a single aggregated query, read from a server-side cursor, `chunk_size`
+        rows at a time. Only profiles with values are exported, the values they lack are left blank.
+        """
+        blankslots = list(BlankSlot.objects.order_by('name').values_list('pk', 'name'))
+        columns = {f'blankslot_{pk}': Max('value', filter=Q(blankslot_id=pk)) for pk, _ in blankslots}
+        # Grouped by profile
+        queryset = self.get_queryset().values('profile', 'profile__country', 'profile__ess_id').annotate(**columns)
+
+        yield [self.fields['country'].column_name, self.fields['profile'].column_name,
+               *(name for _, name in blankslots)]
+        rows = queryset.order_by('profile__country', 'profile__ess_id').values_list(
+            'profile__country', 'profile__ess_id', *columns)
+        for row in rows.iterator(chunk_size=chunk_size):
+            yield ["" if value is None else value for value in row]
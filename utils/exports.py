@@ -0,0 +1,164 @@
+# -- STDLIB
+import csv
+import gzip
+import io
+import itertools
+import tempfile
+
+# -- DJANGO
+from django.core.files import File
+from django.utils import timezone
+
+# -- THIRDPARTY
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# -- QXSMS
+from distributions import services
+from distributions.models import LinkDistribution
+from hq.models import DataVersion, ExportJob
+from utils.csvimport import (
+    BlankSlotValueResource, ProfileHQResource, ProfileResource,
+)
+
+LINK_COLUMNS = ['ess_id', 'status', 'started_at']
+LINK_SCHEMA = pa.schema([
+    ('ess_id', pa.int64()),
+    ('status', pa.string()),
+    ('started_at', pa.timestamp('us', tz='UTC')),
+])
+
+# Rows of columnar exports are written by batches of this size
+BATCH_SIZE = 10000
+
+# Arrow types of the values of model fields, any other field is exported as text
+ARROW_TYPES = {
+    'BooleanField': pa.bool_(),
+    'IntegerField': pa.int64(),
+    'PositiveIntegerField': pa.int64(),
+    'PositiveSmallIntegerField': pa.int64(),
+    'DateField': pa.date32(),
+    'DateTimeField': pa.timestamp('us', tz='UTC'),
+}
+
+
+def profile_rows(job):
+    return ProfileResource(panel_id=job.panel_id).iter_export(**job.params)
+
+
+def hq_profile_rows(job):
+    return ProfileHQResource().iter_export()
+
+
+def blank_slot_rows(job):
+    """Values of additional variables, one per row, or `wide` with one row per profile"""
+    resource = BlankSlotValueResource(panel_id=job.panel_id)
+    if job.params.get('wide'):
+        yield from resource.iter_wide_export()
+    else:
+        yield from resource.iter_export()
+
+
+def link_values(job):
+    """Individual links of a survey for the panel of the job, with their progress found in the response history"""
+    dist = LinkDistribution.objects.get(pk=job.params['distribution'])
+    links = dist.links.filter(profile__panel=job.panel_id).prefetch_related('profile')
+    history = services.get_distribution_history(qx_id=dist.qx_id, skip_cache=job.params.get('nocache', False))
+    for history_link in services.merge_links_and_history(links, history):
+        yield [history_link.get(column) for column in LINK_COLUMNS]
+
+
+def link_rows(job):
+    yield LINK_COLUMNS
+    yield from link_values(job)
+
+
+def resource_columns(resource, params):
+    """Schema of the profiles exported by `resource`, and their typed values read from a server-side cursor"""
+    fields, output_fields, values = resource.get_export_values(typed=True, **params)
+    schema = pa.schema([(field.column_name, ARROW_TYPES.get(output_field.get_internal_type(), pa.string()))
+                        for field, output_field in zip(fields, output_fields)])
+    return schema, values.iterator(chunk_size=BATCH_SIZE)
+
+
+def profile_columns(job):
+    return resource_columns(ProfileResource(panel_id=job.panel_id), job.params)
+
+
+def hq_profile_columns(job):
+    return resource_columns(ProfileHQResource(), job.params)
+
+
+def link_columns(job):
+    return LINK_SCHEMA, link_values(job)
+
+
+# Rows of each kind of export, and the sets of data it depends on.
+# Exports of links are never reused: the response history comes from Qualtrics.
+EXPORTS = {
+    ExportJob.KIND_PROFILES: (profile_rows, (DataVersion.PROFILES,)),
+    ExportJob.KIND_HQ_PROFILES: (hq_profile_rows, (DataVersion.PROFILES,)),
+    ExportJob.KIND_BLANK_SLOTS: (blank_slot_rows, (DataVersion.PROFILES, DataVersion.BLANK_SLOTS)),
+    ExportJob.KIND_LINKS: (link_rows, ()),
+}
+
+# Schema and typed rows of the kinds of exports that can also be written to columnar formats
+COLUMNAR_EXPORTS = {
+    ExportJob.KIND_PROFILES: profile_columns,
+    ExportJob.KIND_HQ_PROFILES: hq_profile_columns,
+    ExportJob.KIND_LINKS: link_columns,
+}
+
+# Writers of record batches to a file, by columnar format
+BATCH_WRITERS = {
+    ExportJob.FORMAT_PARQUET: pq.ParquetWriter,
+    ExportJob.FORMAT_ARROW: pa.ipc.new_file,
+}
+
+
+def get_data_version(kind):
+    """Stamp of the data exported by exports of `kind`, blank when they cannot be reused
+
+    Exports are not reused from one day to the next either, as they include ages.
+    """
+    _, names = EXPORTS[kind]
+    if not names:
+        return ''
+    return f"{timezone.now().date().isoformat()}/{DataVersion.stamp(*names)}"
+
+
+def write_rows(job, rows):
+    """Write `rows` as a compressed CSV file to the storage, and attach it to `job`"""
+    with tempfile.TemporaryFile() as tmp:
+        with gzip.GzipFile(fileobj=tmp, mode='wb') as gz, io.TextIOWrapper(gz, encoding='utf-8', newline='') as f:
+            csv.writer(f).writerows(rows)
+        tmp.seek(0)
+        job.file.save(f"{job.pk}-{job.kind}.csv.gz", File(tmp), save=False)
+
+
+def record_batches(schema, rows, batch_size=BATCH_SIZE):
+    """Group `rows` of values into record batches of `schema`
+
+    Text columns may hold other objects than strings, such as phone numbers: they are exported as `str()`.
+    """
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return
+        arrays = []
+        for field, values in zip(schema, zip(*batch)):
+            if field.type == pa.string():
+                values = [None if value is None else str(value) for value in values]
+            arrays.append(pa.array(values, type=field.type))
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_batches(job, schema, rows):
+    """Write `rows` of values by record batches to a file of the columnar format of `job`, and attach it to `job`"""
+    with tempfile.TemporaryFile() as tmp:
+        with BATCH_WRITERS[job.file_format](tmp, schema) as writer:
+            for batch in record_batches(schema, rows):
+                writer.write_batch(batch)
+        tmp.seek(0)
+        job.file.save(f"{job.pk}-{job.kind}.{ExportJob.FORMAT_EXTENSIONS[job.file_format]}", File(tmp), save=False)
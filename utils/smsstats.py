@@ -0,0 +1,225 @@
+# -- STDLIB
+import csv
+import io
+import itertools
+import tempfile
+import uuid
+from datetime import datetime
+
+# -- DJANGO
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import connection, transaction
+from django.db.models import CharField, Count, F, Q, Value
+from django.db.models.functions import Cast, Coalesce, Concat
+from django.utils import timezone
+
+# -- QXSMS
+from distributions.models import MessageDistribution
+from hq.models import SMSStats, SMSStatsJob, SMSStatsSummary
+from panelist.models import Profile
+from utils.utils import bulk_upsert
+
+# Rows of SMS statuses files are processed by chunks of this size
+CHUNK_SIZE = 1000
+
+REPORT_COLUMNS = ["filename", "country", "essid", "panelname", "SMSstatus", "BounceReason"]
+
+
+def get_message_distribution(qx_id):
+    """Message distribution sent as Qualtrics distribution `qx_id`, possibly through one of its waves"""
+    return MessageDistribution.objects.filter(Q(qx_id=qx_id) | Q(wave__qx_id=qx_id)).distinct().get()
+
+
+def get_filedate(data):
+    filedate, x = data.split(".")
+    filedate = datetime.strptime(filedate, "%Y-%m-%dT%H-%M-%SZ").replace(tzinfo=timezone.utc)
+    return filedate
+
+
+def parse_file_name(name):
+    """Qualtrics distribution id and date of a SMS statuses file, ValueError if it is not named after either format
+
+    Distribution_history-DATE.csv files have the distribution of each row, its id is None.
+    """
+    try:
+        filetype, data = name.split("-", 1)
+        if "Distribution_history" in filetype:
+            return None, get_filedate(data)
+        if "export" in filetype:  # export-MSGDISTQXID-DATE.csv
+            msgdist_qx_id, filedate = data.split("-", 1)
+            return msgdist_qx_id, get_filedate(filedate)
+    except ValueError:
+        pass
+    raise ValueError("Unknown filename format")
+
+
+def iter_chunks(stats_file):
+    """Rows of the staged file of `stats_file`, read from the storage `CHUNK_SIZE` rows at a time"""
+    with stats_file.file.open('rb') as f:
+        rows = csv.DictReader(io.TextIOWrapper(f, encoding='utf-8'))
+        while True:
+            chunk = list(itertools.islice(rows, CHUNK_SIZE))
+            if not chunk:
+                return
+            yield chunk
+
+
+def get_profiles(rows, *fields):
+    """Values of `fields` of the profiles of `rows`, by uid, in a single query"""
+    uids = set()
+    for row in rows:
+        try:
+            uids.add(uuid.UUID(row["External Data Reference"]))
+        except ValueError:
+            continue
+    return {values[0]: values[1:] for values in Profile.objects.filter(uid__in=uids).values_list('uid', *fields)}
+
+
+def get_profile(profiles, row):
+    try:
+        return profiles[uuid.UUID(row["External Data Reference"])]
+    except (KeyError, ValueError):
+        return None
+
+
+class MessageDistributions(dict):
+    """Message distributions by Qualtrics id, queried once per distinct id, None when not found"""
+
+    def __missing__(self, qx_id):
+        try:
+            self[qx_id] = get_message_distribution(qx_id)
+        except MessageDistribution.DoesNotExist:
+            self[qx_id] = None
+        return self[qx_id]
+
+
+def stats_values(queryset):
+    """SMS statuses of `queryset`, with the ESS ID, panelist ID and panel of their profiles, read by a single query"""
+    return queryset.order_by('panelist__ess_id', 'pk').values(
+        'panelist', 'smsstatus', 'bouncereason', 'datefile',
+        ess_id=F('panelist__ess_id'),
+        panelist_code=Concat('panelist__country', Cast('panelist__ess_id', CharField())),
+        panel_name=F('panelist__panel__name'),
+    )
+
+
+def save_stats(stats, force_save):
+    """Upsert `stats`, and return how many were saved
+
+    Unless `force_save`, statuses of a newer file are kept over those of an older one.
+    """
+    table = connection.ops.quote_name(SMSStats._meta.db_table)
+    datefile = connection.ops.quote_name('datefile')
+    where = None if force_save else f"{table}.{datefile} IS NULL OR {table}.{datefile} <= EXCLUDED.{datefile}"
+    return bulk_upsert(SMSStats, stats, unique_fields=('panelist', 'msgdist'),
+                       update_fields=('smsstatus', 'bouncereason', 'datefile'), where=where)
+
+
+def summarize_stats(msgdist_ids):
+    """Count again the SMS statuses of the message distributions `msgdist_ids`, by panel, status and bounce reason
+
+    The counts are read by a single grouped query, and replace the previous ones.
+    """
+    counts = (SMSStats.objects.filter(msgdist__in=msgdist_ids)
+              .annotate(status=Coalesce('smsstatus', Value('')), reason=Coalesce('bouncereason', Value('')))
+              .values('msgdist', 'panelist__panel', 'status', 'reason')
+              .annotate(count=Count('pk')))
+    with transaction.atomic():
+        SMSStatsSummary.objects.filter(msgdist__in=msgdist_ids).delete()
+        SMSStatsSummary.objects.bulk_create([
+            SMSStatsSummary(msgdist_id=row['msgdist'], panel_id=row['panelist__panel'], smsstatus=row['status'],
+                            bouncereason=row['reason'], count=row['count'])
+            for row in counts
+        ])
+
+
+def import_file(stats_file, msgdists, force_save):
+    """Save the SMS statuses of `stats_file` by chunks, counting its rows as they are processed
+
+    The summaries of the message distributions of the file are counted again once it is processed, including
+    when it fails midway, as the chunks saved before are kept.
+    """
+    msgdist_ids = set()
+    msgdist_qx_id, filedate = parse_file_name(stats_file.name)
+    if msgdist_qx_id is not None and msgdists[msgdist_qx_id] is None:
+        raise ValueError(f"MessageDistribution with qx_id '{msgdist_qx_id}' not found")
+
+    try:
+        for rows in iter_chunks(stats_file):
+            profiles = get_profiles(rows, 'pk')
+            stats = []
+            for row in rows:
+                qx_id = msgdist_qx_id or row["Distribution Id"]
+                if msgdists[qx_id] is None:
+                    stats_file.errors.append(f"MessageDistribution with qx_id '{qx_id}' not found")
+                    continue
+                profile = get_profile(profiles, row)
+                if profile is None:
+                    stats_file.errors.append(row["External Data Reference"])
+                    continue
+                stats.append(SMSStats(panelist_id=profile[0], msgdist=msgdists[qx_id], smsstatus=row["Status"],
+                                      bouncereason=row["Bounce Reason"], datefile=filedate))
+                msgdist_ids.add(msgdists[qx_id].pk)
+            stats_file.saved_rows += save_stats(stats, force_save)
+            stats_file.total_rows += len(rows)
+            stats_file.save(update_fields=['total_rows', 'saved_rows', 'errors'])
+    finally:
+        summarize_stats(msgdist_ids)
+
+
+def write_report_rows(stats_file, report):
+    """Write the SMS statuses of `stats_file` with the profiles they were sent to, by chunks, to `report`"""
+    writer = csv.writer(report)
+    for rows in iter_chunks(stats_file):
+        profiles = get_profiles(rows, 'country', 'ess_id', 'panel__name')
+        for row in rows:
+            profile = get_profile(profiles, row)
+            if profile is None:
+                stats_file.errors.append(row["External Data Reference"])
+                continue
+            writer.writerow([stats_file.name, *profile, row["Status"], row["Bounce Reason"]])
+            stats_file.saved_rows += 1
+        stats_file.total_rows += len(rows)
+        stats_file.save(update_fields=['total_rows', 'saved_rows', 'errors'])
+
+
+def process_files(job, process):
+    """Call `process` with each file of `job`, then discard it from the storage
+
+    What is wrong with a file, such as its name or a missing column, is kept as its error.
+    """
+    for stats_file in job.files.all():
+        stats_file.status = SMSStatsJob.STATUS_RUNNING
+        stats_file.save(update_fields=['status'])
+        try:
+            process(stats_file)
+        except ValueError as e:
+            stats_file.status, stats_file.error = SMSStatsJob.STATUS_FAILED, str(e)[:250]
+        except KeyError as e:
+            stats_file.status, stats_file.error = SMSStatsJob.STATUS_FAILED, f"Missing column {e}"
+        else:
+            stats_file.status = SMSStatsJob.STATUS_DONE
+        finally:
+            stats_file.file.delete(save=False)
+        stats_file.save(update_fields=['status', 'error', 'file'])
+
+
+def import_files(job):
+    msgdists = MessageDistributions()
+    process_files(job, lambda stats_file: import_file(stats_file, msgdists, job.force_save))
+
+
+def email_files(job):
+    """Email the SMS statuses of the files of `job` with the profiles they were sent to, and the uids not found"""
+    with tempfile.TemporaryFile(mode='w+', encoding='utf-8', newline='') as report:
+        csv.writer(report).writerow(REPORT_COLUMNS)
+        process_files(job, lambda stats_file: write_report_rows(stats_file, report))
+        report.seek(0)
+        files = list(job.files.all())
+        uidnotfound = [uid for stats_file in files for uid in stats_file.errors]
+        email = EmailMessage("SMS Stats", f"SMS Stats for {'&'.join([f.name for f in files])}\n\n"
+                                          f"UID not found : {uidnotfound}",
+                             settings.DEFAULT_FROM_EMAIL, job.emails.split(";"))
+        email.attach("sms-stats.csv", report.read())
+        email.send()
@@ -1,19 +1,28 @@
 # -- STDLIB
-from unittest.mock import Mock
+from datetime import datetime, timezone
+from unittest.mock import Mock, patch
 
 # -- DJANGO
 from django.conf import settings
 from django.contrib.auth.models import Group
+from django.db import IntegrityError, connection
 from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
 
 # -- THIRDPARTY
 import tablib
 from import_export import results
 
 # -- QXSMS
-from hq.models import Panel
-from panelist.models import Profile
-from utils.csvimport import IsNotBlankField, ProfileResource, UpperCaseWidget
+from hq.factories import PanelFactory
+from hq.models import DataVersion, Panel
+from panelist.factories import PanelistFactory
+from panelist.models import BlankSlot, BlankSlotValue, Profile
+from qxauth.models import User
+from utils.csvimport import (
+    BlankSlotValueResource, BulkProfileResource, IsNotBlankField,
+    ProfileResource, UpperCaseWidget,
+)
 
 
 class IsNotBlankFieldTestCase(SimpleTestCase):
@@ -44,14 +53,17 @@ class UpperCaseWidgetTestCase(SimpleTestCase):
 
 
 class CsvImportTestCase(TestCase):
+    resource_class = ProfileResource
 
     @classmethod
     def setUpTestData(cls):
         Group.objects.create(name=settings.QXSMS_GROUP_PANEL_MEMBERS)
-        cls.panel = Panel.objects.create(name='Test Import')
+        # Committed, so that data versions are bumped again by the tests
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.panel = Panel.objects.create(name='Test Import')
 
     def test_import_no_rows(self):
-        resource = ProfileResource(panel_id=self.panel.pk)
+        resource = self.resource_class(panel_id=self.panel.pk)
         dataset = tablib.Dataset(headers=resource.get_user_visible_headers())
         result = resource.import_data(dataset)
         self.assertFalse(result.has_errors())
@@ -95,7 +107,7 @@ class CsvImportTestCase(TestCase):
         headers = list(imported_profile)
         row = imported_profile.values()
         data = tablib.Dataset(row, headers=headers)
-        resource = ProfileResource(panel_id=self.panel.pk)
+        resource = self.resource_class(panel_id=self.panel.pk)
         result = resource.import_data(data, raise_errors=True)
         self.assertFalse(result.has_errors())
         self.assertEqual(Profile.objects.filter(ess_id=1).count(), 2)
@@ -155,7 +167,7 @@ class CsvImportTestCase(TestCase):
 
         headers = list(to_create)
         data = tablib.Dataset(create_row, skip_row, update_row, headers=headers)
-        resource = ProfileResource(panel_id=self.panel.pk)
+        resource = self.resource_class(panel_id=self.panel.pk)
         result = resource.import_data(data)
         self.assertFalse(result.has_errors())
         self.assertEqual(result.totals[results.RowResult.IMPORT_TYPE_UPDATE], 1)
@@ -185,7 +197,7 @@ class CsvImportTestCase(TestCase):
         attrs['first_name'] = 'bar'
         u2 = [str(v) for v in attrs.values()]
         data = tablib.Dataset(u1, u2, headers=list(attrs))
-        resource = ProfileResource(panel_id=self.panel.pk)
+        resource = self.resource_class(panel_id=self.panel.pk)
         result = resource.import_data(data)
         self.assertFalse(result.has_errors())
         self.assertEqual(result.totals[results.RowResult.IMPORT_TYPE_UPDATE], 2)
@@ -207,7 +219,7 @@ class CsvImportTestCase(TestCase):
             'no_text',
             'no_email',
         ]
-        resource = ProfileResource(panel_id=self.panel.pk)
+        resource = self.resource_class(panel_id=self.panel.pk)
         headers = resource.get_user_visible_headers()
         row = [''] * len(headers)
         data = tablib.Dataset(row, headers=headers)
@@ -252,7 +264,7 @@ class CsvImportTestCase(TestCase):
         }
         headers = list(valid_row)
         data = tablib.Dataset(valid_row.values(), headers=headers)
-        resource = ProfileResource(panel_id=self.panel.pk)
+        resource = self.resource_class(panel_id=self.panel.pk)
         result = resource.import_data(data, raise_errors=True)
         self.assertFalse(result.invalid_rows)
         p = Profile.objects.filter(ess_id=1).values(*headers).first()
@@ -277,7 +289,7 @@ class CsvImportTestCase(TestCase):
 
         headers = list(valid_row)
         data = tablib.Dataset(valid_row.values(), headers=headers)
-        resource = ProfileResource(panel_id=self.panel.pk)
+        resource = self.resource_class(panel_id=self.panel.pk)
         result = resource.import_data(data, raise_errors=True)
         self.assertFalse(result.invalid_rows)
         p = Profile.objects.get(ess_id=1)
@@ -312,12 +324,184 @@ class CsvImportTestCase(TestCase):
         )
         headers = list(row1)
         data = tablib.Dataset(row1.values(), row2.values(), headers=headers)
-        resource = ProfileResource(panel_id=self.panel.pk)
+        resource = self.resource_class(panel_id=self.panel.pk)
         result = resource.import_data(data, raise_errors=True)
         self.assertFalse(result.has_errors())
         self.assertFalse(result.invalid_rows)
 
 
+class BulkCsvImportTestCase(CsvImportTestCase):
+    resource_class = BulkProfileResource
+
+    def get_dataset(self, *ess_ids, email=None):
+        headers = ['ess_id', 'first_name', 'last_name', 'sex', 'email', 'country', 'language', 'internet_use',
+                   'day_of_birth', 'month_of_birth', 'year_of_birth', 'education_years']
+        rows = [(ess_id, 'first', f'last{ess_id}', 1, email or f'{ess_id}@example.com', 'FR', 'ENG', 1, 1, 1, 2000, 0)
+                for ess_id in ess_ids]
+        return tablib.Dataset(*rows, headers=headers)
+
+    def test_users_created(self):
+        result = self.resource_class(panel_id=self.panel.pk).import_data(self.get_dataset(1, 2), raise_errors=True)
+        self.assertEqual(result.totals[results.RowResult.IMPORT_TYPE_NEW], 2)
+        profile = Profile.objects.select_related('user').get(ess_id=2)
+        self.assertEqual(profile.user.email, '2@example.com')
+        self.assertEqual(profile.user.last_name, 'last2')
+        self.assertTrue(profile.user.is_active)
+        self.assertFalse(profile.user.has_usable_password())
+        self.assertTrue(profile.user.groups.filter(name=settings.QXSMS_GROUP_PANEL_MEMBERS).exists())
+
+    def test_users_updated(self):
+        self.resource_class(panel_id=self.panel.pk).import_data(self.get_dataset(1))
+        dataset = self.get_dataset(1, email='new@example.com')
+        self.resource_class(panel_id=self.panel.pk).import_data(dataset, raise_errors=True)
+        profile = Profile.objects.select_related('user').get(ess_id=1)
+        self.assertEqual(profile.email, 'new@example.com')
+        self.assertEqual(profile.user.email, 'new@example.com')
+
+    def test_writes_per_batch(self):
+        resource = self.resource_class(panel_id=self.panel.pk)
+        DataVersion.objects.update_or_create(name=DataVersion.PROFILES, defaults={'version': 0})
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            resource.import_data(self.get_dataset(*range(1, 21)), raise_errors=True)
+        writes = [q['sql'] for q in queries if q['sql'].startswith(('INSERT', 'UPDATE'))]
+        # Users, group memberships and profiles, then the version of profiles
+        self.assertEqual(len(writes), 4)
+        self.assertEqual(DataVersion.stamp(DataVersion.PROFILES), 'profiles:1')
+        self.assertEqual(Profile.objects.filter(user__isnull=False).count(), 20)
+
+    @patch('panelist.models.Profile.objects.bulk_create', side_effect=IntegrityError)
+    def test_batch_error_rolled_back(self, bulk_create):
+        result = self.resource_class(panel_id=self.panel.pk).import_data(self.get_dataset(1, 2))
+        self.assertTrue(result.has_errors())
+        self.assertFalse(Profile.objects.exists())
+        self.assertFalse(User.objects.exists())
+
+    def test_unchanged_rows_skipped(self):
+        self.resource_class(panel_id=self.panel.pk).import_data(self.get_dataset(1, 2, 3), raise_errors=True)
+        Profile.objects.get(ess_id=3).save()
+        dataset = self.get_dataset(1, 2, 3)
+        dataset[1] = (2, 'first', 'changed', 1, '2@example.com', 'FR', 'ENG', 1, 1, 1, 2000, 0)
+
+        resource = self.resource_class(panel_id=self.panel.pk)
+        with patch.object(resource, 'import_obj', wraps=resource.import_obj) as import_obj:
+            result = resource.import_data(dataset, raise_errors=True)
+        # Only the changed row, and the row of the profile saved since its import, are imported
+        self.assertEqual(import_obj.call_count, 2)
+        self.assertEqual(result.totals[results.RowResult.IMPORT_TYPE_SKIP], 2)
+        self.assertEqual(Profile.objects.get(ess_id=2).last_name, 'changed')
+
+        result = self.resource_class(panel_id=self.panel.pk).import_data(dataset, raise_errors=True)
+        self.assertEqual(result.totals[results.RowResult.IMPORT_TYPE_SKIP], 3)
+
+    def import_errors(self, dataset):
+        result = self.resource_class(panel_id=self.panel.pk).import_data(dataset)
+        return {line.number: line.error_dict for line in result.invalid_rows}
+
+    def test_unique_within_file(self):
+        dataset = self.get_dataset(1, 2, 1, email='same@example.com')
+        self.assertEqual(self.import_errors(dataset), {
+            2: {'email': ['Email is also used on row 1.']},
+            3: {'ess_id': ['ESS ID is also used on row 1.']},
+        })
+
+    def test_unique_against_database(self):
+        self.resource_class(panel_id=self.panel.pk).import_data(self.get_dataset(1, 2))
+        User.objects.create_user(None, email='user@example.com')
+        dataset = self.get_dataset(1, 2, 3)
+        dataset.append((4, 'first', 'last', 1, 'user@example.com', 'FR', 'ENG', 1, 1, 1, 2000, 0))
+        dataset.append((5, 'first', 'last', 1, '1@example.com', 'FR', 'ENG', 1, 1, 1, 2000, 0))
+        self.assertEqual(self.import_errors(dataset), {
+            4: {'email': ['Email belongs to another user.']},
+            5: {'email': ['Email is also used on row 1.']},
+        })
+        dataset = self.get_dataset(3)
+        dataset.append((4, 'first', 'last', 1, '1@example.com', 'FR', 'ENG', 1, 1, 1, 2000, 0))
+        self.assertEqual(self.import_errors(dataset), {
+            2: {'email': ['A user with that email address already exists.']},
+        })
+
+    def test_unique_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.resource_class(panel_id=self.panel.pk).import_data(self.get_dataset(*range(1, 21)))
+        self.assertFalse([q for q in queries if q['sql'].startswith('SELECT (1) AS "a"')])
+
+
+class BlankSlotValueImportTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Committed, so that data versions are bumped again by the tests
+        with cls.captureOnCommitCallbacks(execute=True):
+            panel = PanelFactory()
+            cls.profiles = [PanelistFactory(panel=panel, ess_id=ess_id, country='FR') for ess_id in (1, 2, 3)]
+            cls.blankslots = [BlankSlot.objects.create(name=f'blankslot{i}', description='description')
+                              for i in (1, 2)]
+            BlankSlotValue.objects.create(profile=cls.profiles[0], blankslot=cls.blankslots[0], value='old')
+
+    def get_dataset(self, *rows):
+        return tablib.Dataset(*rows, headers=['idno', 'cntry', 'addvar', 'value'])
+
+    def test_upsert(self):
+        dataset = self.get_dataset(('1', 'FR', 'blankslot1', 'new'), ('1', 'FR', 'blankslot2', 'created'),
+                                   ('2', 'FR', 'blankslot1', 'first'), ('2', 'FR', 'blankslot1', 'last'))
+        result = BlankSlotValueResource().import_data(dataset, raise_errors=True)
+        self.assertEqual((result.totals['new'], result.totals['update']), (3, 1))
+        self.assertEqual(
+            sorted(BlankSlotValue.objects.values_list('profile__ess_id', 'blankslot__name', 'value')),
+            [(1, 'blankslot1', 'new'), (1, 'blankslot2', 'created'), (2, 'blankslot1', 'last')],
+        )
+
+    def test_queries(self):
+        """Profiles, blank slots and values are loaded once, whatever the number of rows"""
+        DataVersion.objects.update_or_create(name=DataVersion.BLANK_SLOTS, defaults={'version': 0})
+        dataset = self.get_dataset(*[(str(profile.ess_id), 'FR', blankslot.name, 'value')
+                                     for profile in self.profiles for blankslot in self.blankslots])
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            BlankSlotValueResource().import_data(dataset, raise_errors=True)
+        selects = [q['sql'] for q in queries if q['sql'].startswith('SELECT')]
+        writes = [q['sql'] for q in queries if q['sql'].startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(len(selects), 3)
+        # New and updated values, then the version of blank slots
+        self.assertEqual(len(writes), 3)
+        self.assertEqual(DataVersion.stamp(DataVersion.BLANK_SLOTS), 'blank-slots:1')
+        self.assertEqual(BlankSlotValue.objects.filter(value='value').count(), 6)
+
+    def test_unknown_profile(self):
+        dataset = self.get_dataset(('1', 'BE', 'blankslot1', 'new'), ('4', 'FR', 'blankslot1', 'new'),
+                                   ('1', 'FR', 'blankslot3', 'new'))
+        result = BlankSlotValueResource().import_data(dataset)
+        self.assertEqual(len(result.row_errors()), 3)
+        self.assertEqual(BlankSlotValue.objects.get().value, 'old')
+
+
+class BlankSlotValueExportTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.panel = PanelFactory()
+        profiles = [PanelistFactory(panel=cls.panel, ess_id=ess_id, country='FR') for ess_id in (1, 2, 3)]
+        other = PanelistFactory(ess_id=4, country='FR')
+        blankslots = [BlankSlot.objects.create(name=name, description='description') for name in ('b', 'a')]
+        for profile, blankslot, value in ((profiles[0], blankslots[0], 'b1'), (profiles[0], blankslots[1], 'a1'),
+                                          (profiles[1], blankslots[1], 'a2'), (other, blankslots[0], 'b4')):
+            BlankSlotValue.objects.create(profile=profile, blankslot=blankslot, value=value)
+
+    def test_iter_export(self):
+        """Rows of `export()`, all read with a single query"""
+        resource = BlankSlotValueResource(panel_id=self.panel.pk)
+        dataset = resource.export()
+        with self.assertNumQueries(1):
+            rows = list(resource.iter_export(chunk_size=1))
+        self.assertEqual(rows, [dataset.headers, *map(list, dataset)])
+        self.assertEqual(len(rows), 4)
+
+    def test_iter_wide_export(self):
+        """One row per profile with values, and a column per blank slot, all read with a single query"""
+        with self.assertNumQueries(2):
+            rows = list(BlankSlotValueResource(panel_id=self.panel.pk).iter_wide_export(chunk_size=1))
+        self.assertEqual(rows, [['cntry', 'idno', 'a', 'b'], ['FR', 1, 'a1', 'b1'], ['FR', 2, 'a2', '']])
+
+
 class CSVExportTestCase(TestCase):
     def test_export(self):
         p = Profile(language="EN", email="foo@bar.uk", phone="")
@@ -326,3 +510,49 @@ class CSVExportTestCase(TestCase):
         expected = {"email": "foo@bar.uk", "mobile": "", "lng": "EN", "emailpres": "1", "mobilepres": "0"}
         row, = dataset.dict
         self.assertDictEqual(dict(row), expected)
+
+    def test_iter_export(self):
+        """Streamed rows are those of the exported dataset"""
+        Group.objects.create(name=settings.QXSMS_GROUP_PANEL_MEMBERS)
+        panel = Panel.objects.create(name='Test Export')
+        for ess_id in (1, 2):
+            Profile.objects.create(panel=panel, ess_id=ess_id, sex=1, email=f'{ess_id}@example.com', country='FR',
+                                   language='EN', internet_use=1, day_of_birth=1, month_of_birth=1,
+                                   year_of_birth=2000, education_years=0)
+        dataset = ProfileResource(panel_id=panel.pk).export()
+        headers, *rows = ProfileResource(panel_id=panel.pk).iter_export(chunk_size=1)
+        self.assertEqual(headers, dataset.headers)
+        self.assertEqual(rows, [list(row) for row in dataset])
+
+    @patch('django.utils.timezone.now', return_value=datetime(2023, 2, 28, 12, tzinfo=timezone.utc))
+    def test_iter_export_derived_fields(self, now):
+        """Read-only fields computed by the database are those of the exported dataset"""
+        Group.objects.create(name=settings.QXSMS_GROUP_PANEL_MEMBERS)
+        panel = Panel.objects.create(name='Test Export')
+        births = [(29, 2, 2000), (28, 2, 2000), (1, 3, 2000), (29, 2, 1900), (31, 4, 1980), (77, 88, 1950),
+                  (1, 1, 9999), (15, 6, 2010), (1, 1, 1940)]
+        emails = [None, '', '{}@opinionsurvey.org', '{}@example.com']
+        for ess_id, (day, month, year) in enumerate(births, 1):
+            email = emails[ess_id % 4] and emails[ess_id % 4].format(ess_id)
+            Profile.objects.create(panel=panel, ess_id=ess_id, sex=1, email=email,
+                                   phone='+33600000000' if ess_id == 1 else None, address=['', 'Street'][ess_id % 2],
+                                   country='FR', language='EN', internet_use=1, day_of_birth=day,
+                                   month_of_birth=month, year_of_birth=year, education_years=0)
+        queryset = Profile.objects.order_by('ess_id')
+        dataset = ProfileResource(panel_id=panel.pk).export(queryset)
+        headers, *rows = ProfileResource(panel_id=panel.pk).iter_export(queryset)
+        self.assertEqual(rows, [list(row) for row in dataset])
+        ages = [row[headers.index('age')] for row in rows]
+        self.assertEqual(ages, ['23', '23', '22', '999', '999', '73', '999', '12', '83'])
+
+    def test_iter_export_selected_fields(self):
+        """Only the selected columns are read, the panel name with a join"""
+        Group.objects.create(name=settings.QXSMS_GROUP_PANEL_MEMBERS)
+        panel = Panel.objects.create(name='Test Export')
+        for ess_id in range(1, 4):
+            Profile.objects.create(panel=panel, ess_id=ess_id, sex=1, country='FR', language='EN', internet_use=1,
+                                   day_of_birth=1, month_of_birth=1, year_of_birth=2000, education_years=0)
+        rows = ProfileResource(panel_id=panel.pk).iter_export(fields=['ess_id', 'panel__name', 'age_group_code'])
+        with self.assertNumQueries(1):
+            self.assertEqual(list(rows), [['idno', 'agegrp', 'panel']] + [[ess_id, '2', 'Test Export'] for ess_id in
+                                                                          range(1, 4)])
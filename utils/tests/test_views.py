@@ -1,10 +1,26 @@
+# -- STDLIB
+import csv
+import io
+from datetime import datetime, timezone
+from unittest.mock import patch
+
 # -- DJANGO
 from django.contrib.auth import get_user_model
-from django.test import RequestFactory, TransactionTestCase
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.shortcuts import reverse
+from django.test import RequestFactory, TestCase, TransactionTestCase
 
 # -- QXSMS
+from distributions.factories import (
+    LinkDistributionFactory, MessageDistributionFactory,
+)
+from hq.factories import HqFactory
+from hq.models import SMSStats, SMSStatsJob, SMSStatsSummary
+from hq.tasks import process_sms_stats
 from panelist.factories import PanelistFactory
 from panelist.models import BlankSlot, BlankSlotValue
+from utils import smsstats
 
 # -- QXSMS (LOCAL)
 from ..views import BaseBlankSlotValueUpdate
@@ -103,3 +119,130 @@ class BaseBlankSlotValueUpdateTestCase(TransactionTestCase):
         self.assertEqual(to_update.value, 'updated')
         with self.assertRaises(BlankSlotValue.DoesNotExist):
             BlankSlotValue.objects.get(value='to_delete')
+
+
+class ImportSMSStatsTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.profiles = PanelistFactory.create_batch(3)
+        link_distribution = LinkDistributionFactory(panels=[cls.profiles[0].panel])
+        cls.msgdist = MessageDistributionFactory(link_distribution=link_distribution, qx_id='EMD_1')
+        cls.staff = HqFactory(is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def history_file(self, date, *statuses):
+        content = "External Data Reference,Distribution Id,Status,Bounce Reason\n" + "".join(
+            f"{profile.uid},{qx_id},{status},\n" for profile, qx_id, status in statuses)
+        return SimpleUploadedFile(f"Distribution_history-{date}.csv", content.encode())
+
+    def post(self, *files, url='utils:import-sms-stats', **data):
+        """Upload `files`, process them as a worker would, and return the job"""
+        with patch('hq.tasks.process_sms_stats.delay', side_effect=process_sms_stats):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse(url), {'file_field': files, **data})
+        job = SMSStatsJob.objects.latest('pk')
+        self.assertRedirects(response, reverse('utils:sms-stats-job', args=[job.pk]))
+        job.refresh_from_db()
+        return job
+
+    def get_statuses(self):
+        return dict(SMSStats.objects.values_list('panelist', 'smsstatus'))
+
+    @patch('utils.smsstats.CHUNK_SIZE', 2)
+    def test_newest_file_wins(self):
+        SMSStats.objects.create(panelist=self.profiles[0], msgdist=self.msgdist, smsstatus='Delivered',
+                                datefile=datetime(2022, 1, 2, 10, tzinfo=timezone.utc))
+        rows = [(profile, 'EMD_1', 'Pending') for profile in self.profiles] + [(self.profiles[1], 'EMD_2', 'Sent')]
+        job = self.post(self.history_file('2022-01-01T10-00-00Z', *rows))
+        self.assertEqual(job.status, SMSStatsJob.STATUS_DONE)
+        self.assertEqual(self.get_statuses(), {self.profiles[0].pk: 'Delivered', self.profiles[1].pk: 'Pending',
+                                               self.profiles[2].pk: 'Pending'})
+        stats_file = job.files.get()
+        self.assertEqual((stats_file.total_rows, stats_file.saved_rows), (4, 2))
+        self.assertEqual(stats_file.errors, ["MessageDistribution with qx_id 'EMD_2' not found"])
+        # Staged files are discarded once processed
+        self.assertFalse(stats_file.file)
+
+        # Within a job too, whatever the order of the files
+        self.post(self.history_file('2022-01-04T10-00-00Z', (self.profiles[1], 'EMD_1', 'Delivered')),
+                  self.history_file('2022-01-03T10-00-00Z', (self.profiles[1], 'EMD_1', 'Failed')))
+        self.assertEqual(self.get_statuses()[self.profiles[1].pk], 'Delivered')
+
+    @patch('utils.smsstats.CHUNK_SIZE', 2)
+    def test_summaries(self):
+        """Statuses are counted again by panel once imported"""
+        self.profiles[1].panel = self.profiles[0].panel
+        self.profiles[1].save()
+        rows = [(self.profiles[0], 'EMD_1', 'Failed'), (self.profiles[1], 'EMD_1', 'Failed'),
+                (self.profiles[2], 'EMD_1', 'Delivered')]
+        self.post(self.history_file('2022-01-01T10-00-00Z', *rows))
+        self.post(self.history_file('2022-01-02T10-00-00Z', (self.profiles[2], 'EMD_1', 'Failed')))
+        summaries = SMSStatsSummary.objects.filter(msgdist=self.msgdist).values_list('panel', 'smsstatus',
+                                                                                     'bouncereason', 'count')
+        self.assertCountEqual(summaries, [(self.profiles[0].panel_id, 'Failed', '', 2),
+                                          (self.profiles[2].panel_id, 'Failed', '', 1)])
+
+        # Statuses of deleted profiles are no longer counted
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profiles[1].delete()
+        self.assertCountEqual(summaries.all(), [(self.profiles[0].panel_id, 'Failed', '', 1),
+                                                (self.profiles[2].panel_id, 'Failed', '', 1)])
+
+    @patch('utils.smsstats.CHUNK_SIZE', 2)
+    def test_summaries_failed_file(self):
+        """Statuses saved before a file fails are counted"""
+        rows = [(profile, 'EMD_1', 'Delivered') for profile in self.profiles]
+        save_stats = smsstats.save_stats
+
+        def save_first_chunk(stats, force_save):
+            if SMSStats.objects.exists():
+                raise ValueError("Invalid row")
+            return save_stats(stats, force_save)
+
+        with patch('utils.smsstats.save_stats', side_effect=save_first_chunk):
+            job = self.post(self.history_file('2022-01-01T10-00-00Z', *rows))
+        self.assertEqual(job.files.get().status, SMSStatsJob.STATUS_FAILED)
+        self.assertEqual(SMSStats.objects.count(), 2)
+        self.assertEqual(sum(SMSStatsSummary.objects.values_list('count', flat=True)), 2)
+
+    def test_force_save(self):
+        SMSStats.objects.create(panelist=self.profiles[0], msgdist=self.msgdist, smsstatus='Delivered',
+                                datefile=datetime(2022, 1, 2, 10, tzinfo=timezone.utc))
+        self.post(self.history_file('2022-01-01T10-00-00Z', (self.profiles[0], 'EMD_1', 'Pending')), force_save='on')
+        self.assertEqual(self.get_statuses(), {self.profiles[0].pk: 'Pending'})
+
+    def test_file_errors(self):
+        content = f"External Data Reference,Status,Bounce Reason\n{self.profiles[0].uid},Pending,\nunknown,Sent,\n"
+        job = self.post(SimpleUploadedFile("export-EMD_1-2022-01-01T10-00-00Z.csv", content.encode()),
+                        SimpleUploadedFile("export-EMD_2-2022-01-01T10-00-00Z.csv", content.encode()),
+                        SimpleUploadedFile("other.csv", content.encode()))
+        self.assertEqual(job.status, SMSStatsJob.STATUS_DONE)
+        self.assertEqual(
+            [(f.status, f.saved_rows, f.errors, f.error) for f in job.files.all()],
+            [(SMSStatsJob.STATUS_DONE, 1, ['unknown'], ''),
+             (SMSStatsJob.STATUS_FAILED, 0, [], "MessageDistribution with qx_id 'EMD_2' not found"),
+             (SMSStatsJob.STATUS_FAILED, 0, [], "Unknown filename format")],
+        )
+
+        response = self.client.get(reverse('utils:sms-stats-job', args=[job.pk]), {'format': 'json'})
+        self.assertEqual(response.json()['files'][0], {
+            'name': "export-EMD_1-2022-01-01T10-00-00Z.csv", 'status_display': 'Done', 'total_rows': 2,
+            'saved_rows': 1, 'errors': 1, 'error': '',
+        })
+
+    def test_email(self):
+        job = self.post(self.history_file('2022-01-01T10-00-00Z', (self.profiles[0], 'EMD_1', 'Pending')),
+                        url='utils:email-sms-stats', emails='a@example.com;b@example.com')
+        self.assertEqual(job.status, SMSStatsJob.STATUS_DONE)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['a@example.com', 'b@example.com'])
+        _, report, _ = mail.outbox[0].attachments[0]
+        profile = self.profiles[0]
+        self.assertEqual(list(csv.reader(io.StringIO(report))), [
+            ["filename", "country", "essid", "panelname", "SMSstatus", "BounceReason"],
+            ["Distribution_history-2022-01-01T10-00-00Z.csv", profile.country, str(profile.ess_id),
+             profile.panel.name, 'Pending', ''],
+        ])
@@ -1,7 +1,46 @@
+# -- DJANGO
+from django.db import connection
+
 # -- QXSMS
 from panelist.models import Profile
 
 
+def bulk_upsert(model, objs, unique_fields, update_fields, where=None):
+    """Insert `objs` in a single query, updating `update_fields` of the rows already stored with their `unique_fields`
+
+    Stands in for `bulk_create(update_conflicts=True)`, which Django only provides from 4.1,
+    with PostgreSQL's INSERT ... ON CONFLICT. A row cannot be updated twice by the same
+    statement: only the last of the objects sharing their unique values is saved.
+    Stored rows are only updated when the SQL condition `where` holds, if given, comparing
+    the stored columns, qualified by the table name, with the `EXCLUDED` ones.
+    Return the number of rows inserted or updated.
+    """
+    unique = [model._meta.get_field(name) for name in unique_fields]
+    update = [model._meta.get_field(name) for name in update_fields]
+    objs = {tuple(getattr(obj, field.attname) for field in unique): obj for obj in objs}
+    if not objs:
+        return 0
+
+    qn = connection.ops.quote_name
+    fields = unique + update
+    row = f"({', '.join(['%s'] * len(fields))})"
+    if update:
+        action = "DO UPDATE SET " + ", ".join(f"{qn(f.column)} = EXCLUDED.{qn(f.column)}" for f in update)
+        if where:
+            action += f" WHERE {where}"
+    else:
+        action = "DO NOTHING"
+    sql = (
+        f"INSERT INTO {qn(model._meta.db_table)} ({', '.join(qn(f.column) for f in fields)}) "
+        f"VALUES {', '.join([row] * len(objs))} "
+        f"ON CONFLICT ({', '.join(qn(f.column) for f in unique)}) {action}"
+    )
+    params = [f.get_db_prep_save(getattr(obj, f.attname), connection) for obj in objs.values() for f in fields]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
 def get_panelist_counts(object_list, grand_total_filters={}, grand_total_present=None):
     if not grand_total_present:
         grand_total = Profile.objects.filter(**grand_total_filters).count()
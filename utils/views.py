@@ -1,51 +1,102 @@
 # -- STDLIB
-import codecs
 import csv
-import io
-import uuid
-from datetime import datetime
 
 # -- DJANGO
-from django.conf import settings
-from django.core.mail import EmailMessage
-from django.http import Http404, HttpResponse, HttpResponseRedirect
-from django.shortcuts import render
-from django.urls import reverse_lazy
-from django.utils import timezone
-from django.views.generic import FormView, ListView
+from django.http import (
+    FileResponse, Http404, HttpResponseRedirect, JsonResponse,
+    StreamingHttpResponse,
+)
+from django.shortcuts import redirect
+from django.urls import reverse
+from django.views.generic import DetailView, FormView, ListView, View
 from django.views.generic.detail import (
     SingleObjectMixin, TemplateResponseMixin,
 )
 from django.views.generic.edit import ProcessFormView
 
 # -- QXSMS
-from distributions.models import MessageDistribution
-from hq.models import Panel, SMSStats
+from hq.models import ExportJob, Panel, SMSStatsJob
+from hq.tasks import start_export, start_sms_stats_job
 from panelist.forms import BlankSlotValueFormSet
 from panelist.models import Profile
-from utils.csvimport import BlankSlotValueResource
 from utils.forms import ImportSMSstatsEmailForm, ImportSMSstatsForm
 
 
-def csv_response(dataset, file_name='export'):
-    response = HttpResponse(dataset, content_type='text/csv')
-    filename = f"{timezone.now().strftime('%Y-%m-%d-%H%M')}-{file_name}.csv"
-    response['Content-Disposition'] = f"attachment; filename={filename}"
+def export_job_redirect(request, job):
+    """Redirect to the page of an export job, in the namespace of the current view"""
+    return redirect(f'{request.resolver_match.namespace}:export-job', pk=job.pk)
+
+
+def get_export_format(request):
+    """File format of an export requested with `?format=`, CSV unless it is a columnar one"""
+    file_format = request.GET.get('format')
+    return file_format if file_format in (ExportJob.FORMAT_PARQUET, ExportJob.FORMAT_ARROW) else ExportJob.FORMAT_CSV
+
+
+class Echo:
+    """File-like object returning what is written to it, so that CSV rows can be streamed as they are written"""
+
+    def write(self, value):
+        return value
+
+
+def streaming_csv_response(filename, rows):
+    """Response streaming `rows` as a CSV file attachment named `filename`"""
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse((writer.writerow(row) for row in rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
 
 def blank_slot_export_csv(request, panel_pk=None):
+    panel = None
     if panel_pk is not None:
         try:
             panel = request.user.panel_set.all().get(pk=panel_pk)
-            dataset = BlankSlotValueResource(panel_id=panel.id).export()
         except Panel.DoesNotExist:
             raise Http404
-    else:
-        dataset = BlankSlotValueResource().export()
 
-    response = csv_response(dataset.csv, 'export-panel-blank-slots')
-    return response
+    job = start_export(ExportJob.KIND_BLANK_SLOTS, request.user, 'export-panel-blank-slots', panel=panel,
+                       wide='wide' in request.GET)
+    return export_job_redirect(request, job)
+
+
+class BaseExportJobDetail(DetailView):
+    """Progress of an export requested by the user, and link to download it once written
+
+    The page polls the progress with `?format=json` until the export ends.
+    """
+    context_object_name = 'job'
+
+    def get_queryset(self):
+        return self.request.user.export_jobs.all()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['download_url'] = reverse(f'{self.request.resolver_match.namespace}:export-job-download',
+                                          args=[self.object.pk])
+        return context
+
+    def render_to_response(self, context, **response_kwargs):
+        if self.request.GET.get('format') == 'json':
+            job = self.object
+            return JsonResponse({
+                'status': job.status,
+                'status_display': job.get_status_display(),
+                'ended': job.status in (ExportJob.STATUS_DONE, ExportJob.STATUS_FAILED),
+            })
+        return super().render_to_response(context, **response_kwargs)
+
+
+class ExportJobDownload(SingleObjectMixin, View):
+    """Compressed file of an export requested by the user"""
+
+    def get_queryset(self):
+        return self.request.user.export_jobs.filter(status=ExportJob.STATUS_DONE).exclude(file='')
+
+    def get(self, request, *args, **kwargs):
+        job = self.get_object()
+        return FileResponse(job.file.open('rb'), as_attachment=True, filename=job.download_name)
 
 
 class BaseBlankSlotValueUpdate(SingleObjectMixin, TemplateResponseMixin, ProcessFormView):
@@ -117,128 +168,53 @@ class BaseBlankSlotValueList(SingleObjectMixin, ListView):
 
 
 class ImportSMSStats(FormView):
+    """Upload of Qualtrics distribution history and export files, whose SMS statuses are imported in the background
+
+    Unless forced, the statuses of a newer file are kept over those of an older one.
+    """
     form_class = ImportSMSstatsForm
     template_name = "utils/import_sms_stats.html"
-    template_name_success = "utils/import_sms_stats_result.html"
-    success_url = reverse_lazy("utils:import-sms-stats")
 
     def form_valid(self, form):
-        files = self.request.FILES.getlist("file_field")
-        allprofiles, datain, import_stats = self.file_analysys(files)
-        for d in datain:
-            import_stats[d["filename"]]["total"] += 1
-            try:
-                p = allprofiles[uuid.UUID(d["External Data Reference"])]
-            except KeyError:
-                import_stats[d["filename"]]["errors"].append(d["External Data Reference"])
-                continue
-
-            stats, x = SMSStats.objects.get_or_create(panelist=p, msgdist=d["msgdist"])
-
-            stats.smsstatus = d["Status"]
-            stats.bouncereason = d["Bounce Reason"]
-            if form.cleaned_data["force_save"] or not stats.datefile or stats.datefile <= d["filedate"]:
-                import_stats[d["filename"]]["save"] += 1
-                stats.datefile = d["filedate"]
-                stats.save()
-        return render(self.request, self.template_name_success,
-                      context={"import_stats": import_stats.items()})
-
-    def get_filedate(self, data):
-        filedate, x = data.split(".")
-        filedate = datetime.strptime(filedate, "%Y-%m-%dT%H-%M-%SZ").replace(tzinfo=timezone.utc)
-        return filedate
-
-    def file_analysys(self, files):
-        datain = []
-        alluids = []
-        import_stats = dict()
-
-        for f in files:
-            reader = csv.DictReader(codecs.iterdecode(f, 'utf-8'))
-            filetype, data = f.name.split("-", 1)
-            if "Distribution_history" in filetype:  # Distribution_history-DATE.csv
-                filedate = self.get_filedate(data)
-                import_stats[f.name] = {"errors": [], "save": 0, "total": 0}
-                for r in reader:
-                    try:
-                        msgdist = MessageDistribution.objects.get(qx_id=r["Distribution Id"])
-                    except MessageDistribution.DoesNotExist:
-                        import_stats[f.name]["errors"].append(
-                                f"MessageDistribution with qx_id '{r['Distribution Id']}' not found"
-                            )
-                        import_stats[f.name]["total"] += 1
-                        continue
-                    r["filename"], r["msgdist"], r["filedate"] = f.name, msgdist, filedate
-                    alluids.append(r["External Data Reference"])
-                    datain.append(r)
-            elif "export" in filetype:  # export-MSGDISTQXID-DATE.csv
-                msgdist_qx_id, filedate = data.split("-", 1)
-                filedate = self.get_filedate(filedate)
-
-                try:
-                    msgdist = MessageDistribution.objects.get(qx_id=msgdist_qx_id)
-                    import_stats[f.name] = {"errors": [], "save": 0, "total": 0}
-                except MessageDistribution.DoesNotExist:
-                    import_stats[f.name] = f"MessageDistribution with qx_id '{msgdist_qx_id}' not found"
-                    continue
-                for r in reader:
-                    r["filename"], r["msgdist"], r["filedate"] = f.name, msgdist, filedate
-                    alluids.append(r["External Data Reference"])
-                    datain.append(r)
-            else:  # error
-                import_stats[f.name] = "Unknown filename format"
-
-        allprofiles = {p.uid: p for p in Profile.objects.filter(uid__in=alluids)}
-
-        return allprofiles, datain, import_stats
+        job = start_sms_stats_job(SMSStatsJob.KIND_IMPORT, self.request.user, self.request.FILES.getlist("file_field"),
+                                  force_save=form.cleaned_data["force_save"])
+        return redirect('utils:sms-stats-job', pk=job.pk)
 
 
 class ImportSMSStatsEmail(FormView):
+    """Upload of SMS statuses files, emailed in the background with the profiles they were sent to"""
     form_class = ImportSMSstatsEmailForm
     template_name = "utils/import_sms_stats.html"
-    success_url = reverse_lazy("utils:email-sms-stats")
 
     def form_valid(self, form):
-        datain = []
-        dataout = []
-        uidnotfound = []
-        alluids = []
-        files = self.request.FILES.getlist("file_field")
-
-        for f in files:
-            reader = csv.DictReader(codecs.iterdecode(f, 'utf-8'))
-            for r in reader:
-                r["filename"] = f.name
-                alluids.append(r["External Data Reference"])
-                datain.append(r)
-
-        allprofiles = {p.uid: p for p in Profile.objects.filter(uid__in=alluids)}
-
-        for d in datain:
-            try:
-                p = allprofiles[uuid.UUID(d["External Data Reference"])]
-            except KeyError:
-                uidnotfound.append(d["External Data Reference"])
-                continue
-            dataout.append({"filename": d["filename"],
-                            "country": p.country,
-                            "essid": p.ess_id,
-                            "panelname": p.panel.name,
-                            "SMSstatus": d["Status"],
-                            "BounceReason": d["Bounce Reason"]})
-
-        with io.StringIO() as fd:
-            w = csv.DictWriter(fd, fieldnames=["filename", "country", "essid", "panelname", "SMSstatus",
-                                               "BounceReason"])
-            w.writeheader()
-            w.writerows(dataout)
-            outvalue = fd.getvalue()
-
-        email = EmailMessage("SMS Stats", f"SMS Stats for {'&'.join([f.name for f in files])}\n\n"
-                                          f"UID not found : {uidnotfound}",
-                             settings.DEFAULT_FROM_EMAIL, form.cleaned_data["emails"].split(";"))
-        email.attach("sms-stats.csv", outvalue)
-        email.send()
-
-        return super().form_valid(form)
+        job = start_sms_stats_job(SMSStatsJob.KIND_EMAIL, self.request.user, self.request.FILES.getlist("file_field"),
+                                  emails=form.cleaned_data["emails"])
+        return redirect('utils:sms-stats-job', pk=job.pk)
+
+
+class SMSStatsJobDetail(DetailView):
+    """Progress and errors of each file of a SMS statuses job requested by the user
+
+    The page polls the progress with `?format=json` until the job ends.
+    """
+    context_object_name = 'job'
+    template_name = "utils/sms_stats_job.html"
+
+    def get_queryset(self):
+        return self.request.user.sms_stats_jobs.all()
+
+    def render_to_response(self, context, **response_kwargs):
+        if self.request.GET.get('format') == 'json':
+            job = self.object
+            return JsonResponse({
+                'status': job.status,
+                'status_display': job.get_status_display(),
+                'ended': job.ended,
+                'files': [
+                    {'name': stats_file.name, 'status_display': stats_file.get_status_display(),
+                     'total_rows': stats_file.total_rows, 'saved_rows': stats_file.saved_rows,
+                     'errors': len(stats_file.errors), 'error': stats_file.error}
+                    for stats_file in job.files.all()
+                ],
+            })
+        return super().render_to_response(context, **response_kwargs)